@@ -0,0 +1,312 @@
+'''
+Benchmarks of the backtesting engine over seeded synthetic data.
+
+    python -m benchmarks.run_benchmarks --sizes 10000 100000 1000000
+    python -m benchmarks.run_benchmarks --save-baseline
+    python -m benchmarks.run_benchmarks --baseline benchmarks/baseline.json --threshold 0.25
+
+No baseline is committed: benchmarks/baseline.json is created by the first
+--save-baseline run, on the machine that runs the comparisons.
+
+Every benchmark reports the best time of --repeat runs (more for fast
+benchmarks), the throughput (bars, calls or files per second) and the peak
+memory allocated during an extra run traced with tracemalloc. The startup benchmark measures the time
+to import the engine in a new interpreter.
+
+With a baseline, the run fails (exit code 1) when a benchmark is slower, or
+uses more memory, than the baseline by more than the threshold.
+'''
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic_data import generate_ohlcv, generate_signals, write_csv_folder
+from examples.example_strategy import ExampleStrategy
+from src.backtesting_engine.commission_calculator import CommissionCalculator
+from src.backtesting_engine.indicators import SMA
+from src.backtesting_engine.plot_chart import get_candlestick_figure
+from src.backtesting_engine.signal_strategy import SignalStrategy
+from src.backtesting_engine.strategy import Strategy
+from src.backtesting_engine.utils import read_files_from_folder
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+COMMISSION_CONFIG = [
+    {'interval': (0, 1000), 'commission': {'amount': 2}},
+    {'interval': (1000, 10000), 'commission': {'percentage': 0.2}},
+    {'greater_than': 10000, 'commission': {'percentage': 0.1, 'amount': 5}}
+]
+# Larger sizes are skipped for the CSV benchmarks, since writing the files takes too long
+MAX_CSV_BARS = 1_000_000
+
+
+class SmaCrossStrategy(Strategy):
+
+    def __init__(self, df, init_capital, commission_config):
+        super().__init__(df, init_capital, commission_config)
+        self.add_indicator(SMA(20))
+        self.add_indicator(SMA(100))
+        self.fast = self.get_indicator('SMA_20')
+        self.slow = self.get_indicator('SMA_100')
+
+    def next(self):
+        i = self.current_period
+        if self.shares == 0 and self.fast[i] > self.slow[i]:
+            self.buy(all=True)
+        elif self.shares > 0 and self.fast[i] < self.slow[i]:
+            self.sell(all=True)
+
+
+class RestingOrdersStrategy(ExampleStrategy):
+    '''ExampleStrategy plus 500 limit orders far from the price, which rest in the order book.'''
+
+    def next(self):
+        if self.current_period == 0:
+            for k in range(500):
+                self.buy(order_type='limit', buy_price=self.data_close[0]*(0.01 + k*0.0001), number_shares=1)
+        super().next()
+
+
+def _run_strategy(strategy_class: type) -> Callable[[int], Tuple[Callable[[], Any], int]]:
+    def setup(size: int) -> Tuple[Callable[[], Any], int]:
+        df = generate_ohlcv(size)
+
+        def run():
+            strategy = strategy_class(df, 10000, COMMISSION_CONFIG)
+            strategy.set_quiet()
+            return strategy.execute_strategy()
+
+        return run, size
+    return setup
+
+
+def _run_signal_strategy(size: int) -> Tuple[Callable[[], Any], int]:
+    df = generate_ohlcv(size)
+    entries, exits = generate_signals(size)
+
+    def run():
+        strategy = SignalStrategy(df, 10000, COMMISSION_CONFIG, entries, exits)
+        strategy.set_quiet()
+        return strategy.execute_vectorized_strategy()
+
+    return run, size
+
+
+def _run_commission(size: int) -> Tuple[Callable[[], Any], int]:
+    commission = CommissionCalculator.compile(COMMISSION_CONFIG)
+    amounts = np.random.default_rng(0).uniform(0, 50000, min(size, 100_000)).tolist()
+
+    def run():
+        for amount in amounts:
+            commission(amount, 'buy')
+            commission.get_max_shares(amount, 10.5, 'buy')
+
+    return run, 2*len(amounts)
+
+
+def _run_read_files(use_cache: bool) -> Callable[[int], Tuple[Callable[[], Any], int]]:
+    def setup(size: int) -> Tuple[Callable[[], Any], int]:
+        if size > MAX_CSV_BARS:
+            raise _Skip()
+        folder = tempfile.mkdtemp(prefix='backtesting_benchmark_')
+        write_csv_folder(generate_ohlcv(size), os.path.join(folder, 'data', 'synthetic'))
+        if use_cache:
+            _in_folder(folder, lambda: read_files_from_folder('synthetic'))
+
+        def run():
+            return _in_folder(folder, lambda: read_files_from_folder('synthetic', use_cache=use_cache))
+
+        run.cleanup = lambda: shutil.rmtree(folder, ignore_errors=True)
+        return run, size
+    return setup
+
+
+def _run_plot(size: int) -> Tuple[Callable[[], Any], int]:
+    df = generate_ohlcv(size)
+
+    def run():
+        return get_candlestick_figure(df, width=1600, height=900)
+
+    return run, size
+
+
+class _Skip(Exception):
+    pass
+
+
+def _in_folder(folder: str, function: Callable[[], Any]) -> Any:
+    cwd = os.getcwd()
+    os.chdir(folder)
+    try:
+        return function()
+    finally:
+        os.chdir(cwd)
+
+
+BENCHMARKS: Dict[str, Callable[[int], Tuple[Callable[[], Any], int]]] = {
+    'strategy_example': _run_strategy(ExampleStrategy),
+    'strategy_sma_cross': _run_strategy(SmaCrossStrategy),
+    'strategy_resting_orders': _run_strategy(RestingOrdersStrategy),
+    'signal_vectorized': _run_signal_strategy,
+    'commission': _run_commission,
+    'read_files_csv': _run_read_files(use_cache=False),
+    'read_files_cache': _run_read_files(use_cache=True),
+    'plot_figure': _run_plot
+}
+
+
+# Fast benchmarks are repeated until they add up to this time, to reduce the noise of the best time
+MIN_TOTAL_SECONDS = 0.5
+MAX_REPEAT = 100
+MIN_REGRESSION_SECONDS = 0.005
+
+
+def measure(run: Callable[[], Any], units: int, repeat: int) -> Dict[str, float]:
+    times = []
+    while len(times) < repeat or (sum(times) < MIN_TOTAL_SECONDS and len(times) < MAX_REPEAT):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    seconds = min(times)
+    return {
+        'seconds': seconds,
+        'throughput': units/seconds if seconds > 0 else 0.0,
+        'peak_memory_mb': peak/1024**2
+    }
+
+
+def measure_startup(repeat: int) -> Dict[str, float]:
+    code = 'import src.backtesting_engine.strategy'
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], check=True, cwd=os.getcwd())
+        times.append(time.perf_counter() - start)
+    return {'seconds': min(times), 'throughput': 1/min(times), 'peak_memory_mb': 0.0}
+
+
+def run_benchmarks(sizes: List[int], repeat: int = 3, names: Optional[List[str]] = None) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if names and not any(selected in name for selected in names):
+            continue
+        for size in sizes:
+            try:
+                run, units = setup(size)
+            except _Skip:
+                continue
+            try:
+                results[f'{name}[{size}]'] = measure(run, units, repeat)
+            finally:
+                if hasattr(run, 'cleanup'):
+                    run.cleanup()
+            print(f'{name}[{size}]: {_format_result(results[f"{name}[{size}]"])}', flush=True)
+
+    if not names or any(selected in 'startup' for selected in names):
+        results['startup'] = measure_startup(repeat)
+        print(f'startup: {_format_result(results["startup"])}', flush=True)
+    return results
+
+
+def _format_result(result: Dict[str, float]) -> str:
+    return f'{result["seconds"]:.4f}s, {result["throughput"]:.1f}/s, {result["peak_memory_mb"]:.1f} MB'
+
+
+def get_metadata() -> Dict[str, str]:
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'date': pd.Timestamp.now().isoformat()
+    }
+
+
+def compare_with_baseline(results: Dict[str, Dict[str, float]], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    '''
+    Returns a message for every benchmark that is slower, or uses more
+    memory, than in the baseline by more than threshold (0.25 = 25%).
+    Time increases under MIN_REGRESSION_SECONDS and memory increases under
+    1 MB are ignored, since they are within the noise of the measures.
+    '''
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline['results']:
+            continue
+        reference = baseline['results'][name]
+        time_increase = result['seconds'] - reference['seconds']
+        if time_increase > MIN_REGRESSION_SECONDS and result['seconds'] > reference['seconds']*(1 + threshold):
+            regressions.append(f'{name}: {result["seconds"]:.4f}s vs {reference["seconds"]:.4f}s in the baseline')
+        memory_increase = result['peak_memory_mb'] - reference['peak_memory_mb']
+        if memory_increase > 1 and result['peak_memory_mb'] > reference['peak_memory_mb']*(1 + threshold):
+            regressions.append(f'{name}: {result["peak_memory_mb"]:.1f} MB vs {reference["peak_memory_mb"]:.1f} MB in the baseline')
+    return regressions
+
+
+def main(args: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Backtesting engine benchmarks')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='number of bars, e.g. 10000 100000 1000000 10000000')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', nargs='+', default=None, help='run only the benchmarks whose name contains one of these')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown before failing, 0.25 = 25%%')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--output', default=None, help='also write the results to this JSON file')
+    options = parser.parse_args(args)
+
+    results = run_benchmarks(options.sizes, options.repeat, options.only)
+    report = {'metadata': get_metadata(), 'results': results}
+
+    if options.output is not None:
+        with open(options.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if options.save_baseline:
+        if os.path.exists(options.baseline):
+            with open(options.baseline) as baseline_file:
+                baseline = json.load(baseline_file)
+            baseline['results'].update(results)
+            baseline['metadata'] = report['metadata']
+        else:
+            baseline = report
+        with open(options.baseline, 'w') as baseline_file:
+            json.dump(baseline, baseline_file, indent=2)
+        print(f'Baseline saved in {options.baseline}')
+        return 0
+
+    if not os.path.exists(options.baseline):
+        print(f'No baseline found in {options.baseline}, run with --save-baseline to create it')
+        return 0
+
+    with open(options.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    regressions = compare_with_baseline(results, baseline, options.threshold)
+    if regressions:
+        print(f'{len(regressions)} regressions beyond {options.threshold:.0%}:')
+        for regression in regressions:
+            print(f'  {regression}')
+        return 1
+
+    print(f'No regressions beyond {options.threshold:.0%}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
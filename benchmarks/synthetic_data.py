@@ -0,0 +1,49 @@
+import os
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+
+def generate_ohlcv(
+    n_bars: int,
+    seed: int = 0,
+    start: str = '2000-01-03',
+    freq: str = '1min',
+    initial_price: float = 100.0,
+    volatility: float = 0.001
+) -> DataFrame:
+    '''
+    Seeded random walk OHLCV bars with the layout read_files_from_folder
+    returns (Datetime index, Open, High, Low, Close and Volume columns).
+    The same n_bars and seed always give the same bars.
+    '''
+    rng = np.random.default_rng(seed)
+    close = initial_price*np.exp(np.cumsum(rng.normal(0, volatility, n_bars)))
+    open_price = np.empty(n_bars)
+    open_price[0] = initial_price
+    open_price[1:] = close[:-1]*np.exp(rng.normal(0, volatility/4, n_bars-1))
+    high = np.maximum(open_price, close)*(1 + np.abs(rng.normal(0, volatility, n_bars)))
+    low = np.minimum(open_price, close)*(1 - np.abs(rng.normal(0, volatility, n_bars)))
+    volume = rng.integers(100, 10000, n_bars).astype(float)
+
+    return pd.DataFrame(
+        {'Open': open_price, 'High': high, 'Low': low, 'Close': close, 'Volume': volume},
+        index=pd.date_range(start, periods=n_bars, freq=freq, name='Datetime')
+    )
+
+
+def generate_signals(n_bars: int, seed: int = 0, probability: float = 0.02):
+    '''
+    Seeded random entry and exit signals for SignalStrategy.
+    '''
+    rng = np.random.default_rng(seed + 1)
+    return rng.random(n_bars) < probability, rng.random(n_bars) < probability
+
+
+def write_csv_folder(df: DataFrame, folder: str, n_files: int = 10) -> None:
+    '''
+    Splits the bars into n_files CSV files, as read_files_from_folder expects them.
+    '''
+    os.makedirs(folder, exist_ok=True)
+    for i, file_df in enumerate(np.array_split(df, n_files)):
+        file_df.to_csv(os.path.join(folder, f'part_{i:04d}.csv'))
@@ -1,7 +1,7 @@
 from pandas import DataFrame
 from typing import Any
 
-from src.strategy import Strategy
+from src.backtesting_engine.strategy import Strategy
 
 
 class ExampleStrategy(Strategy):
@@ -0,0 +1,186 @@
+from typing import Any, Dict, Iterator, List, Optional
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, DatetimeIndex
+
+
+class BarData:
+    '''
+    Column arrays of an OHLCV DataFrame. The arrays are views of the
+    DataFrame columns whenever pandas allows it, and the per-bar records are
+    only built when they are requested.
+    '''
+
+    def __init__(self, df: DataFrame):
+        self.df = df
+        self.index: DatetimeIndex = df.index
+        self.dates: DatetimeIndex = df.index
+        self.open: np.ndarray = df['Open'].to_numpy()
+        self.high: np.ndarray = df['High'].to_numpy()
+        self.low: np.ndarray = df['Low'].to_numpy()
+        self.close: np.ndarray = df['Close'].to_numpy()
+        self._index_label = df.index.name if df.index.name is not None else 'index'
+        self._columns = [(column, df[column].to_numpy()) for column in df.columns]
+        self._records: Optional[List[Dict[str, Any]]] = None
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def get_record(self, period: int) -> Dict[str, Any]:
+        record = {self._index_label: self.index[period]}
+        for column, values in self._columns:
+            record[column] = values[period]
+        return record
+
+    @property
+    def records(self) -> List[Dict[str, Any]]:
+        if self._records is None:
+            self._records = self.df.reset_index().to_dict('records')
+        return self._records
+
+
+class _DateView:
+    '''Read-only sequence of the dates stored in a GrowableBarData.'''
+
+    def __init__(self, bars: 'GrowableBarData'):
+        self._bars = bars
+
+    def __len__(self) -> int:
+        return len(self._bars)
+
+    def __getitem__(self, period: int) -> pd.Timestamp:
+        if period < 0:
+            period += len(self._bars)
+        if period < 0 or period >= len(self._bars):
+            raise IndexError('date index out of range')
+        return self._bars.get_date(period)
+
+    def __iter__(self) -> Iterator[pd.Timestamp]:
+        return iter(self._bars.index)
+
+
+class GrowableBarData:
+    '''
+    Bar data that new bars can be appended to in O(1), used when bars arrive
+    one by one. Values are kept in preallocated buffers that double their
+    capacity when full, and open/high/low/close, index and df are views of
+    the filled part.
+    '''
+
+    def __init__(self, bars: BarData, capacity: int = 1024):
+        self.columns: List[str] = list(bars.df.columns)
+        self._column_position = {column: i for i, column in enumerate(self.columns)}
+        self._index_label = bars._index_label
+        self._index_name = bars.index.name
+        self._size = len(bars)
+        capacity = max(capacity, self._size, 1)
+
+        index = pd.DatetimeIndex(bars.index)
+        self.tz = index.tz
+        if self.tz is not None:
+            index = index.tz_convert('UTC').tz_localize(None)
+        self._dates = np.empty(capacity, dtype=np.int64)
+        self._dates[:self._size] = index.to_numpy(dtype='datetime64[ns]').view(np.int64)
+        # One row per column, so every column is contiguous
+        self._values = np.empty((len(self.columns), capacity))
+        self._values[:, :self._size] = bars.df.to_numpy(dtype=float).T
+
+        self.dates = _DateView(self)
+        self._buffer_index: Optional[DatetimeIndex] = None
+        self._df: Optional[DataFrame] = None
+        self._records: List[Dict[str, Any]] = []
+        self._update_views()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _update_views(self) -> None:
+        self.open: np.ndarray = self._values[self._column_position['Open'], :self._size]
+        self.high: np.ndarray = self._values[self._column_position['High'], :self._size]
+        self.low: np.ndarray = self._values[self._column_position['Low'], :self._size]
+        self.close: np.ndarray = self._values[self._column_position['Close'], :self._size]
+
+    def _grow(self) -> None:
+        capacity = 2*self._values.shape[1]
+        dates = np.empty(capacity, dtype=np.int64)
+        dates[:self._size] = self._dates[:self._size]
+        values = np.empty((len(self.columns), capacity))
+        values[:, :self._size] = self._values[:, :self._size]
+        self._dates = dates
+        self._values = values
+        self._buffer_index = None
+
+    def append(self, date: datetime, bar: Dict[str, float]) -> None:
+        if self._size == self._values.shape[1]:
+            self._grow()
+
+        date = pd.Timestamp(date)
+        if date.tzinfo is not None:
+            date = date.tz_convert('UTC').tz_localize(None)
+        self._dates[self._size] = date.value
+
+        values = self._values[:, self._size]
+        values[:] = np.nan
+        for column, value in bar.items():
+            if column not in self._column_position:
+                raise Exception(f'ERROR: column {column} not in bar data.')
+            values[self._column_position[column]] = value
+
+        self._size += 1
+        self._update_views()
+
+    def extend(self, dates: np.ndarray, values: np.ndarray) -> None:
+        '''
+        Appends many bars at once: dates as int64 nanoseconds (UTC when the
+        bars have a timezone) and values with a row per bar and a column per
+        column of the bars.
+        '''
+        while self._size + len(dates) > self._values.shape[1]:
+            self._grow()
+        self._dates[self._size:self._size + len(dates)] = dates
+        self._values[:, self._size:self._size + len(dates)] = values.T
+        self._size += len(dates)
+        self._update_views()
+
+    def get_date(self, period: int) -> pd.Timestamp:
+        if self.tz is None:
+            return pd.Timestamp(self._dates[period])
+        return pd.Timestamp(self._dates[period], tz='UTC').tz_convert(self.tz)
+
+    def get_record(self, period: int) -> Dict[str, Any]:
+        if period < 0:
+            period += self._size
+        if period < 0 or period >= self._size:
+            raise IndexError('bar index out of range')
+        record = {self._index_label: self.get_date(period)}
+        for i, column in enumerate(self.columns):
+            record[column] = self._values[i, period]
+        return record
+
+    def _get_buffer_index(self) -> DatetimeIndex:
+        # Index over the whole dates buffer, built again only when it grows. Only slices of
+        # the filled part are returned, and those dates never change.
+        if self._buffer_index is None:
+            dates = self._dates.view('datetime64[ns]')
+            if self.tz is not None:
+                dates = pd.arrays.DatetimeArray(dates, dtype=pd.DatetimeTZDtype(tz=self.tz), copy=False)
+            self._buffer_index = pd.DatetimeIndex(dates, name=self._index_name, copy=False)
+        return self._buffer_index
+
+    @property
+    def index(self) -> DatetimeIndex:
+        return self._get_buffer_index()[:self._size]
+
+    @property
+    def df(self) -> DataFrame:
+        # A view of the buffers, built once per size, so reading it every bar does not copy the bars
+        if self._df is None or len(self._df) != self._size:
+            self._df = pd.DataFrame(self._values[:, :self._size].T, index=self.index, columns=self.columns, copy=False)
+        return self._df
+
+    @property
+    def records(self) -> List[Dict[str, Any]]:
+        # Kept between calls and only extended with the new bars
+        self._records.extend(self.get_record(period) for period in range(len(self._records), self._size))
+        return self._records
@@ -0,0 +1,202 @@
+import os
+import pickle
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+
+from src.backtesting_engine.bar_data import GrowableBarData
+from src.backtesting_engine.timeframes import Timeframe
+
+CHECKPOINT_VERSION = 1
+STATE_FILE = 'state.pkl'
+STRATEGY_FIELDS = ['capital', 'shares', 'current_period', '_before_shares', '_before_capital', '_capital_before_buy']
+
+
+def _get_streams(strategy: Any, initial_bars: int) -> Dict[str, np.ndarray]:
+    '''
+    Arrays of the strategy that only grow during a simulation. Rows that are
+    already stored never change, so every checkpoint only appends the new ones.
+    '''
+    trades = strategy.trades
+    streams = {
+        'equity': strategy.equity_curve.values,
+        'trade_periods': trades.periods,
+        'trade_prices': trades.prices,
+        'trade_number_shares': trades.number_shares,
+        'trade_types': trades.types
+    }
+
+    # Bars and indicator values up to initial_bars come from the df the strategy is created with
+    bars = strategy.bars
+    if isinstance(bars, GrowableBarData):
+        streams['bar_dates'] = bars._dates[initial_bars:len(bars)]
+        streams['bar_values'] = bars._values[:, initial_bars:len(bars)].T
+        for output, values in strategy._indicator_set.get_values().items():
+            streams[f'indicator_{output}'] = values[initial_bars:]
+
+    # The last bucket of a timeframe can still change, so it is kept in the state file
+    for rule, timeframe in strategy._timeframes.items():
+        last = max(timeframe._size - 1, 0)
+        streams[f'timeframe_{rule}_closed'] = timeframe._closed[:timeframe._periods]
+        streams[f'timeframe_{rule}_starts'] = timeframe._starts[:last]
+        streams[f'timeframe_{rule}_values'] = timeframe._values[:, :last].T
+    return streams
+
+
+class Checkpointer:
+    '''
+    Stores the state of a Strategy in a folder: the arrays that grow with the
+    simulation (equity curve, trades, streamed bars, indicator values and
+    timeframes) in append-only .bin files, and everything else (capital,
+    shares, metrics, pending orders, indicator state and the fields listed in
+    the checkpoint_fields of the strategy) in a pickled state file, replaced
+    atomically.
+
+    Each save only writes the rows added since the previous one, plus the
+    state file. The drawdown episodes kept with keep_drawdowns=True are also
+    stored as rows, so the state file does not depend on the number of bars,
+    but it grows with the pending orders and with the checkpoint_fields,
+    which are written in full on every save. Rows written after the last
+    state file (e.g. if the process died while saving) are ignored when
+    restoring.
+    '''
+
+    def __init__(self, folder: str, interval: Optional[int] = None):
+        self.folder = folder
+        self.interval = interval
+        self.saves = 0
+        self._written: Dict[str, int] = {}
+        self._drawdowns = np.empty((0, 3))
+        os.makedirs(folder, exist_ok=True)
+
+    def _get_path(self, name: str) -> str:
+        return os.path.join(self.folder, f'{name}.bin')
+
+    def after_bar(self, strategy: Any) -> None:
+        if self.interval is not None and strategy.current_period % self.interval == 0:
+            self.save(strategy)
+
+    def _get_drawdowns(self, metrics: Any) -> np.ndarray:
+        # Every episode but the last one is final, and only the new ones are converted to rows
+        size = max(len(metrics.drawdowns) - 1, 0)
+        if len(self._drawdowns) < size:
+            new_rows = [[drawdown['min'], drawdown['max'], drawdown['drawdown']] for drawdown in metrics.drawdowns[len(self._drawdowns):size]]
+            self._drawdowns = np.concatenate((self._drawdowns, np.array(new_rows, dtype=float)))
+        return self._drawdowns[:size]
+
+    def save(self, strategy: Any) -> None:
+        initial_bars = strategy._initial_bars
+        lengths = {}
+        shapes = {}
+        streams = _get_streams(strategy, initial_bars)
+        streams['drawdowns'] = self._get_drawdowns(strategy.metrics)
+        for name, values in streams.items():
+            start = min(self._written.get(name, 0), len(values))
+            with open(self._get_path(name), 'r+b' if os.path.exists(self._get_path(name)) else 'wb') as stream_file:
+                row_bytes = values.dtype.itemsize*int(np.prod(values.shape[1:]))
+                stream_file.truncate(start*row_bytes)
+                stream_file.seek(start*row_bytes)
+                stream_file.write(np.ascontiguousarray(values[start:]).tobytes())
+            self._written[name] = len(values)
+            lengths[name] = len(values)
+            shapes[name] = (values.dtype.str, values.shape[1:])
+
+        indicator_set = strategy._indicator_set
+        state = {
+            'version': CHECKPOINT_VERSION,
+            'strategy_class': type(strategy).__qualname__,
+            'initial_bars': initial_bars,
+            'interval': self.interval,
+            'streams': {name: (lengths[name], *shapes[name]) for name in lengths},
+            'fields': {field: getattr(strategy, field) for field in STRATEGY_FIELDS},
+            'metrics': {name: value for name, value in vars(strategy.metrics).items() if name != 'drawdowns'},
+            'last_drawdown': strategy.metrics.drawdowns[-1] if strategy.metrics.drawdowns else None,
+            'order_book': strategy.order_book,
+            'streaming': isinstance(strategy.bars, GrowableBarData),
+            'indicators': indicator_set.indicators if indicator_set._streaming else None,
+            'indicator_outputs': list(indicator_set.get_values()),
+            'timeframes': {
+                rule: {
+                    'columns': timeframe.columns,
+                    'tz': timeframe.tz,
+                    'last_start': timeframe._starts[timeframe._size-1] if timeframe._size > 0 else None,
+                    'last_values': timeframe._values[:, timeframe._size-1].copy() if timeframe._size > 0 else None
+                }
+                for rule, timeframe in strategy._timeframes.items()
+            },
+            'user_state': strategy.get_checkpoint_state()
+        }
+        state_path = os.path.join(self.folder, STATE_FILE)
+        with open(state_path + '.tmp', 'wb') as state_file:
+            pickle.dump(state, state_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(state_path + '.tmp', state_path)
+        self.saves += 1
+
+    def _read_stream(self, name: str, stream: Tuple[int, str, Tuple[int, ...]]) -> np.ndarray:
+        length, dtype, row_shape = stream
+        dtype = np.dtype(dtype)
+        count = length*int(np.prod(row_shape))
+        values = np.fromfile(self._get_path(name), dtype=dtype, count=count) if count > 0 else np.empty(0, dtype=dtype)
+        return values.reshape((length, *row_shape))
+
+    def restore(self, strategy: Any) -> None:
+        '''
+        Loads the last saved state into strategy, which must have been
+        created with the same arguments (and so the same bars and indicators)
+        as the checkpointed one.
+        '''
+        try:
+            with open(os.path.join(self.folder, STATE_FILE), 'rb') as state_file:
+                state = pickle.load(state_file)
+        except OSError:
+            raise Exception(f'ERROR: no checkpoint found in {self.folder}')
+        if state['version'] != CHECKPOINT_VERSION:
+            raise Exception(f'ERROR: unsupported checkpoint version {state["version"]}')
+        if state['strategy_class'] != type(strategy).__qualname__:
+            raise Exception(f'ERROR: the checkpoint is of a {state["strategy_class"]} strategy.')
+        if state['initial_bars'] != len(strategy.bars) or state['initial_bars'] != strategy._initial_bars:
+            raise Exception('ERROR: the strategy was not created with the bars of the checkpoint.')
+
+        streams = {name: self._read_stream(name, stream) for name, stream in state['streams'].items()}
+        self._written = {name: len(values) for name, values in streams.items()}
+        self.interval = state['interval']
+
+        indicator_set = strategy._indicator_set
+        if state['indicator_outputs'] != list(indicator_set.get_values()):
+            raise Exception('ERROR: the strategy does not have the indicators of the checkpoint.')
+
+        if state['streaming']:
+            bars = GrowableBarData(strategy.bars, max(1024, state['initial_bars'] + len(streams['bar_dates'])))
+            bars.extend(streams['bar_dates'], streams['bar_values'])
+            strategy.bars = bars
+            strategy._bind_bars()
+            indicator_set.indicators = state['indicators']
+            indicator_set._streaming = True
+            for output, values in indicator_set.get_values().items():
+                indicator_set._values[output] = np.concatenate((values[:state['initial_bars']], streams[f'indicator_{output}']))
+            indicator_set._size = len(bars)
+
+        strategy.equity_curve.set_values(streams['equity'])
+        strategy.trades.set_values(streams['trade_periods'], streams['trade_prices'], streams['trade_number_shares'], streams['trade_types'])
+
+        strategy._timeframes = {}
+        for rule, timeframe_state in state['timeframes'].items():
+            starts = streams[f'timeframe_{rule}_starts']
+            values = streams[f'timeframe_{rule}_values'].T
+            if timeframe_state['last_start'] is not None:
+                starts = np.append(starts, timeframe_state['last_start'])
+                values = np.column_stack((values, timeframe_state['last_values']))
+            strategy._timeframes[rule] = Timeframe.from_arrays(
+                rule, timeframe_state['columns'], timeframe_state['tz'], starts, values, streams[f'timeframe_{rule}_closed']
+            )
+
+        for field, value in state['fields'].items():
+            setattr(strategy, field, value)
+        vars(strategy.metrics).update(state['metrics'])
+        self._drawdowns = streams['drawdowns']
+        strategy.metrics.drawdowns = [
+            {'min': minimum, 'max': maximum, 'drawdown': drawdown} for minimum, maximum, drawdown in self._drawdowns.tolist()
+        ]
+        if state['last_drawdown'] is not None:
+            strategy.metrics.drawdowns.append(dict(state['last_drawdown']))
+        strategy.order_book = state['order_book']
+        strategy.set_checkpoint_state(state['user_state'])
@@ -1,3 +1,9 @@
+from bisect import bisect_right
+import math
+from typing import List, Tuple
+import numpy as np
+
+
 
 class CommissionCalculator:
     '''
@@ -32,6 +38,80 @@ class CommissionCalculator:
     {'amount': 2, 'percentage': 1}
     '''
 
+    @classmethod
+    def compile(cls, commission_config) -> 'CompiledCommission':
+        '''
+        Validates the config and builds a CompiledCommission, which is much
+        faster to evaluate than get_commission_cost.
+        '''
+        if isinstance(commission_config, dict) and 'buy' in commission_config and 'sell' in commission_config:
+            if set(commission_config.keys()) != {'buy', 'sell'}:
+                raise Exception("ERROR: commission config not valid. Buy/sell config must only have 'buy' and 'sell' keys.")
+            return CompiledCommission(
+                buy=cls._compile_schedule(commission_config['buy']),
+                sell=cls._compile_schedule(commission_config['sell'])
+            )
+        schedule = cls._compile_schedule(commission_config)
+        return CompiledCommission(buy=schedule, sell=schedule, split=False)
+
+    @classmethod
+    def _compile_single_config(cls, commission_single_config) -> Tuple[float, float]:
+        if not isinstance(commission_single_config, dict):
+            raise Exception(f"ERROR: commission config not valid. {commission_single_config}")
+        unknown_keys = set(commission_single_config.keys()) - {'amount', 'percentage'}
+        if unknown_keys or len(commission_single_config) == 0:
+            raise Exception(f"ERROR: commission config not valid. {commission_single_config}")
+        for value in commission_single_config.values():
+            if not isinstance(value, (int, float)) or value < 0:
+                raise Exception(f"ERROR: commission config not valid. {commission_single_config}")
+        amount = commission_single_config.get('amount', 0)
+        rate = commission_single_config['percentage']/100 if 'percentage' in commission_single_config else 0
+        return amount, rate
+
+    @classmethod
+    def _compile_schedule(cls, commission_config) -> 'CommissionSchedule':
+        if isinstance(commission_config, dict):
+            amount, rate = cls._compile_single_config(commission_config)
+            return CommissionSchedule([-float('inf')], [amount], [rate])
+
+        if not isinstance(commission_config, list) or len(commission_config) == 0:
+            raise Exception("ERROR: commission config not valid.")
+
+        tiers = []
+        for commission in commission_config:
+            if not isinstance(commission, dict):
+                raise Exception(f"ERROR: commission config not valid. {commission}")
+            if 'interval' in commission:
+                start, end = commission['interval']
+            elif 'greater_than' in commission:
+                start, end = commission['greater_than'], float('inf')
+            else:
+                raise Exception(f"ERROR: commission interval not valid. {commission}")
+            if not start < end:
+                raise Exception(f"ERROR: commission interval not valid. {commission}")
+            tier_config = cls._get_interval_commission(commission)
+            tiers.append((start, end, cls._compile_single_config(tier_config)))
+
+        tiers.sort(key=lambda tier: tier[0])
+        if tiers[0][0] > 0 or tiers[-1][1] != float('inf'):
+            raise Exception("ERROR: commission intervals must cover every amount from 0 to infinity.")
+        for (_, end, _), (next_start, _, _) in zip(tiers, tiers[1:]):
+            if end != next_start:
+                raise Exception(f"ERROR: commission intervals must be contiguous and not overlap. Gap or overlap at {min(end, next_start)}.")
+
+        return CommissionSchedule(
+            [tier[0] for tier in tiers],
+            [tier[2][0] for tier in tiers],
+            [tier[2][1] for tier in tiers]
+        )
+
+    @classmethod
+    def _get_interval_commission(cls, commission) -> dict:
+        if 'commission' in commission:
+            return commission['commission']
+        # Flat format, e.g. {'interval': (0, 1000), 'amount': 5}
+        return {key: value for key, value in commission.items() if key not in ('interval', 'greater_than')}
+
     @classmethod
     def _get_commision_cost(cls, commission_single_config, operation_amount: float) -> float:
         if 'amount' in commission_single_config or 'percentage' in commission_single_config:
@@ -62,6 +142,116 @@ class CommissionCalculator:
                     if operation_amount >= commission['greater_than']:
                         apply_commission = True
                 if apply_commission:
-                    return cls._get_commision_cost(commission, operation_amount)
+                    return cls._get_commision_cost(cls._get_interval_commission(commission), operation_amount)
+            raise Exception(f"ERROR: no commission interval for operation amount {operation_amount}.")
         else:
-            raise Exception("ERROR: commission config not valid.")
\ No newline at end of file
+            raise Exception("ERROR: commission config not valid.")
+
+
+class CommissionSchedule:
+    '''
+    Commission tiers sorted by their lower bound. The cost of an amount in
+    tier i is amounts[i] + amount*rates[i].
+    '''
+
+    SEARCH_STEPS = 3
+
+    def __init__(self, starts: List[float], amounts: List[float], rates: List[float]):
+        self.starts = starts
+        self.amounts = amounts
+        self.rates = rates
+        self._starts_array = np.array(starts, dtype=float)
+        self._amounts_array = np.array(amounts, dtype=float)
+        self._rates_array = np.array(rates, dtype=float)
+
+    def get_tier(self, operation_amount: float) -> int:
+        tier = bisect_right(self.starts, operation_amount) - 1
+        if tier < 0:
+            raise Exception(f"ERROR: no commission interval for operation amount {operation_amount}.")
+        return tier
+
+    def __call__(self, operation_amount: float) -> float:
+        if len(self.starts) == 1:
+            return self.amounts[0] + operation_amount*self.rates[0]
+        tier = self.get_tier(operation_amount)
+        return self.amounts[tier] + operation_amount*self.rates[tier]
+
+    def _fits(self, budget: float, price: float, number_shares: int) -> bool:
+        operation_amount = price*number_shares
+        return budget >= operation_amount + self(operation_amount)
+
+    def get_max_shares(self, budget: float, price: float) -> int:
+        '''
+        Largest number of shares whose cost plus commission fits in budget.
+        The bound of every tier is solved in closed form and then checked
+        with a search of a few shares around it, to absorb rounding.
+        '''
+        if budget <= 0 or price <= 0:
+            return 0
+
+        max_shares = int(budget//price)
+        best = 0
+        for tier, start in enumerate(self.starts):
+            end = self.starts[tier+1] if tier+1 < len(self.starts) else float('inf')
+            number_shares = (budget - self.amounts[tier])/((1 + self.rates[tier])*price)
+            if end != float('inf'):
+                number_shares = min(number_shares, math.ceil(end/price) - 1)
+            if number_shares < 1:
+                continue
+            number_shares = min(int(number_shares), max_shares)
+            min_shares = max(math.ceil(start/price), 1) if start != -float('inf') else 1
+            if number_shares < min_shares or number_shares <= best:
+                continue
+
+            for _ in range(self.SEARCH_STEPS):
+                if number_shares < min_shares or self._fits(budget, price, number_shares):
+                    break
+                number_shares -= 1
+            if number_shares < min_shares or not self._fits(budget, price, number_shares):
+                continue
+            for _ in range(self.SEARCH_STEPS):
+                if number_shares + 1 > max_shares or not self._fits(budget, price, number_shares + 1):
+                    break
+                number_shares += 1
+            best = max(best, number_shares)
+
+        return best
+
+    def get_costs(self, operation_amounts: np.ndarray) -> np.ndarray:
+        operation_amounts = np.asarray(operation_amounts, dtype=float)
+        tiers = np.searchsorted(self._starts_array, operation_amounts, side='right') - 1
+        if np.any(tiers < 0):
+            raise Exception("ERROR: no commission interval for some operation amounts.")
+        return self._amounts_array[tiers] + operation_amounts*self._rates_array[tiers]
+
+
+class CompiledCommission:
+    '''
+    Commission config compiled by CommissionCalculator.compile.
+    compiled(operation_amount, 'buy') gives the cost of one operation and
+    compiled.get_costs(operation_amounts, 'buy') the costs of a whole array.
+    '''
+
+    def __init__(self, buy: CommissionSchedule, sell: CommissionSchedule, split: bool = True):
+        self.buy = buy
+        self.sell = sell
+        self.split = split
+        self._schedules = {'buy': buy, 'sell': sell}
+        if not split:
+            self._schedules[''] = buy
+
+    def get_schedule(self, operation_type: str = '') -> CommissionSchedule:
+        if operation_type not in self._schedules:
+            raise Exception(f"ERROR: operation type '{operation_type}' not valid for this commission config.")
+        return self._schedules[operation_type]
+
+    def __call__(self, operation_amount: float, operation_type: str = '') -> float:
+        if operation_type in self._schedules:
+            return self._schedules[operation_type](operation_amount)
+        return self.get_schedule(operation_type)(operation_amount)
+
+    def get_costs(self, operation_amounts: np.ndarray, operation_type: str = '') -> np.ndarray:
+        return self.get_schedule(operation_type).get_costs(operation_amounts)
+
+    def get_max_shares(self, budget: float, price: float, operation_type: str = 'buy') -> int:
+        return self.get_schedule(operation_type).get_max_shares(budget, price)
\ No newline at end of file
@@ -0,0 +1,136 @@
+import json
+import os
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+
+CACHE_FOLDER = '.cache'
+MANIFEST_FILE = 'manifest.json'
+CACHE_VERSION = 1
+
+
+def get_files_signature(file_names: List[str]) -> Dict[str, List[int]]:
+    signature = {}
+    for file_name in file_names:
+        stat = os.stat(file_name)
+        signature[os.path.basename(file_name)] = [stat.st_size, stat.st_mtime_ns]
+    return signature
+
+
+def _get_cache_folder(folder: str) -> str:
+    return os.path.join(folder, CACHE_FOLDER)
+
+
+def _read_manifest(folder: str) -> Optional[Dict[str, Any]]:
+    manifest_path = os.path.join(_get_cache_folder(folder), MANIFEST_FILE)
+    try:
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != CACHE_VERSION:
+        return None
+    return manifest
+
+
+def load_folder_cache(folder: str, signature: Dict[str, List[int]]) -> Optional[DataFrame]:
+    '''
+    Returns the cached DataFrame of the folder with the columns memory-mapped
+    from disk, or None if there is no cache or any source file has changed.
+    '''
+    manifest = _read_manifest(folder)
+    if manifest is None or manifest['files'] != signature:
+        return None
+
+    cache_folder = _get_cache_folder(folder)
+    index_values = np.load(os.path.join(cache_folder, manifest['index_file']), mmap_mode='r')
+    index = pd.DatetimeIndex(index_values.view('datetime64[ns]'), name=manifest['index_name'])
+    if manifest['tz'] is not None:
+        index = index.tz_localize('UTC').tz_convert(manifest['tz'])
+
+    # One 2D array per dtype, so pandas can use each of them as a block without copying
+    blocks = []
+    for block in manifest['blocks']:
+        values = np.load(os.path.join(cache_folder, block['file']), mmap_mode='r')
+        blocks.append(pd.DataFrame(values, index=index, columns=block['columns'], copy=False))
+
+    if len(blocks) == 1:
+        return blocks[0]
+    return pd.concat(blocks, axis=1, copy=False)
+
+
+def write_folder_cache(folder: str, signature: Dict[str, List[int]], df: DataFrame) -> bool:
+    if any(df[column].dtype == object for column in df.columns):
+        # Object columns can not be memory-mapped
+        return False
+
+    cache_folder = _get_cache_folder(folder)
+    os.makedirs(cache_folder, exist_ok=True)
+    manifest_path = os.path.join(cache_folder, MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+    index = df.index
+    tz = None
+    if index.tz is not None:
+        tz = str(index.tz)
+        index = index.tz_convert('UTC').tz_localize(None)
+    np.save(os.path.join(cache_folder, 'index.npy'), index.to_numpy(dtype='datetime64[ns]').view(np.int64))
+
+    blocks = []
+    columns_by_dtype: Dict[str, List[str]] = {}
+    for column in df.columns:
+        columns_by_dtype.setdefault(str(df[column].dtype), []).append(column)
+    for i, (dtype, columns) in enumerate(columns_by_dtype.items()):
+        file_name = f'block_{i}.npy'
+        np.save(os.path.join(cache_folder, file_name), np.ascontiguousarray(df[columns].to_numpy(dtype=dtype)))
+        blocks.append({'file': file_name, 'columns': columns, 'dtype': dtype})
+
+    manifest = {
+        'version': CACHE_VERSION,
+        'files': signature,
+        'index_file': 'index.npy',
+        'index_name': df.index.name,
+        'tz': tz,
+        'blocks': blocks
+    }
+    # The manifest is written last, so a cache is never read half written
+    with open(manifest_path + '.tmp', 'w') as manifest_file:
+        json.dump(manifest, manifest_file)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return True
+
+
+FILE_RANGES_FILE = 'file_ranges.json'
+
+
+def load_file_ranges(folder: str, signature: Dict[str, List[int]]) -> Dict[str, Optional[List[int]]]:
+    '''
+    Returns the stored [min, max] Datetime (UTC nanoseconds) of every file
+    whose size and mtime have not changed, or None for the empty ones.
+    '''
+    ranges_path = os.path.join(_get_cache_folder(folder), FILE_RANGES_FILE)
+    try:
+        with open(ranges_path) as ranges_file:
+            stored_ranges = json.load(ranges_file)
+    except (OSError, ValueError):
+        return {}
+    return {
+        name: stored['range'] for name, stored in stored_ranges.items()
+        if signature.get(name) == stored['signature']
+    }
+
+
+def write_file_ranges(folder: str, signature: Dict[str, List[int]], file_ranges: Dict[str, Optional[List[int]]]) -> None:
+    cache_folder = _get_cache_folder(folder)
+    os.makedirs(cache_folder, exist_ok=True)
+    stored_ranges = {
+        name: {'signature': signature[name], 'range': file_range}
+        for name, file_range in file_ranges.items() if name in signature
+    }
+    ranges_path = os.path.join(cache_folder, FILE_RANGES_FILE)
+    with open(ranges_path + '.tmp', 'w') as ranges_file:
+        json.dump(stored_ranges, ranges_file)
+    os.replace(ranges_path + '.tmp', ranges_path)
@@ -0,0 +1,220 @@
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+import glob
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from src.backtesting_engine.data_cache import get_files_signature, load_file_ranges, write_file_ranges
+from src.backtesting_engine.type_dict_classes import DownloadResult
+
+DATA_FOLDER = os.path.join('.', 'data')
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+# ConnectionError, TimeoutError and the exceptions of requests are all OSError
+TRANSIENT_ERRORS = (OSError,)
+
+
+class DataProvider(ABC):
+    '''
+    Source of historical bars. fetch returns a DataFrame with a
+    DatetimeIndex and the OHLCV columns. Failures that can go away by
+    retrying (network errors, timeouts) raise one of TRANSIENT_ERRORS, and
+    any other exception, e.g. for an unknown symbol, is not retried.
+    '''
+
+    @abstractmethod
+    def fetch(self, symbol: str, start: Optional[pd.Timestamp], end: Optional[pd.Timestamp], interval: str) -> DataFrame:
+        pass
+
+
+class YFinanceProvider(DataProvider):
+
+    def fetch(self, symbol: str, start: Optional[pd.Timestamp], end: Optional[pd.Timestamp], interval: str) -> DataFrame:
+        import yfinance
+
+        if start is None:
+            return yfinance.Ticker(symbol).history(period='max', interval=interval, end=end, auto_adjust=False)
+        return yfinance.Ticker(symbol).history(start=start, end=end, interval=interval, auto_adjust=False)
+
+
+class FakeProvider(DataProvider):
+    '''
+    Serves slices of in-memory DataFrames, without network access. The first
+    failures[symbol] calls for a symbol raise ConnectionError, to exercise the
+    retries, and every call is counted in calls.
+    '''
+
+    def __init__(self, data: Dict[str, DataFrame], failures: Optional[Dict[str, int]] = None):
+        self.data = data
+        self.failures = dict(failures) if failures is not None else {}
+        self.calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def fetch(self, symbol: str, start: Optional[pd.Timestamp], end: Optional[pd.Timestamp], interval: str) -> DataFrame:
+        with self._lock:
+            self.calls[symbol] = self.calls.get(symbol, 0) + 1
+            if self.failures.get(symbol, 0) > 0:
+                self.failures[symbol] -= 1
+                raise ConnectionError(f'fake failure for {symbol}')
+        if symbol not in self.data:
+            raise Exception(f'ERROR: unknown symbol {symbol}')
+
+        df = self.data[symbol]
+        dates = _to_utc(df.index)
+        mask = np.ones(len(df), dtype=bool)
+        if start is not None:
+            mask &= dates >= _to_utc_timestamp(start)
+        if end is not None:
+            mask &= dates < _to_utc_timestamp(end)
+        return df[mask]
+
+
+def _to_utc(index: pd.DatetimeIndex) -> pd.DatetimeIndex:
+    return index.tz_convert('UTC') if index.tz is not None else index.tz_localize('UTC')
+
+
+def _to_utc_timestamp(date: pd.Timestamp) -> pd.Timestamp:
+    date = pd.Timestamp(date)
+    return date.tz_convert('UTC') if date.tz is not None else date.tz_localize('UTC')
+
+
+def get_last_timestamp(folder: str) -> Optional[pd.Timestamp]:
+    '''
+    Last stored Datetime (UTC) of the CSV files of a folder, or None when
+    there are no bars. The ranges stored by read_files_from_folder are used
+    for the files that have not changed, so only the other files are read.
+    '''
+    csv_files = sorted(glob.glob(os.path.join(folder, '*.csv')))
+    if len(csv_files) == 0:
+        return None
+
+    signature = get_files_signature(csv_files)
+    file_ranges = load_file_ranges(folder, signature)
+    for file_name in csv_files:
+        name = os.path.basename(file_name)
+        if name not in file_ranges:
+            datetimes = pd.to_datetime(pd.read_csv(file_name, usecols=['Datetime'])['Datetime'], utc=True)
+            file_ranges[name] = [datetimes.min().value, datetimes.max().value] if len(datetimes) > 0 else None
+    write_file_ranges(folder, signature, file_ranges)
+
+    last_values = [file_range[1] for file_range in file_ranges.values() if file_range is not None]
+    return pd.Timestamp(max(last_values), tz='UTC') if last_values else None
+
+
+def _normalize_bars(df: DataFrame) -> DataFrame:
+    missing_columns = [column for column in OHLCV_COLUMNS if column not in df.columns]
+    if missing_columns:
+        raise Exception(f'ERROR: missing columns {missing_columns}')
+    df = df[OHLCV_COLUMNS]
+    df = df[~df.index.duplicated(keep='last')].sort_index()
+    df.index.name = 'Datetime'
+    return df
+
+
+def _fetch_with_retries(
+    provider: DataProvider,
+    symbol: str,
+    start: Optional[pd.Timestamp],
+    end: Optional[pd.Timestamp],
+    interval: str,
+    retries: int,
+    backoff: float
+) -> DataFrame:
+    for attempt in range(retries + 1):
+        try:
+            return provider.fetch(symbol, start, end, interval)
+        except TRANSIENT_ERRORS:
+            if attempt == retries:
+                raise
+            time.sleep(backoff*2**attempt)
+
+
+def update_symbol(
+    symbol: str,
+    provider: DataProvider,
+    interval: str = '1d',
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    data_folder: str = DATA_FOLDER,
+    retries: int = 3,
+    backoff: float = 1.0
+) -> DownloadResult:
+    '''
+    Downloads the bars of symbol after the last one stored in
+    data_folder/symbol, the folder read by read_files_from_folder(symbol),
+    and appends them to its symbol.csv file, created by the first download.
+    Other CSV files of the folder are only read. start is only used when
+    nothing is stored yet.
+    '''
+    folder = os.path.join(data_folder, symbol)
+    last_timestamp = get_last_timestamp(folder)
+    fetch_start = last_timestamp if last_timestamp is not None else (pd.Timestamp(start) if start is not None else None)
+    fetch_end = pd.Timestamp(end) if end is not None else None
+
+    df = _normalize_bars(_fetch_with_retries(provider, symbol, fetch_start, fetch_end, interval, retries, backoff))
+    if last_timestamp is not None:
+        df = df[_to_utc(df.index) > last_timestamp]
+    if len(df) == 0:
+        return {'symbol': symbol, 'new_bars': 0, 'file_name': None, 'last_date': last_timestamp, 'error': None}
+
+    dates = _to_utc(df.index)
+    os.makedirs(folder, exist_ok=True)
+    file_name = os.path.join(folder, f'{_get_safe_name(symbol)}.csv')
+    name = os.path.basename(file_name)
+    file_ranges = load_file_ranges(folder, get_files_signature(sorted(glob.glob(os.path.join(folder, '*.csv')))))
+    file_range = file_ranges.get(name)
+    first_value = file_range[0] if file_range is not None else dates[0].value
+
+    if os.path.exists(file_name):
+        # The new bars are after every stored one, so they are appended in a single write
+        with open(file_name, 'a', newline='') as csv_file:
+            csv_file.write(df.to_csv(header=False))
+    else:
+        df.to_csv(file_name + '.tmp')
+        os.replace(file_name + '.tmp', file_name)
+
+    # The new range of the file is stored, so the next update does not read it
+    signature = get_files_signature(sorted(glob.glob(os.path.join(folder, '*.csv'))))
+    file_ranges[name] = [first_value, dates[-1].value]
+    write_file_ranges(folder, signature, file_ranges)
+
+    return {'symbol': symbol, 'new_bars': len(df), 'file_name': file_name, 'last_date': dates[-1], 'error': None}
+
+
+def _get_safe_name(symbol: str) -> str:
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', symbol)
+
+
+def download_symbols(
+    symbols: List[str],
+    provider: Optional[DataProvider] = None,
+    interval: str = '1d',
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    data_folder: str = DATA_FOLDER,
+    max_workers: int = 8,
+    retries: int = 3,
+    backoff: float = 1.0
+) -> Dict[str, DownloadResult]:
+    '''
+    Updates the stored bars of many symbols, with at most max_workers
+    downloads at the same time. A symbol that still fails after the retries
+    does not stop the others: its error is returned in its result.
+    '''
+    if provider is None:
+        provider = YFinanceProvider()
+
+    def update(symbol: str) -> DownloadResult:
+        try:
+            return update_symbol(symbol, provider, interval, start, end, data_folder, retries, backoff)
+        except Exception as e:
+            return {'symbol': symbol, 'new_bars': 0, 'file_name': None, 'last_date': None, 'error': repr(e)}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(update, symbols))
+    return {result['symbol']: result for result in results}
@@ -0,0 +1,159 @@
+from abc import ABC, abstractmethod
+import json
+import logging
+from typing import Any, Dict, IO, Iterable, List, Optional
+from datetime import date as date_type
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+
+EVENT_LEVELS = {
+    'simulation_start': logging.INFO,
+    'simulation_end': logging.INFO,
+    'bar': logging.DEBUG,
+    'order_created': logging.INFO,
+    'order_filled': logging.INFO,
+    'order_canceled': logging.INFO
+}
+
+
+class EventSink(ABC):
+    '''
+    Receives the events of a strategy. accepts is checked before the event
+    fields are built, so events a sink does not accept cost nothing.
+    '''
+
+    @abstractmethod
+    def accepts(self, event: str) -> bool:
+        pass
+
+    @abstractmethod
+    def handle(self, event: str, date: Any, fields: Dict[str, Any]) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class LoggingSink(EventSink):
+    '''
+    Writes the events as log messages, only if the logger is enabled for
+    the level of the event.
+    '''
+
+    def __init__(self, logger: Optional[logging.Logger] = None):
+        self.logger = logger if logger is not None else logging.getLogger()
+
+    def accepts(self, event: str) -> bool:
+        return self.logger.isEnabledFor(EVENT_LEVELS.get(event, logging.INFO))
+
+    def handle(self, event: str, date: Any, fields: Dict[str, Any]) -> None:
+        level = EVENT_LEVELS.get(event, logging.INFO)
+        symbol = f' {fields["symbol"]}' if 'symbol' in fields else ''
+
+        if event == 'simulation_start':
+            self.logger.log(level, f'START {fields["name"]} SIMULATION')
+        elif event == 'simulation_end':
+            self.logger.log(level, f'END {fields["name"]} SIMULATION')
+        elif event == 'bar':
+            self.logger.log(level, f'{date} OPEN: {fields["open"]}, CLOSE: {fields["close"]}')
+        elif event == 'order_created':
+            self.logger.log(level, f'{date} CREATE {fields["type"].upper()} ORDER{symbol}. {fields["options"]}')
+        elif event == 'order_filled':
+            self.logger.log(level, f'{date} {fields["type"].upper()}{symbol} order completed')
+            self.logger.log(level, f'{date} >> Price: {fields["price"]}')
+            self.logger.log(level, f'{date} >> Capital: {fields["capital"]}')
+            if 'shares' in fields:
+                self.logger.log(level, f'{date} >> Shares: {fields["shares"]}')
+                self.logger.log(level, '---------------------------------------------------------')
+        elif event == 'order_canceled':
+            self.logger.log(level, f'Order canceled. {fields["reason"]}')
+        else:
+            self.logger.log(level, f'{date} {event.upper()}{symbol}. {fields}')
+
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, (pd.Timestamp, date_type)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+class JournalSink(EventSink):
+    '''
+    Appends the accepted events to a JSON lines file, one object per event
+    with the event name, the bar date and the event fields. By default only
+    the order events are written.
+    '''
+
+    def __init__(self, path: str, events: Iterable[str] = ('order_created', 'order_filled', 'order_canceled')):
+        self.path = path
+        self.events = set(events)
+        self._file: Optional[IO[str]] = open(path, 'a')
+
+    def accepts(self, event: str) -> bool:
+        return event in self.events
+
+    def handle(self, event: str, date: Any, fields: Dict[str, Any]) -> None:
+        record = {'event': event, 'date': date}
+        record.update(fields)
+        self._file.write(json.dumps(record, default=_to_json))
+        self._file.write('\n')
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The file is reopened in append mode by other processes
+        return {'path': self.path, 'events': self.events}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(**state)
+
+
+def read_journal(path: str) -> DataFrame:
+    '''
+    Reads a journal written by JournalSink into a DataFrame with a row per event.
+    '''
+    with open(path) as journal:
+        records = [json.loads(line) for line in journal if line.strip()]
+    df = pd.DataFrame.from_records(records)
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'], utc=True)
+    return df
+
+
+class Tracer:
+    '''
+    Sends the events of a strategy to its sinks. A Tracer without sinks is
+    the quiet mode: no event is built or formatted.
+    '''
+
+    def __init__(self, sinks: Optional[Iterable[EventSink]] = None):
+        self.sinks: List[EventSink] = list(sinks) if sinks is not None else []
+        self.active = len(self.sinks) > 0
+
+    def add_sink(self, sink: EventSink) -> None:
+        self.sinks.append(sink)
+        self.active = True
+
+    def is_enabled(self, event: str) -> bool:
+        if not self.active:
+            return False
+        for sink in self.sinks:
+            if sink.accepts(event):
+                return True
+        return False
+
+    def emit(self, event: str, date: Any, **fields) -> None:
+        for sink in self.sinks:
+            if sink.accepts(event):
+                sink.handle(event, date, fields)
+
+    def close(self) -> None:
+        for sink in self.sinks:
+            sink.close()
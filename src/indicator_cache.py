@@ -0,0 +1,167 @@
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+from typing import Any, Dict, Optional
+import numpy as np
+
+from src.backtesting_engine.indicators import Indicator
+
+
+def get_array_fingerprint(values: np.ndarray, sample_size: Optional[int] = None) -> str:
+    '''
+    Hash of an array. By default every value is hashed. With sample_size,
+    only the first and last 1024 values plus sample_size evenly spaced ones
+    are hashed, so the cost does not depend on the length of the data, but
+    a change in any other value gives the same fingerprint.
+    '''
+    values = np.ascontiguousarray(values)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f'{values.dtype.str}{values.shape}'.encode())
+    if sample_size is None or len(values) <= sample_size + 2048:
+        digest.update(values.tobytes())
+    else:
+        step = len(values)//sample_size
+        digest.update(values[:1024].tobytes())
+        digest.update(values[::step].tobytes())
+        digest.update(values[-1024:].tobytes())
+    return digest.hexdigest()
+
+
+class IndicatorCache:
+    '''
+    Memoizes Indicator.compute results, keyed by a fingerprint of the data
+    the indicator reads plus the indicator class and params.
+
+    Results are kept in an in-memory LRU limited to max_bytes and, if
+    folder is given, also stored as .npz files that other processes and
+    later runs can load.
+
+    sample_size makes the fingerprints hash only a sample of every column
+    (see get_array_fingerprint). It is unsafe: data that only differs outside
+    the sample gets the cached values of the other data, also from the disk.
+    '''
+
+    def __init__(self, max_bytes: int = 512*1024**2, folder: Optional[str] = None, sample_size: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.folder = folder
+        self.sample_size = sample_size
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: 'OrderedDict[str, Dict[str, np.ndarray]]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        if folder is not None:
+            os.makedirs(folder, exist_ok=True)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Only the configuration is sent to other processes, not the cached arrays
+        return {'max_bytes': self.max_bytes, 'folder': self.folder, 'sample_size': self.sample_size}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(**state)
+
+    def get_key(self, indicator: Indicator, bars: Any) -> str:
+        # Only the columns the indicator reads are hashed, or every column when it does not say
+        columns = indicator.input_columns if indicator.input_columns is not None else list(bars.df.columns)
+
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f'{type(indicator).__module__}.{type(indicator).__qualname__}'.encode())
+        digest.update(repr(sorted(indicator.params.items())).encode())
+        digest.update(repr(indicator.outputs).encode())
+        for column in sorted(set(columns)):
+            digest.update(column.encode())
+            digest.update(get_array_fingerprint(indicator.get_column(bars, column), self.sample_size).encode())
+        return digest.hexdigest()
+
+    def compute(self, indicator: Indicator, bars: Any) -> Dict[str, np.ndarray]:
+        key = self.get_key(indicator, bars)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        values = self._load(key)
+        if values is not None:
+            with self._lock:
+                self.disk_hits += 1
+        else:
+            values = {output: np.asarray(output_values, dtype=float) for output, output_values in indicator.compute(bars).items()}
+            with self._lock:
+                self.misses += 1
+            self._save(key, values)
+
+        for output_values in values.values():
+            output_values.setflags(write=False)
+        self._add(key, values)
+        return values
+
+    def _add(self, key: str, values: Dict[str, np.ndarray]) -> None:
+        nbytes = sum(output_values.nbytes for output_values in values.values())
+        if nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = values
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                _, old_values = self._entries.popitem(last=False)
+                self._bytes -= sum(output_values.nbytes for output_values in old_values.values())
+                self.evictions += 1
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.folder, f'{key}.npz')
+
+    def _load(self, key: str) -> Optional[Dict[str, np.ndarray]]:
+        if self.folder is None:
+            return None
+        try:
+            with np.load(self._get_path(key)) as stored:
+                return {output: stored[output] for output in stored.files}
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, key: str, values: Dict[str, np.ndarray]) -> None:
+        if self.folder is None:
+            return
+        tmp_path = f'{self._get_path(key)}.{os.getpid()}.tmp.npz'
+        np.savez(tmp_path, **values)
+        os.replace(tmp_path, self._get_path(key))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        requests = self.hits + self.disk_hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': (self.hits + self.disk_hits)/requests if requests > 0 else 0,
+            'entries': len(self._entries),
+            'bytes': self._bytes
+        }
+
+
+_default_cache: Optional[IndicatorCache] = None
+
+
+def set_indicator_cache(cache: Optional[IndicatorCache]) -> None:
+    '''
+    Sets the cache used by Strategy.add_indicator. None disables caching.
+    '''
+    global _default_cache
+    _default_cache = cache
+
+
+def get_indicator_cache() -> Optional[IndicatorCache]:
+    return _default_cache
@@ -0,0 +1,427 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Dict, List, Optional
+import math
+import numpy as np
+import pandas as pd
+
+
+class Indicator(ABC):
+    '''
+    Technical indicator with two ways of being computed:
+        compute(bars) returns the full arrays of every output at once.
+        update(bar) takes the next bar (a dict with Open, High, Low, Close...)
+            and returns the new value of every output in O(1).
+
+    Both ways give the same values up to floating point rounding.
+
+    input_columns lists the columns of the bars that compute reads, which
+    key the indicator cache. None means every column.
+    '''
+
+    in_candle_chart = True
+    input_columns: Optional[List[str]] = None
+
+    def __init__(self, name: str, outputs: Optional[List[str]] = None, **params: Any):
+        self.name = name
+        self.outputs = outputs if outputs is not None else [name]
+        self.params = params
+
+    @abstractmethod
+    def compute(self, bars: Any) -> Dict[str, np.ndarray]:
+        pass
+
+    @abstractmethod
+    def update(self, bar: Dict[str, float]) -> Dict[str, float]:
+        pass
+
+    @abstractmethod
+    def reset(self) -> None:
+        pass
+
+    def get_column(self, bars: Any, column: str) -> np.ndarray:
+        if column in ('Open', 'High', 'Low', 'Close'):
+            return np.asarray(getattr(bars, column.lower()), dtype=float)
+        return bars.df[column].to_numpy(dtype=float)
+
+
+def _default_name(prefix: str, column: str, default_column: str, *params: Any) -> str:
+    name = '_'.join([prefix] + [str(param) for param in params])
+    if column != default_column:
+        name += f'_{column}'
+    return name
+
+
+class _RollingSum:
+    '''
+    Sum of the last period values, and with variance=True their running mean
+    and sum of squared deviations (Welford). NaN values are not added, and
+    the sum is NaN while any of them is in the window, like pandas rolling.
+    Every period values, the running values are recomputed from the window
+    in O(period), so rounding errors from adding and removing values do not
+    accumulate and each push still costs O(1) on average.
+    '''
+
+    def __init__(self, period: int, variance: bool = False):
+        self.period = period
+        self.variance = variance
+        self.window = deque()
+        self.total = 0.0
+        self.nan_count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self._pushes = 0
+
+    def _add(self, value: float) -> None:
+        self.total += value
+        if self.variance:
+            count = len(self.window) - self.nan_count
+            delta = value - self.mean
+            self.mean += delta/count
+            self.m2 += delta*(value - self.mean)
+
+    def _remove(self, value: float) -> None:
+        self.total -= value
+        if self.variance:
+            count = len(self.window) - self.nan_count
+            if count == 0:
+                self.mean = 0.0
+                self.m2 = 0.0
+            else:
+                delta = value - self.mean
+                self.mean -= delta/count
+                self.m2 -= delta*(value - self.mean)
+
+    def push(self, value: float) -> None:
+        self.window.append(value)
+        if math.isnan(value):
+            self.nan_count += 1
+        else:
+            self._add(value)
+        if len(self.window) > self.period:
+            old_value = self.window.popleft()
+            if math.isnan(old_value):
+                self.nan_count -= 1
+            else:
+                self._remove(old_value)
+
+        self._pushes += 1
+        if self._pushes >= self.period:
+            self._pushes = 0
+            self._recompute()
+
+    def _recompute(self) -> None:
+        values = [value for value in self.window if not math.isnan(value)]
+        self.total = math.fsum(values)
+        if self.variance:
+            self.mean = self.total/len(values) if values else 0.0
+            self.m2 = math.fsum((value - self.mean)**2 for value in values)
+
+    def is_full(self) -> bool:
+        return len(self.window) == self.period and self.nan_count == 0
+
+    def get_variance(self) -> float:
+        return max(self.m2, 0.0)/(len(self.window) - self.nan_count)
+
+
+class _ExponentialAverage:
+
+    def __init__(self, alpha: float, min_periods: int = 1):
+        self.alpha = alpha
+        self.min_periods = min_periods
+        self.count = 0
+        self.value = math.nan
+
+    def push(self, value: float) -> float:
+        if math.isnan(value):
+            return self.value if self.count >= self.min_periods else math.nan
+        self.count += 1
+        self.value = value if self.count == 1 else self.value + self.alpha*(value-self.value)
+        return self.value if self.count >= self.min_periods else math.nan
+
+
+def _ewm(values: np.ndarray, alpha: float, min_periods: int = 1) -> np.ndarray:
+    return pd.Series(values).ewm(alpha=alpha, adjust=False, min_periods=min_periods).mean().to_numpy()
+
+
+class SMA(Indicator):
+
+    def __init__(self, period: int, column: str = 'Close', name: Optional[str] = None):
+        super().__init__(name or _default_name('SMA', column, 'Close', period), period=period, column=column)
+        self.period = period
+        self.column = column
+        self.input_columns = [column]
+        self.reset()
+
+    def compute(self, bars: Any) -> Dict[str, np.ndarray]:
+        values = pd.Series(self.get_column(bars, self.column)).rolling(self.period).mean().to_numpy()
+        return {self.name: values}
+
+    def update(self, bar: Dict[str, float]) -> Dict[str, float]:
+        self._sum.push(bar[self.column])
+        value = self._sum.total/self.period if self._sum.is_full() else math.nan
+        return {self.name: value}
+
+    def reset(self) -> None:
+        self._sum = _RollingSum(self.period)
+
+
+class EMA(Indicator):
+
+    def __init__(self, period: int, column: str = 'Close', name: Optional[str] = None):
+        super().__init__(name or _default_name('EMA', column, 'Close', period), period=period, column=column)
+        self.period = period
+        self.column = column
+        self.input_columns = [column]
+        self.alpha = 2/(period+1)
+        self.reset()
+
+    def compute(self, bars: Any) -> Dict[str, np.ndarray]:
+        return {self.name: _ewm(self.get_column(bars, self.column), self.alpha)}
+
+    def update(self, bar: Dict[str, float]) -> Dict[str, float]:
+        return {self.name: self._average.push(bar[self.column])}
+
+    def reset(self) -> None:
+        self._average = _ExponentialAverage(self.alpha)
+
+
+class RSI(Indicator):
+
+    in_candle_chart = False
+
+    def __init__(self, period: int = 14, column: str = 'Close', name: Optional[str] = None):
+        super().__init__(name or _default_name('RSI', column, 'Close', period), period=period, column=column)
+        self.period = period
+        self.column = column
+        self.input_columns = [column]
+        self.reset()
+
+    def compute(self, bars: Any) -> Dict[str, np.ndarray]:
+        change = np.diff(self.get_column(bars, self.column), prepend=np.nan)
+        average_gain = _ewm(np.where(np.isnan(change), np.nan, np.maximum(change, 0)), 1/self.period, self.period)
+        average_loss = _ewm(np.where(np.isnan(change), np.nan, np.maximum(-change, 0)), 1/self.period, self.period)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = np.where(average_loss == 0, 100.0, 100 - 100/(1 + average_gain/average_loss))
+        return {self.name: np.where(np.isnan(average_gain), np.nan, values)}
+
+    def update(self, bar: Dict[str, float]) -> Dict[str, float]:
+        value = bar[self.column]
+        change = value - self._previous if self._previous is not None else math.nan
+        self._previous = value
+        average_gain = self._gain.push(max(change, 0) if not math.isnan(change) else math.nan)
+        average_loss = self._loss.push(max(-change, 0) if not math.isnan(change) else math.nan)
+        if math.isnan(average_gain):
+            return {self.name: math.nan}
+        if average_loss == 0:
+            return {self.name: 100.0}
+        return {self.name: 100 - 100/(1 + average_gain/average_loss)}
+
+    def reset(self) -> None:
+        self._previous = None
+        self._gain = _ExponentialAverage(1/self.period, self.period)
+        self._loss = _ExponentialAverage(1/self.period, self.period)
+
+
+class ATR(Indicator):
+
+    in_candle_chart = False
+    input_columns = ['High', 'Low', 'Close']
+
+    def __init__(self, period: int = 14, name: Optional[str] = None):
+        super().__init__(name or f'ATR_{period}', period=period)
+        self.period = period
+        self.reset()
+
+    def compute(self, bars: Any) -> Dict[str, np.ndarray]:
+        high = self.get_column(bars, 'High')
+        low = self.get_column(bars, 'Low')
+        previous_close = np.concatenate(([np.nan], self.get_column(bars, 'Close')[:-1]))
+        true_range = np.fmax(high - low, np.fmax(np.abs(high - previous_close), np.abs(low - previous_close)))
+        return {self.name: _ewm(true_range, 1/self.period, self.period)}
+
+    def update(self, bar: Dict[str, float]) -> Dict[str, float]:
+        true_range = bar['High'] - bar['Low']
+        if self._previous_close is not None:
+            true_range = max(true_range, abs(bar['High'] - self._previous_close), abs(bar['Low'] - self._previous_close))
+        self._previous_close = bar['Close']
+        return {self.name: self._average.push(true_range)}
+
+    def reset(self) -> None:
+        self._previous_close = None
+        self._average = _ExponentialAverage(1/self.period, self.period)
+
+
+class BollingerBands(Indicator):
+
+    def __init__(self, period: int = 20, deviations: float = 2, column: str = 'Close', name: Optional[str] = None):
+        name = name or _default_name('BB', column, 'Close', period, deviations)
+        super().__init__(name, [f'{name}_upper', f'{name}_middle', f'{name}_lower'], period=period, deviations=deviations, column=column)
+        self.period = period
+        self.deviations = deviations
+        self.column = column
+        self.input_columns = [column]
+        self.reset()
+
+    def compute(self, bars: Any) -> Dict[str, np.ndarray]:
+        rolling = pd.Series(self.get_column(bars, self.column)).rolling(self.period)
+        middle = rolling.mean().to_numpy()
+        deviation = rolling.std(ddof=0).to_numpy()
+        return dict(zip(self.outputs, [middle + self.deviations*deviation, middle, middle - self.deviations*deviation]))
+
+    def update(self, bar: Dict[str, float]) -> Dict[str, float]:
+        self._sum.push(bar[self.column])
+        if not self._sum.is_full():
+            return dict.fromkeys(self.outputs, math.nan)
+        middle = self._sum.total/self.period
+        deviation = math.sqrt(self._sum.get_variance())
+        return dict(zip(self.outputs, [middle + self.deviations*deviation, middle, middle - self.deviations*deviation]))
+
+    def reset(self) -> None:
+        self._sum = _RollingSum(self.period, variance=True)
+
+
+class MACD(Indicator):
+
+    in_candle_chart = False
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9, column: str = 'Close', name: Optional[str] = None):
+        name = name or _default_name('MACD', column, 'Close', fast, slow, signal)
+        super().__init__(name, [name, f'{name}_signal', f'{name}_hist'], fast=fast, slow=slow, signal=signal, column=column)
+        self.fast = fast
+        self.slow = slow
+        self.signal = signal
+        self.column = column
+        self.input_columns = [column]
+        self.reset()
+
+    def compute(self, bars: Any) -> Dict[str, np.ndarray]:
+        values = self.get_column(bars, self.column)
+        macd = _ewm(values, 2/(self.fast+1)) - _ewm(values, 2/(self.slow+1))
+        signal = _ewm(macd, 2/(self.signal+1))
+        return dict(zip(self.outputs, [macd, signal, macd - signal]))
+
+    def update(self, bar: Dict[str, float]) -> Dict[str, float]:
+        value = bar[self.column]
+        macd = self._fast.push(value) - self._slow.push(value)
+        signal = self._signal.push(macd)
+        return dict(zip(self.outputs, [macd, signal, macd - signal]))
+
+    def reset(self) -> None:
+        self._fast = _ExponentialAverage(2/(self.fast+1))
+        self._slow = _ExponentialAverage(2/(self.slow+1))
+        self._signal = _ExponentialAverage(2/(self.signal+1))
+
+
+class _RollingExtreme(Indicator):
+    '''
+    Rolling max/min. The incremental mode keeps a monotonic deque of
+    (period, value) pairs, so each update is amortized O(1).
+    '''
+
+    prefix = ''
+
+    def __init__(self, period: int, column: str = 'Close', name: Optional[str] = None):
+        super().__init__(name or _default_name(self.prefix, column, 'Close', period), period=period, column=column)
+        self.period = period
+        self.column = column
+        self.input_columns = [column]
+        self.reset()
+
+    @abstractmethod
+    def _is_dominated(self, old_value: float, new_value: float) -> bool:
+        pass
+
+    def update(self, bar: Dict[str, float]) -> Dict[str, float]:
+        value = bar[self.column]
+        while self._window and self._is_dominated(self._window[-1][1], value):
+            self._window.pop()
+        self._window.append((self._count, value))
+        if self._window[0][0] <= self._count - self.period:
+            self._window.popleft()
+        self._count += 1
+        return {self.name: self._window[0][1] if self._count >= self.period else math.nan}
+
+    def reset(self) -> None:
+        self._window = deque()
+        self._count = 0
+
+
+class RollingMax(_RollingExtreme):
+
+    prefix = 'MAX'
+
+    def compute(self, bars: Any) -> Dict[str, np.ndarray]:
+        return {self.name: pd.Series(self.get_column(bars, self.column)).rolling(self.period).max().to_numpy()}
+
+    def _is_dominated(self, old_value: float, new_value: float) -> bool:
+        return old_value <= new_value
+
+
+class RollingMin(_RollingExtreme):
+
+    prefix = 'MIN'
+
+    def compute(self, bars: Any) -> Dict[str, np.ndarray]:
+        return {self.name: pd.Series(self.get_column(bars, self.column)).rolling(self.period).min().to_numpy()}
+
+    def _is_dominated(self, old_value: float, new_value: float) -> bool:
+        return old_value >= new_value
+
+
+class IndicatorSet:
+    '''
+    Values of the indicators registered in a strategy. They are computed
+    with the vectorized mode when registered and, once streaming starts,
+    extended one bar at a time with the incremental mode.
+    '''
+
+    def __init__(self):
+        self.indicators: List[Indicator] = []
+        self._values: Dict[str, np.ndarray] = {}
+        self._size = 0
+        self._streaming = False
+
+    def __len__(self) -> int:
+        return len(self.indicators)
+
+    def add(self, indicator: Indicator, bars: Any, cache: Any = None) -> None:
+        for output in indicator.outputs:
+            if output in self._values:
+                raise Exception(f'ERROR: indicator {output} already exists.')
+
+        self.indicators.append(indicator)
+        self._size = len(bars)
+        indicator_values = cache.compute(indicator, bars) if cache is not None else indicator.compute(bars)
+        for output, values in indicator_values.items():
+            self._values[output] = np.array(values, dtype=float)
+
+        if self._streaming:
+            self._warm_up(indicator, bars)
+
+    def _warm_up(self, indicator: Indicator, bars: Any) -> None:
+        indicator.reset()
+        for period in range(len(bars)):
+            indicator.update(bars.get_record(period))
+
+    def start_streaming(self, bars: Any) -> None:
+        if not self._streaming:
+            self._streaming = True
+            for indicator in self.indicators:
+                self._warm_up(indicator, bars)
+
+    def append(self, bar: Dict[str, float]) -> None:
+        for indicator in self.indicators:
+            for output, value in indicator.update(bar).items():
+                values = self._values[output]
+                if self._size == len(values):
+                    values = np.concatenate((values, np.empty(max(len(values), 1))))
+                    self._values[output] = values
+                values[self._size] = value
+        self._size += 1
+
+    def get(self, name: str) -> np.ndarray:
+        return self._values[name][:self._size]
+
+    def get_values(self) -> Dict[str, np.ndarray]:
+        return {name: values[:self._size] for name, values in self._values.items()}
@@ -0,0 +1,166 @@
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, Series
+
+from src.backtesting_engine.type_dict_classes import CompletedOrder, DateValue
+
+TRADE_TYPES = ('purchase', 'sale')
+
+
+class EquityCurve:
+    '''
+    Value of a strategy at the close of every processed bar, kept in a
+    preallocated buffer that doubles its capacity when full. The value of
+    period i is values[i], and the dates are taken from the bars when the
+    curve is converted.
+    '''
+
+    def __init__(self, capacity: int = 1024):
+        self._values = np.empty(max(capacity, 1))
+        self._size = 0
+        self._records: List[DateValue] = []
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, value: float) -> None:
+        if self._size == len(self._values):
+            values = np.empty(2*len(self._values))
+            values[:self._size] = self._values[:self._size]
+            self._values = values
+        self._values[self._size] = value
+        self._size += 1
+
+    def set_values(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype=float)
+        self._size = len(values)
+        # At least one free slot, since append doubles the capacity
+        self._values = np.empty(max(self._size, 1))
+        self._values[:self._size] = values
+        self._records = []
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._values[:self._size]
+
+    def to_series(self, dates: Sequence[Any]) -> Series:
+        '''
+        Series of the values indexed by the first len(self) dates. The values are not copied.
+        '''
+        return pd.Series(self.values, index=dates[:self._size], name='value', copy=False)
+
+    def get_records(self, dates: Sequence[Any]) -> List[DateValue]:
+        '''
+        The values as dicts with their date. The list is kept and only the
+        new values are added on later calls, so reading it every bar is O(1).
+        '''
+        start = len(self._records)
+        if start < self._size:
+            values = self._values[start:self._size].tolist()
+            self._records.extend({'date': dates[start + i], 'value': value} for i, value in enumerate(values))
+        return self._records
+
+
+class TradeLedger:
+    '''
+    Completed orders stored by column: period, price, number of shares and
+    type (0 purchase, 1 sale). Columns grow like EquityCurve.
+    '''
+
+    def __init__(self, capacity: int = 64):
+        capacity = max(capacity, 1)
+        self._periods = np.empty(capacity, dtype=np.int64)
+        self._prices = np.empty(capacity)
+        self._number_shares = np.empty(capacity, dtype=np.int64)
+        self._types = np.empty(capacity, dtype=np.int8)
+        self._size = 0
+        # Records built by get_records for each trade type, and the number of orders they include
+        self._records: Dict[Optional[str], List[CompletedOrder]] = {}
+        self._records_size: Dict[Optional[str], int] = {}
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _grow(self) -> None:
+        capacity = 2*len(self._periods)
+        for name in ('_periods', '_prices', '_number_shares', '_types'):
+            old_values = getattr(self, name)
+            values = np.empty(capacity, dtype=old_values.dtype)
+            values[:self._size] = old_values[:self._size]
+            setattr(self, name, values)
+
+    def add(self, period: int, price: float, number_shares: int, trade_type: str) -> None:
+        if self._size == len(self._periods):
+            self._grow()
+        i = self._size
+        self._periods[i] = period
+        self._prices[i] = price
+        self._number_shares[i] = number_shares
+        self._types[i] = TRADE_TYPES.index(trade_type)
+        self._size += 1
+
+    def set_values(self, periods: np.ndarray, prices: np.ndarray, number_shares: np.ndarray, types: np.ndarray) -> None:
+        self._size = len(periods)
+        # At least one free slot, since _grow doubles the capacity
+        capacity = max(self._size, 1)
+        for name, values, dtype in (('_periods', periods, np.int64), ('_prices', prices, float), ('_number_shares', number_shares, np.int64), ('_types', types, np.int8)):
+            column = np.empty(capacity, dtype=dtype)
+            column[:self._size] = values
+            setattr(self, name, column)
+        self._records = {}
+        self._records_size = {}
+
+    @property
+    def periods(self) -> np.ndarray:
+        return self._periods[:self._size]
+
+    @property
+    def prices(self) -> np.ndarray:
+        return self._prices[:self._size]
+
+    @property
+    def number_shares(self) -> np.ndarray:
+        return self._number_shares[:self._size]
+
+    @property
+    def types(self) -> np.ndarray:
+        return self._types[:self._size]
+
+    def to_dataframe(self, dates: Optional[Sequence[Any]] = None) -> DataFrame:
+        '''
+        DataFrame with a row per completed order. The period, price and
+        number_shares columns are views of the ledger; the date column is
+        added when the dates of the bars are given.
+        '''
+        df = pd.DataFrame(
+            {
+                'period': self.periods,
+                'price': self.prices,
+                'number_shares': self.number_shares,
+                'type': pd.Categorical.from_codes(self.types, TRADE_TYPES)
+            },
+            copy=False
+        )
+        if dates is not None:
+            df.insert(0, 'date', pd.DatetimeIndex(dates).take(self.periods) if len(self.periods) > 0 else pd.DatetimeIndex(dates)[:0])
+        return df
+
+    def get_records(self, dates: Sequence[Any], trade_type: Optional[str] = None) -> List[CompletedOrder]:
+        '''
+        The orders (of trade_type, or all of them) as dicts. Like
+        EquityCurve.get_records, the list is kept and extended with the new orders.
+        '''
+        records = self._records.setdefault(trade_type, [])
+        start = self._records_size.get(trade_type, 0)
+        rows = zip(
+            self._periods[start:self._size].tolist(),
+            self._prices[start:self._size].tolist(),
+            self._number_shares[start:self._size].tolist(),
+            self._types[start:self._size].tolist()
+        )
+        for period, price, number_shares, type_code in rows:
+            if trade_type is None or TRADE_TYPES[type_code] == trade_type:
+                records.append({'date': dates[period], 'price': price, 'number_shares': number_shares, 'type': TRADE_TYPES[type_code]})
+        self._records_size[trade_type] = self._size
+        return records
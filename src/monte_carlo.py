@@ -0,0 +1,153 @@
+from typing import Any, Optional, Sequence
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from src.backtesting_engine.ledger import TradeLedger
+
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def get_trade_returns(trades: TradeLedger, commission: Any, init_capital: float) -> np.ndarray:
+    '''
+    Return of every closed trade (from a flat position back to a flat
+    position) over the value of the strategy before the trade, with the
+    commissions of its orders, as StrategyMetrics.add_trade computes it. An
+    open position at the end is not a trade.
+    '''
+    if len(trades) == 0:
+        return np.empty(0)
+
+    is_sale = trades.types == 1
+    amounts = trades.prices*trades.number_shares
+    costs = np.empty(len(trades))
+    if np.any(~is_sale):
+        costs[~is_sale] = commission.get_costs(amounts[~is_sale], 'buy')
+    if np.any(is_sale):
+        costs[is_sale] = commission.get_costs(amounts[is_sale], 'sell')
+    cash_flows = np.where(is_sale, amounts, -amounts) - costs
+
+    position = np.cumsum(np.where(is_sale, -trades.number_shares, trades.number_shares))
+    trade_ends = np.flatnonzero(position == 0)
+    if len(trade_ends) == 0:
+        return np.empty(0)
+    trade_starts = np.concatenate(([0], trade_ends[:-1] + 1))
+
+    profits = np.add.reduceat(cash_flows[:trade_ends[-1] + 1], trade_starts)
+    values_before = init_capital + np.concatenate(([0.0], np.cumsum(profits[:-1])))
+    return profits/values_before
+
+
+class MonteCarloResult:
+    '''
+    Distribution of n_simulations resampled trade sequences. final_equity,
+    max_drawdown (percentage, like the strategy metrics) and recovery_trades
+    (longest number of trades spent under a previous peak) have a value per
+    simulation. equity_bands has the percentiles of the equity after some
+    trade numbers, at most band_points of them.
+    '''
+
+    def __init__(self, final_equity: np.ndarray, max_drawdown: np.ndarray, recovery_trades: np.ndarray, equity_bands: DataFrame, percentiles: Sequence[float]):
+        self.final_equity = final_equity
+        self.max_drawdown = max_drawdown
+        self.recovery_trades = recovery_trades
+        self.equity_bands = equity_bands
+        self.percentiles = list(percentiles)
+
+    def get_summary(self) -> DataFrame:
+        '''
+        Percentiles of final_equity, max_drawdown and recovery_trades.
+        '''
+        return pd.DataFrame(
+            {
+                'final_equity': np.percentile(self.final_equity, self.percentiles),
+                'max_drawdown': np.percentile(self.max_drawdown, self.percentiles),
+                'recovery_trades': np.percentile(self.recovery_trades, self.percentiles)
+            },
+            index=pd.Index(self.percentiles, name='percentile')
+        )
+
+    def __repr__(self) -> str:
+        return f'MonteCarloResult({len(self.final_equity)} simulations)\n{self.get_summary()}'
+
+
+def _simulate_chunk(
+    trade_returns: np.ndarray,
+    n_simulations: int,
+    method: str,
+    init_capital: float,
+    band_indexes: np.ndarray,
+    rng: np.random.Generator
+):
+    n_trades = len(trade_returns)
+    if method == 'bootstrap':
+        returns = trade_returns[rng.integers(0, n_trades, (n_simulations, n_trades))]
+    else:
+        returns = rng.permuted(np.tile(trade_returns, (n_simulations, 1)), axis=1)
+
+    # Column 0 is the initial capital, column i the equity after trade i
+    equity = np.empty((n_simulations, n_trades + 1))
+    equity[:, 0] = init_capital
+    np.cumprod(1 + returns, axis=1, out=equity[:, 1:])
+    equity[:, 1:] *= init_capital
+    del returns
+
+    peaks = np.maximum.accumulate(equity, axis=1)
+    max_drawdown = 100*np.max((peaks - equity)/peaks, axis=1)
+
+    # Trades since the last peak, reset to 0 at every new peak
+    steps = np.arange(n_trades + 1)
+    last_peak = np.maximum.accumulate(np.where(equity >= peaks, steps, 0), axis=1)
+    recovery_trades = np.max(steps - last_peak, axis=1)
+
+    return equity[:, -1].copy(), max_drawdown, recovery_trades, equity[:, band_indexes]
+
+
+def run_monte_carlo(
+    trade_returns: np.ndarray,
+    n_simulations: int = 10000,
+    method: str = 'bootstrap',
+    init_capital: float = 1.0,
+    seed: Optional[int] = 0,
+    percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+    band_points: int = 100,
+    memory_budget_mb: float = 256
+) -> MonteCarloResult:
+    '''
+    Resamples the trade returns n_simulations times, with replacement
+    ('bootstrap') or as random orderings of the same trades ('shuffle'), and
+    compounds each sequence from init_capital. The simulations are computed
+    as 2D arrays of up to memory_budget_mb, and the same seed always gives
+    the same result for the same memory_budget_mb.
+    '''
+    if method not in ('bootstrap', 'shuffle'):
+        raise Exception(f'ERROR: unknown Monte Carlo method {method}')
+    trade_returns = np.asarray(trade_returns, dtype=float)
+    n_trades = len(trade_returns)
+    if n_trades == 0:
+        raise Exception('ERROR: there are no trades to simulate')
+
+    band_indexes = np.unique(np.linspace(0, n_trades, min(band_points, n_trades + 1)).round().astype(int))
+    # About 5 arrays of n_trades + 1 floats per simulation are alive at the same time
+    chunk_size = max(1, min(n_simulations, int(memory_budget_mb*1024**2//(5*8*(n_trades + 1)))))
+
+    rng = np.random.default_rng(seed)
+    final_equity = np.empty(n_simulations)
+    max_drawdown = np.empty(n_simulations)
+    recovery_trades = np.empty(n_simulations, dtype=np.int64)
+    bands = np.empty((n_simulations, len(band_indexes)))
+    for start in range(0, n_simulations, chunk_size):
+        end = min(start + chunk_size, n_simulations)
+        (
+            final_equity[start:end],
+            max_drawdown[start:end],
+            recovery_trades[start:end],
+            bands[start:end]
+        ) = _simulate_chunk(trade_returns, end - start, method, init_capital, band_indexes, rng)
+
+    equity_bands = pd.DataFrame(
+        np.percentile(bands, percentiles, axis=0).T,
+        index=pd.Index(band_indexes, name='trade'),
+        columns=list(percentiles)
+    )
+    return MonteCarloResult(final_equity, max_drawdown, recovery_trades, equity_bands, percentiles)
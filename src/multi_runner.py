@@ -0,0 +1,117 @@
+from typing import Any, Callable, Dict, List, Optional, Type
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from src.backtesting_engine.bar_data import BarData
+from src.backtesting_engine.indicator_cache import IndicatorCache, get_indicator_cache, set_indicator_cache
+from src.backtesting_engine.optimizer import get_metrics_record
+from src.backtesting_engine.strategy import Strategy
+from src.backtesting_engine.utils import read_files_from_folder
+
+
+def materialize_bars(df: DataFrame) -> DataFrame:
+    '''
+    Copy of df with every column in one float block, each column contiguous,
+    so the column arrays of every strategy are views of the same memory.
+    DataFrames with non numeric columns are returned as they are.
+    '''
+    if not all(np.issubdtype(dtype, np.number) for dtype in df.dtypes):
+        return df
+    values = np.ascontiguousarray(df.to_numpy(dtype=np.float64).T)
+    return pd.DataFrame(values.T, index=df.index, columns=df.columns, copy=False)
+
+
+class MultiStrategyRunner:
+    '''
+    Runs many strategies over the same bars in a single pass. The bars are
+    loaded and materialized once and shared by every strategy, indicators
+    with the same params are computed once through an IndicatorCache, and
+    every bar is processed for all the strategies before moving to the next
+    one. Each strategy keeps its own capital, orders and metrics.
+
+        runner = MultiStrategyRunner.from_folder('AAPL')
+        runner.add(SmaCross, 10000, {'amount': 2}, fast=10, slow=50)
+        runner.add(SmaCross, 10000, {'amount': 2}, fast=20, slow=100)
+        results = runner.run()
+    '''
+
+    def __init__(self, df: DataFrame, indicator_cache: Optional[IndicatorCache] = None):
+        self.df = materialize_bars(df)
+        self.bars = BarData(self.df)
+        self.indicator_cache = indicator_cache if indicator_cache is not None else IndicatorCache()
+        self.strategies: Dict[str, Strategy] = {}
+
+    @classmethod
+    def from_folder(cls, data_name: str, from_date: str = '', to_date: str = '', indicator_cache: Optional[IndicatorCache] = None) -> 'MultiStrategyRunner':
+        return cls(read_files_from_folder(data_name, from_date, to_date), indicator_cache)
+
+    def add(self, strategy_class: Type[Strategy], init_capital: float, commission_config: Any, name: Optional[str] = None, **params) -> Strategy:
+        '''
+        Creates strategy_class(df, init_capital, commission_config, **params)
+        over the shared bars. name defaults to the class name plus the params.
+        '''
+        if name is None:
+            name = strategy_class.__name__
+            if params:
+                name += '(' + ', '.join(f'{key}={value}' for key, value in params.items()) + ')'
+        if name in self.strategies:
+            raise Exception(f'ERROR: strategy {name} already added.')
+
+        previous_cache = get_indicator_cache()
+        set_indicator_cache(self.indicator_cache)
+        try:
+            strategy = strategy_class(self.df, init_capital, commission_config, **params)
+        finally:
+            set_indicator_cache(previous_cache)
+        strategy.bars = self.bars
+        strategy._bind_bars()
+
+        self.strategies[name] = strategy
+        return strategy
+
+    def set_quiet(self) -> None:
+        for strategy in self.strategies.values():
+            strategy.set_quiet()
+
+    def run(self) -> DataFrame:
+        '''
+        Executes every strategy over all the bars, with the same results as
+        calling execute_strategy on each of them, and returns get_results().
+        '''
+        strategies = list(self.strategies.values())
+        for strategy in strategies:
+            if strategy.tracer.is_enabled('simulation_start'):
+                strategy.tracer.emit('simulation_start', None, name='STRATEGY')
+            strategy.current_period = 0
+
+        process_bars = [self._get_process_bar(strategy) for strategy in strategies]
+        for _ in range(len(self.bars)):
+            for process_bar in process_bars:
+                process_bar()
+
+        for strategy in strategies:
+            if strategy.tracer.is_enabled('simulation_end'):
+                strategy.tracer.emit('simulation_end', None, name='STRATEGY')
+        return self.get_results()
+
+    @staticmethod
+    def _get_process_bar(strategy: Strategy) -> Callable[[], None]:
+        if strategy.checkpointer is None:
+            return strategy._process_bar
+
+        # Checkpoints are saved after the bars as in Strategy.resume_strategy
+        def process_bar() -> None:
+            strategy._process_bar()
+            strategy.checkpointer.after_bar(strategy)
+        return process_bar
+
+    def get_results(self) -> DataFrame:
+        '''
+        Metrics and final capital, shares and total of every strategy, indexed by name.
+        '''
+        records: List[Dict[str, Any]] = []
+        for name, strategy in self.strategies.items():
+            records.append({'name': name, **get_metrics_record(strategy, *strategy.get_result())})
+        results = pd.DataFrame.from_records(records)
+        return results.set_index('name') if len(results) > 0 else results
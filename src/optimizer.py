@@ -0,0 +1,236 @@
+import itertools
+import logging
+import os
+import random
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, Iterator, List, Optional, Type
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from src.backtesting_engine.indicator_cache import IndicatorCache, set_indicator_cache
+from src.backtesting_engine.strategy import Strategy
+
+
+ParameterGrid = Dict[str, List[Any]]
+ProgressCallback = Callable[[int, int, Dict[str, Any]], None]
+
+
+def iterate_parameter_grid(parameter_grid: ParameterGrid) -> Iterator[Dict[str, Any]]:
+    names = list(parameter_grid.keys())
+    for values in itertools.product(*parameter_grid.values()):
+        yield dict(zip(names, values))
+
+
+def sample_parameter_grid(parameter_grid: ParameterGrid, n_samples: int, seed: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    '''
+    Random search over the grid. Values can be lists to choose from or
+    callables receiving a random.Random instance, e.g. lambda rng: rng.uniform(0, 1).
+    '''
+    rng = random.Random(seed)
+    for _ in range(n_samples):
+        yield {
+            name: values(rng) if callable(values) else rng.choice(values)
+            for name, values in parameter_grid.items()
+        }
+
+
+def get_parameter_grid_size(parameter_grid: ParameterGrid) -> int:
+    size = 1
+    for values in parameter_grid.values():
+        size *= len(values)
+    return size
+
+
+class SharedDataFrame:
+    '''
+    Copy of the numeric columns of a DataFrame in shared memory, so worker
+    processes can rebuild it without pickling the data for every task.
+    Other columns (e.g. strings) are pickled in info.
+    '''
+
+    def __init__(self, df: DataFrame):
+        numeric_columns = [column for column, dtype in df.dtypes.items() if isinstance(dtype, np.dtype) and np.issubdtype(dtype, np.number)]
+        values = df[numeric_columns].to_numpy(dtype=np.float64)
+        # Timezone-aware dates are shared as UTC, which has no ambiguous or nonexistent times
+        index = df.index.tz_convert('UTC').tz_localize(None) if getattr(df.index, 'tz', None) is not None else df.index
+        index_values = index.to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+        self._values_shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        self._index_shm = shared_memory.SharedMemory(create=True, size=max(index_values.nbytes, 1))
+        np.ndarray(values.shape, dtype=np.float64, buffer=self._values_shm.buf)[:] = values
+        np.ndarray(index_values.shape, dtype=np.int64, buffer=self._index_shm.buf)[:] = index_values
+
+        self.info = {
+            'values_name': self._values_shm.name,
+            'index_name': self._index_shm.name,
+            'shape': values.shape,
+            'columns': list(df.columns),
+            'numeric_columns': numeric_columns,
+            'other_columns': {column: df[column].array for column in df.columns if column not in numeric_columns},
+            'index_label': df.index.name,
+            'tz': str(df.index.tz) if getattr(df.index, 'tz', None) is not None else None
+        }
+
+    @staticmethod
+    def attach(info: Dict[str, Any]):
+        values_shm = shared_memory.SharedMemory(name=info['values_name'])
+        index_shm = shared_memory.SharedMemory(name=info['index_name'])
+        values = np.ndarray(info['shape'], dtype=np.float64, buffer=values_shm.buf)
+        index_values = np.ndarray((info['shape'][0],), dtype=np.int64, buffer=index_shm.buf)
+
+        index = pd.DatetimeIndex(index_values.view('datetime64[ns]'), name=info['index_label'])
+        if info['tz'] is not None:
+            index = index.tz_localize('UTC').tz_convert(info['tz'])
+        df = pd.DataFrame(values, index=index, columns=info['numeric_columns'], copy=False)
+        if info['other_columns']:
+            for column, column_values in info['other_columns'].items():
+                df[column] = column_values
+            # Reordering copies the numeric columns once per worker
+            df = df[info['columns']]
+        # The segments must stay open while df uses their buffers
+        return df, (values_shm, index_shm)
+
+    def close(self) -> None:
+        for shm in (self._values_shm, self._index_shm):
+            shm.close()
+            shm.unlink()
+
+
+_worker_state: Dict[str, Any] = {}
+
+
+def init_worker(
+    shared_info: Dict[str, Any],
+    strategy_class: Type[Strategy],
+    init_capital: float,
+    commission_config: Any,
+    indicator_cache: Optional[IndicatorCache]
+) -> None:
+    '''
+    Initializer of the process pools that run strategies over the bars of a
+    SharedDataFrame (shared_info is its info). Tasks then create their
+    strategies with create_worker_strategy.
+    '''
+    df, segments = SharedDataFrame.attach(shared_info)
+    _worker_state['df'] = df
+    _worker_state['segments'] = segments
+    _worker_state['strategy_class'] = strategy_class
+    _worker_state['init_capital'] = init_capital
+    _worker_state['commission_config'] = commission_config
+    if indicator_cache is not None:
+        set_indicator_cache(indicator_cache)
+
+
+def get_metrics_record(strategy: Strategy, capital: float, shares: int, total: float) -> Dict[str, Any]:
+    record = dict(strategy.get_metrics_summary())
+    record['capital'] = capital
+    record['shares'] = shares
+    record['total'] = total
+    return record
+
+
+def create_worker_strategy(params: Dict[str, Any], start: Optional[int] = None, end: Optional[int] = None) -> Strategy:
+    '''
+    Strategy with params over the bars start:end of the shared df, in a
+    worker started with init_worker.
+    '''
+    df = _worker_state['df']
+    if start is not None or end is not None:
+        # iloc over the single float block of the shared frame is a view, so the bars are not copied
+        df = df.iloc[start:end]
+    return _worker_state['strategy_class'](df, _worker_state['init_capital'], _worker_state['commission_config'], **params)
+
+
+def _run_strategy(params: Dict[str, Any]) -> Dict[str, Any]:
+    strategy = create_worker_strategy(params)
+    capital, shares, total = strategy.execute_strategy()
+    return get_metrics_record(strategy, capital, shares, total)
+
+
+def optimize_strategy(
+    strategy_class: Type[Strategy],
+    df: DataFrame,
+    init_capital: float,
+    commission_config: Any,
+    parameter_grid: ParameterGrid,
+    n_samples: Optional[int] = None,
+    seed: Optional[int] = None,
+    rank_by: str = 'total',
+    ascending: bool = False,
+    max_workers: Optional[int] = None,
+    progress_callback: Optional[ProgressCallback] = None,
+    cancel_event: Optional[threading.Event] = None,
+    indicator_cache: Optional[IndicatorCache] = None
+) -> DataFrame:
+    '''
+    Runs strategy_class(df, init_capital, commission_config, **params) for
+    every parameter set of the grid (or n_samples random ones) in a process
+    pool and returns a table with the params and metrics of each run,
+    ranked by rank_by.
+
+    progress_callback(completed, total, record) is called after each run.
+    Setting cancel_event stops submitting new runs, cancels the queued ones
+    and returns the results obtained so far.
+
+    indicator_cache is used by every worker, so with a folder the
+    indicators are computed once for all the runs.
+    '''
+    if n_samples is None:
+        parameter_sets = iterate_parameter_grid(parameter_grid)
+        total_runs = get_parameter_grid_size(parameter_grid)
+    else:
+        parameter_sets = sample_parameter_grid(parameter_grid, n_samples, seed)
+        total_runs = n_samples
+
+    max_workers = max_workers or os.cpu_count() or 1
+    logging.info(f'START OPTIMIZATION. {total_runs} parameter sets')
+    shared_df = SharedDataFrame(df)
+    records = []
+
+    try:
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=init_worker,
+            initargs=(shared_df.info, strategy_class, init_capital, commission_config, indicator_cache)
+        ) as executor:
+            # Only a few runs are queued at a time, so large grids are not materialized
+            max_pending = 4*max_workers
+            pending = {}
+            canceled = False
+
+            while True:
+                while not canceled and len(pending) < max_pending:
+                    params = next(parameter_sets, None)
+                    if params is None:
+                        break
+                    pending[executor.submit(_run_strategy, params)] = params
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    params = pending.pop(future)
+                    record = {**params, **future.result()}
+                    records.append(record)
+                    if progress_callback is not None:
+                        progress_callback(len(records), total_runs, record)
+
+                if not canceled and cancel_event is not None and cancel_event.is_set():
+                    logging.info(f'OPTIMIZATION CANCELED. {len(records)} of {total_runs} parameter sets completed')
+                    canceled = True
+                    for future in list(pending):
+                        if future.cancel():
+                            pending.pop(future)
+    finally:
+        shared_df.close()
+
+    logging.info('END OPTIMIZATION')
+
+    results = pd.DataFrame.from_records(records)
+    if len(results) > 0:
+        results = results.sort_values(rank_by, ascending=ascending, kind='stable').reset_index(drop=True)
+    return results
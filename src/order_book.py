@@ -0,0 +1,211 @@
+import heapq
+from typing import Any, Dict, List, Tuple
+from datetime import datetime
+
+
+ORDER_TYPES = ('market_order', 'limit', 'stop', 'stop_limit', 'trailing_stop')
+
+
+class OrderBook:
+    '''
+    Pending orders of a strategy. Limit and stop orders are kept in heaps
+    sorted by their trigger price, so on every bar only the orders that the
+    bar range reaches are looked at.
+
+    Order options:
+        order_type: 'market_order' (default), 'limit', 'stop', 'stop_limit' or 'trailing_stop'.
+        buy_price / sell_price: limit price of limit and stop_limit orders.
+        stop_price: trigger price of stop and stop_limit orders.
+        trail_amount / trail_percentage: distance of a trailing stop to the
+            best price reached since the order was created.
+        oco: group name. When an order of the group is filled the rest are canceled.
+        valid_until: datetime after which the order is canceled.
+
+    Fill rules for a bar with open, high and low:
+        market: filled at the open.
+        limit: filled at the open if the open is at or better than the limit
+            price, else at the limit price if the bar reaches it.
+        stop: filled at the open if the open is at or beyond the stop price,
+            else at the stop price if the bar reaches it.
+        stop_limit: once the stop is reached, filled like a stop if that
+            price is within the limit, else it becomes a limit order from the
+            next bar on.
+        trailing_stop: a stop whose price is computed from the best price
+            reached up to the previous bar, updated after each bar.
+    Orders triggered in the same bar are executed in creation order.
+    '''
+
+    def __init__(self):
+        self._orders: Dict[int, Dict[str, Any]] = {}
+        self._market_orders: List[int] = []
+        self._buy_limits: List[Tuple[float, int]] = []
+        self._sell_limits: List[Tuple[float, int]] = []
+        self._buy_stops: List[Tuple[float, int]] = []
+        self._sell_stops: List[Tuple[float, int]] = []
+        self._trailing_stops: List[int] = []
+        self._expirations: List[Tuple[datetime, int]] = []
+        self._oco_groups: Dict[Any, List[int]] = {}
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def add(self, operation_type: str, options: Dict[str, Any], reference_price: float) -> int:
+        order_type = options.get('order_type', 'market_order')
+        if order_type not in ORDER_TYPES:
+            raise Exception(f'ERROR: order type {order_type} not valid.')
+        if operation_type not in ('buy', 'sell'):
+            raise Exception(f'ERROR: operation type {operation_type} not valid.')
+
+        order_id = self._next_id
+        self._next_id += 1
+        order = {'id': order_id, 'type': operation_type, 'options': options}
+        self._orders[order_id] = order
+
+        if order_type == 'market_order':
+            self._market_orders.append(order_id)
+        elif order_type == 'limit':
+            self._push_limit(order)
+        elif order_type in ('stop', 'stop_limit'):
+            stop_price = options['stop_price']
+            if operation_type == 'buy':
+                heapq.heappush(self._buy_stops, (stop_price, order_id))
+            else:
+                heapq.heappush(self._sell_stops, (-stop_price, order_id))
+        else:
+            if 'trail_amount' not in options and 'trail_percentage' not in options:
+                raise Exception('ERROR: trailing_stop orders need trail_amount or trail_percentage.')
+            order['best_price'] = reference_price
+            self._trailing_stops.append(order_id)
+
+        if 'valid_until' in options:
+            heapq.heappush(self._expirations, (options['valid_until'], order_id))
+        if 'oco' in options:
+            self._oco_groups.setdefault(options['oco'], []).append(order_id)
+
+        return order_id
+
+    def _push_limit(self, order: Dict[str, Any]) -> None:
+        if order['type'] == 'buy':
+            heapq.heappush(self._buy_limits, (-order['options']['buy_price'], order['id']))
+        else:
+            heapq.heappush(self._sell_limits, (order['options']['sell_price'], order['id']))
+
+    def cancel(self, order_id: int) -> None:
+        order = self._orders.pop(order_id, None)
+        if order is not None and 'oco' in order['options']:
+            group = self._oco_groups.get(order['options']['oco'], [])
+            if order_id in group:
+                group.remove(order_id)
+            if not group:
+                self._oco_groups.pop(order['options']['oco'], None)
+        if order is not None:
+            self._compact()
+
+    def _compact(self) -> None:
+        # Canceled orders are skipped lazily when popped, so a heap is rebuilt once most of it is canceled orders
+        max_size = 2*len(self._orders) + 64
+        for name in ('_buy_limits', '_sell_limits', '_buy_stops', '_sell_stops', '_expirations'):
+            heap = getattr(self, name)
+            if len(heap) > max_size:
+                heap = [entry for entry in heap if entry[1] in self._orders]
+                heapq.heapify(heap)
+                setattr(self, name, heap)
+
+    def cancel_all(self) -> None:
+        next_id = self._next_id
+        self.__init__()
+        self._next_id = next_id
+
+    def get_orders(self) -> List[Dict[str, Any]]:
+        return [self._orders[order_id] for order_id in sorted(self._orders)]
+
+    def complete(self, order: Dict[str, Any], filled: bool) -> None:
+        '''
+        Removes an executed order. If it was filled, the rest of its OCO group is canceled.
+        '''
+        self.cancel(order['id'])
+        if filled and 'oco' in order['options']:
+            for order_id in list(self._oco_groups.get(order['options']['oco'], [])):
+                self.cancel(order_id)
+
+    def is_pending(self, order_id: int) -> bool:
+        return order_id in self._orders
+
+    def _pop_triggered(self, heap: List[Tuple[float, int]], limit_key: float) -> List[int]:
+        order_ids = []
+        while heap and heap[0][0] <= limit_key:
+            _, order_id = heapq.heappop(heap)
+            if order_id in self._orders:
+                order_ids.append(order_id)
+        return order_ids
+
+    def _get_trailing_stop_price(self, order: Dict[str, Any]) -> float:
+        options = order['options']
+        sign = -1 if order['type'] == 'sell' else 1
+        if 'trail_amount' in options:
+            return order['best_price'] + sign*options['trail_amount']
+        return order['best_price']*(1 + sign*options['trail_percentage']/100)
+
+    def get_triggered(self, date: datetime, open_price: float, high: float, low: float) -> List[Tuple[Dict[str, Any], float]]:
+        '''
+        Returns the (order, fill price) pairs triggered by the bar, in creation
+        order. The caller must report each of them back with complete().
+        '''
+        while self._expirations and self._expirations[0][0] < date:
+            _, order_id = heapq.heappop(self._expirations)
+            self.cancel(order_id)
+
+        triggered = []
+
+        market_orders = self._market_orders
+        self._market_orders = []
+        for order_id in market_orders:
+            if order_id in self._orders:
+                triggered.append((self._orders[order_id], open_price))
+
+        for order_id in self._pop_triggered(self._buy_limits, -low):
+            limit_price = self._orders[order_id]['options']['buy_price']
+            triggered.append((self._orders[order_id], open_price if open_price <= limit_price else limit_price))
+        for order_id in self._pop_triggered(self._sell_limits, high):
+            limit_price = self._orders[order_id]['options']['sell_price']
+            triggered.append((self._orders[order_id], open_price if open_price >= limit_price else limit_price))
+
+        new_limits = []
+        for order_id in self._pop_triggered(self._buy_stops, high):
+            order = self._orders[order_id]
+            stop_price = order['options']['stop_price']
+            fill_price = open_price if open_price >= stop_price else stop_price
+            if order['options']['order_type'] == 'stop_limit' and fill_price > order['options']['buy_price']:
+                new_limits.append(order)
+            else:
+                triggered.append((order, fill_price))
+        for order_id in self._pop_triggered(self._sell_stops, -low):
+            order = self._orders[order_id]
+            stop_price = order['options']['stop_price']
+            fill_price = open_price if open_price <= stop_price else stop_price
+            if order['options']['order_type'] == 'stop_limit' and fill_price < order['options']['sell_price']:
+                new_limits.append(order)
+            else:
+                triggered.append((order, fill_price))
+        # Stop-limit orders whose stop was reached rest as limit orders from the next bar
+        for order in new_limits:
+            self._push_limit(order)
+
+        trailing_stops = []
+        for order_id in self._trailing_stops:
+            if order_id not in self._orders:
+                continue
+            order = self._orders[order_id]
+            stop_price = self._get_trailing_stop_price(order)
+            if order['type'] == 'sell' and low <= stop_price:
+                triggered.append((order, open_price if open_price <= stop_price else stop_price))
+            elif order['type'] == 'buy' and high >= stop_price:
+                triggered.append((order, open_price if open_price >= stop_price else stop_price))
+            else:
+                order['best_price'] = max(order['best_price'], high) if order['type'] == 'sell' else min(order['best_price'], low)
+                trailing_stops.append(order_id)
+        self._trailing_stops = trailing_stops
+
+        triggered.sort(key=lambda order_price: order_price[0]['id'])
+        return triggered
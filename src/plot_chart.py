@@ -1,13 +1,18 @@
 
-from typing import Any, Dict, List, Optional
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Union
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from screeninfo import get_monitors
-from pandas import DataFrame
+import numpy as np
+from pandas import DataFrame, Series
 import pandas as pd
 
 from src.backtesting_engine.type_dict_classes import DateValue
 
+# Maximum number of candles drawn by default, larger data is aggregated
+DEFAULT_MAX_POINTS = 5000
+DEFAULT_FIGURE_SIZE = (1600, 900)
+
 DARK_THEME = {
     'plot_bgcolor': '#333333',
     'paper_bgcolor': '#333333',
@@ -46,20 +51,136 @@ def plot_candlestick(
     df: DataFrame,
     plot_type='candle',
     indicators: List[Dict[str, Any]] = [],
-    operations: Dict[str, List] = {},
-    capital_series: List[DateValue] = [],
+    operations: Union[DataFrame, Dict[str, List]] = {},
+    capital_series: Union[Series, List[DateValue]] = [],
     theme_name: str = 'DARK_THEME',
     data_name: str = '',
     width: Optional[int] = None,
     height: Optional[int] = None,
     show_fig: bool = True,
     save_fig: bool = False,
-    path_fig: str = ''
+    path_fig: str = '',
+    max_points: Optional[int] = DEFAULT_MAX_POINTS
 ) -> None:
 
     if not show_fig and not save_fig:
         return 
 
+    fig = get_candlestick_figure(
+        df=df,
+        plot_type=plot_type,
+        indicators=indicators,
+        operations=operations,
+        capital_series=capital_series,
+        theme_name=theme_name,
+        data_name=data_name,
+        width=width,
+        height=height,
+        max_points=max_points
+    )
+
+    if save_fig:
+        fig.write_image(path_fig)
+    
+    if show_fig:
+        fig.show()
+
+
+@lru_cache(maxsize=None)
+def get_theme_template(theme_name: str = 'DARK_THEME') -> go.layout.Template:
+    '''
+    Layout shared by every figure of a theme: colors, margins, fonts and
+    axes. It is built once per theme and reused by all the figures.
+    '''
+    theme = LIGHT_THEME if theme_name == 'LIGHT_THEME' else DARK_THEME
+    axis = dict(
+        ticks='outside',
+        mirror=True,
+        showline=True,
+        linecolor=theme['line_color'],
+        showgrid=True,
+        gridwidth=0.9,
+        gridcolor=theme['gridcolor']
+    )
+    return go.layout.Template(
+        layout=go.Layout(
+            margin=dict(l=20, r=20, b=20, t=30, pad=4),
+            plot_bgcolor=theme['plot_bgcolor'],
+            paper_bgcolor=theme['paper_bgcolor'],
+            font=dict(color=theme['font_colot'], size=10),
+            xaxis=dict(axis, rangeslider=dict(visible=False)),
+            yaxis=axis
+        )
+    )
+
+
+def get_figure_size() -> Tuple[int, int]:
+    '''
+    Size that fits the main screen, or DEFAULT_FIGURE_SIZE when there is no
+    display (e.g. on servers) or screeninfo is not installed.
+    '''
+    try:
+        from screeninfo import get_monitors
+        monitor = get_monitors()[0]
+        return int(monitor.width*0.98), int(monitor.height*0.78)
+    except Exception:
+        return DEFAULT_FIGURE_SIZE
+
+
+def resample_ohlcv(df: DataFrame, bucket_size: int) -> DataFrame:
+    '''
+    Aggregates every bucket_size consecutive bars into one: first Open, max
+    High, min Low, last Close and summed Volume, dated at the first bar of the
+    bucket. Any other column, like indicators, takes its last value.
+    '''
+    n = len(df)
+    starts = np.arange(0, n, bucket_size)
+    ends = np.minimum(starts + bucket_size, n) - 1
+    resampled = {}
+    for column in df.columns:
+        values = df[column].to_numpy()
+        if column == 'Open':
+            resampled[column] = values[starts]
+        elif column == 'High':
+            resampled[column] = np.fmax.reduceat(values.astype(float), starts)
+        elif column == 'Low':
+            resampled[column] = np.fmin.reduceat(values.astype(float), starts)
+        elif column == 'Volume':
+            resampled[column] = np.add.reduceat(np.nan_to_num(values.astype(float)), starts)
+        else:
+            resampled[column] = values[ends]
+    return pd.DataFrame(resampled, index=df.index[starts], columns=df.columns)
+
+
+def resample_last(series: Series, bucket_size: int) -> Series:
+    '''
+    Last value of every bucket_size consecutive values, dated at the first one, like resample_ohlcv.
+    '''
+    n = len(series)
+    starts = np.arange(0, n, bucket_size)
+    ends = np.minimum(starts + bucket_size, n) - 1
+    return pd.Series(series.to_numpy()[ends], index=series.index[starts], name=series.name)
+
+
+def get_candlestick_figure(
+    df: DataFrame,
+    plot_type='candle',
+    indicators: List[Dict[str, Any]] = [],
+    operations: Union[DataFrame, Dict[str, List]] = {},
+    capital_series: Union[Series, List[DateValue]] = [],
+    theme_name: str = 'DARK_THEME',
+    data_name: str = '',
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+    max_points: Optional[int] = DEFAULT_MAX_POINTS
+) -> go.Figure:
+    '''
+    With more than max_points bars, consecutive bars are aggregated into
+    OHLCV buckets (see resample_ohlcv) so the figure has at most max_points
+    candles. Operations are always drawn at their exact date and price.
+    max_points=None draws every bar.
+    '''
+
     row_candle_chart = 1
     row_volume = 2
     row_indicator = 3
@@ -67,6 +188,12 @@ def plot_candlestick(
     row_width = [0.2, 0.7]
     has_hour = df.index[0].date() == df.index[1].date()
 
+    if max_points is not None and len(df) > max_points:
+        bucket_size = -(-len(df)//max_points)
+        df = resample_ohlcv(df, bucket_size)
+        if isinstance(capital_series, Series) and len(capital_series) > max_points:
+            capital_series = resample_last(capital_series, bucket_size)
+
     theme = LIGHT_THEME if theme_name == 'LIGHT_THEME' else DARK_THEME
 
     for indicator in indicators:
@@ -74,7 +201,14 @@ def plot_candlestick(
             rows+=1
             row_width = [0.2] + row_width
 
-    if capital_series:
+    if isinstance(capital_series, Series):
+        capital_dates, capital_values = capital_series.index, capital_series.to_numpy()
+    else:
+        capital_dates = [period['date'] for period in capital_series]
+        capital_values = [period['value'] for period in capital_series]
+    has_capital_series = len(capital_series) > 0
+
+    if has_capital_series:
         row_capital_series = 1
         row_candle_chart += 1
         row_volume += 1
@@ -85,19 +219,15 @@ def plot_candlestick(
     fig = make_subplots(rows=rows, cols=1, vertical_spacing=0, shared_xaxes = True, row_width=row_width)
 
     if width is None or height is None:
-        width = int(get_monitors()[0].width*0.98)
-        height = int(get_monitors()[0].height*0.78)
+        width, height = get_figure_size()
 
     fig.update_layout(
+        template=get_theme_template(theme_name),
         autosize=True,
         width=width,
         height=height,
-        margin=dict(l=20, r=20, b=20, t=30, pad=4),
-        title=f'\n<b>{data_name}</b>',
-        font=dict(size=18)
+        title=f'\n<b>{data_name}</b>'
     )
-    fig.update_xaxes(ticks="outside", mirror=True, showline=True, linecolor=theme['line_color'])
-    fig.update_yaxes(ticks="outside", mirror=True, showline=True, linecolor=theme['line_color'])
 
     if plot_type == 'candle':
         fig.append_trace(
@@ -132,18 +262,28 @@ def plot_candlestick(
     else:
         raise Exception(f'ERROR: plot_type {plot_type} not valid.')
 
-    df_color = pd.DataFrame()
-    df_color['bar_color'] = df.apply(lambda row: theme['bar_marker_color_up'] if row['Close'] >= row['Open'] else theme['bar_marker_color_down'], axis=1)
-    df_color['bar_edge_color'] = df.apply(lambda row: theme['increasing_line_color'] if row['Close'] >= row['Open'] else theme['decreasing_line_color'], axis=1)
+    is_up = df['Close'].to_numpy() >= df['Open'].to_numpy()
+    bar_color = np.where(is_up, theme['bar_marker_color_up'], theme['bar_marker_color_down'])
+    bar_edge_color = np.where(is_up, theme['increasing_line_color'], theme['decreasing_line_color'])
     
     marker_distance = 0.03 if has_hour else 0.1
 
+    if isinstance(operations, DataFrame):
+        is_purchase = (operations['type'] == 'purchase').to_numpy()
+        buy_dates, buy_prices = operations['date'][is_purchase], operations['price'].to_numpy()[is_purchase]
+        sell_dates, sell_prices = operations['date'][~is_purchase], operations['price'].to_numpy()[~is_purchase]
+    elif len(operations) > 0:
+        buy_dates = [operation['date'] for operation in operations['buy']]
+        buy_prices = np.array([operation['price'] for operation in operations['buy']], dtype=float)
+        sell_dates = [operation['date'] for operation in operations['sell']]
+        sell_prices = np.array([operation['price'] for operation in operations['sell']], dtype=float)
+
     if len(operations) > 0:
         fig.add_trace(
             go.Scatter(
-                x=[operation['date'] for operation in operations['buy']],
-                y=[operation['price']*(1-marker_distance) for operation in operations['buy']],
-                customdata=[round(operation['price'], 4) for operation in operations['buy']],
+                x=buy_dates,
+                y=buy_prices*(1-marker_distance),
+                customdata=buy_prices.round(4),
                 mode="markers",
                 marker=dict(symbol='triangle-up', size = 12),
                 marker_color=theme['bar_marker_color_up'],
@@ -155,9 +295,9 @@ def plot_candlestick(
         )
         fig.add_trace(
             go.Scatter(
-                x=[operation['date'] for operation in operations['sell']],
-                y=[operation['price']*(1+marker_distance) for operation in operations['sell']],
-                customdata=[round(operation['price'], 4) for operation in operations['sell']],
+                x=sell_dates,
+                y=sell_prices*(1+marker_distance),
+                customdata=sell_prices.round(4),
                 mode="markers",
                 marker=dict(symbol='triangle-down', size = 10),
                 marker_color=theme['bar_marker_color_down'],
@@ -190,18 +330,18 @@ def plot_candlestick(
             x=df.index,
             y=df['Volume'],
             showlegend=False,
-            marker_color=df_color['bar_color'],
-            marker_line_color=df_color['bar_edge_color']
+            marker_color=bar_color,
+            marker_line_color=bar_edge_color
         ),
         row=row_volume,
         col=1
     )
 
-    if capital_series:
+    if has_capital_series:
         fig.append_trace(
             go.Scatter(
-                x=[period['date'] for period in capital_series],
-                y=[period['value'] for period in capital_series],
+                x=capital_dates,
+                y=capital_values,
                 marker_color=theme['bar_marker_color'],
                 name='Capital', 
                 showlegend=False
@@ -220,18 +360,7 @@ def plot_candlestick(
         rangebreaks=rangebreaks
     )
     '''
-    
-    fig.update_xaxes(rangeslider_visible=False)
-    fig.update_layout(plot_bgcolor=theme['plot_bgcolor'], paper_bgcolor=theme['paper_bgcolor'], font=dict(color=theme['font_colot'], size=10))
 
-    for i in range(1, rows+1):
-        fig['layout'][f'xaxis{i}'].update(showgrid=True, gridwidth=0.9, gridcolor=theme['gridcolor'])
-        fig['layout'][f'yaxis{i}'].update(showgrid=True, gridwidth=0.9, gridcolor=theme['gridcolor'])
-
-    if save_fig:
-        fig.write_image(path_fig)
-    
-    if show_fig:
-        fig.show()
+    return fig
 
     
@@ -0,0 +1,314 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Union
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from src.backtesting_engine.events import EventSink, LoggingSink, Tracer
+from src.backtesting_engine.strategy import StrategyMetrics, get_periods_per_year
+from src.backtesting_engine.type_dict_classes import CompletedSymbolOrder, MetricsSummary
+from src.backtesting_engine.commission_calculator import CommissionCalculator
+
+
+class PortfolioData:
+    '''
+    OHLCV data of many symbols aligned to a common index. Every field is a
+    contiguous (bars, symbols) float array, with NaN where a symbol has no bar.
+    '''
+
+    COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+    def __init__(self, dfs: Dict[str, DataFrame]):
+        if len(dfs) == 0:
+            raise Exception('ERROR: at least one symbol is needed.')
+
+        self.symbols: List[str] = list(dfs.keys())
+        index = dfs[self.symbols[0]].index
+        for symbol in self.symbols[1:]:
+            index = index.union(dfs[symbol].index)
+        self.index = index.sort_values()
+
+        arrays = {column: np.empty((len(self.index), len(self.symbols))) for column in self.COLUMNS}
+        for j, symbol in enumerate(self.symbols):
+            df = dfs[symbol].reindex(self.index)
+            for column in self.COLUMNS:
+                arrays[column][:, j] = df[column].to_numpy(dtype=float)
+
+        self.open: np.ndarray = arrays['Open']
+        self.high: np.ndarray = arrays['High']
+        self.low: np.ndarray = arrays['Low']
+        self.close: np.ndarray = arrays['Close']
+        self.volume: np.ndarray = arrays['Volume']
+        # Last known close, used to value positions on bars where a symbol does not trade
+        self.valuation_close: np.ndarray = np.ascontiguousarray(pd.DataFrame(self.close).ffill().to_numpy())
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+
+class PortfolioStrategy(ABC):
+    '''
+    Strategy over many symbols sharing a single capital balance. Orders are
+    created with buy(symbol, **options) / sell(symbol, **options), using the
+    same options as Strategy, and are filled at the next open of that symbol.
+    '''
+
+    def __init__(self, data: Union[Dict[str, DataFrame], PortfolioData], init_capital: float, commission_config: Any):
+        self.data = data if isinstance(data, PortfolioData) else PortfolioData(data)
+        self.symbols = self.data.symbols
+        self.symbol_index = {symbol: j for j, symbol in enumerate(self.symbols)}
+        self.init_capital = init_capital
+        self.capital = init_capital
+        self.positions = np.zeros(len(self.symbols), dtype=np.int64)
+        self.commission_config = commission_config
+        self.commission = CommissionCalculator.compile(commission_config)
+        self.current_period = 0
+        self.dates: List[datetime] = list(self.data.index)
+        self.completed_purchases: List[CompletedSymbolOrder] = []
+        self.completed_sales: List[CompletedSymbolOrder] = []
+        self.completed_transactions: List[CompletedSymbolOrder] = []
+        self.historical_capital = np.full(len(self.data), np.nan)
+        self.metrics = StrategyMetrics()
+        self.symbol_metrics: Dict[str, StrategyMetrics] = {symbol: StrategyMetrics() for symbol in self.symbols}
+        self.realized_profit = np.zeros(len(self.symbols))
+        self._pending_orders = {}
+        self._order_id = 0
+        self.tracer = Tracer([LoggingSink()])
+        self._trade_cost = np.zeros(len(self.symbols))
+        self._trade_proceeds = np.zeros(len(self.symbols))
+        self._trade_start_value = np.zeros(len(self.symbols))
+
+    def buy(self, symbol: str, **options):
+        if self.tracer.is_enabled('order_created'):
+            self._trace('order_created', type='buy', symbol=symbol, order_id=self._order_id, options=options)
+        self._pending_orders[str(self._order_id)] = {'type': 'buy', 'symbol': symbol, 'options': options}
+        self._order_id += 1
+
+    def sell(self, symbol: str, **options):
+        if self.tracer.is_enabled('order_created'):
+            self._trace('order_created', type='sell', symbol=symbol, order_id=self._order_id, options=options)
+        self._pending_orders[str(self._order_id)] = {'type': 'sell', 'symbol': symbol, 'options': options}
+        self._order_id += 1
+
+    def set_quiet(self) -> None:
+        self.tracer.close()
+        self.tracer = Tracer()
+
+    def add_event_sink(self, sink: EventSink) -> None:
+        self.tracer.add_sink(sink)
+
+    def _trace(self, event: str, **fields) -> None:
+        self.tracer.emit(event, self.dates[self.current_period], **fields)
+
+    def get_position(self, symbol: str) -> int:
+        return int(self.positions[self.symbol_index[symbol]])
+
+    def get_total_value(self) -> float:
+        return self.capital + float(self.positions @ np.nan_to_num(self.data.valuation_close[self.current_period]))
+
+    @abstractmethod
+    def next(self):
+        pass
+
+    def execute_strategy(self):
+        if self.tracer.is_enabled('simulation_start'):
+            self.tracer.emit('simulation_start', None, name='PORTFOLIO')
+        self.current_period = 0
+
+        for _ in range(len(self.data)):
+            self._process_pending_orders()
+            self._update_strategy_metrics()
+            self.next()
+            self.historical_capital[self.current_period] = self.get_total_value()
+            self.metrics.update_equity(self.historical_capital[self.current_period], bool(self.positions.any()))
+            self.current_period += 1
+
+        if self.tracer.is_enabled('simulation_end'):
+            self.tracer.emit('simulation_end', None, name='PORTFOLIO')
+
+        self.current_period -= 1
+        total_value = self.get_total_value()
+        self.current_period += 1
+        return self.capital, dict(zip(self.symbols, self.positions.tolist())), total_value
+
+    def _buy(self, symbol: str, options: dict) -> bool:
+        j = self.symbol_index[symbol]
+        price_per_share = self.data.open[self.current_period, j]
+        if np.isnan(price_per_share):
+            return False
+
+        order_type = options['order_type'] if 'order_type' in options else 'market_order'
+
+        if order_type == 'limit':
+            if price_per_share > options['buy_price']:
+                return False
+
+        price_per_share = float(price_per_share)
+        number_shares = 0
+        if 'number_shares' in options:
+            number_shares = options['number_shares']
+        elif 'all' in options:
+            if options['all']:
+                number_shares = self.commission.get_max_shares(self.capital, price_per_share, 'buy')
+        elif 'capital_percentage' in options:
+            number_shares = self.commission.get_max_shares(self.capital*options['capital_percentage'], price_per_share, 'buy')
+        elif 'capital_amount' in options:
+            number_shares = self.commission.get_max_shares(options['capital_amount'], price_per_share, 'buy')
+        else:
+            number_shares = 1
+
+        number_shares = int(number_shares)
+
+        if number_shares <= 0:
+            self._trace_cancel('buy', symbol, 'Number of shares to buy must to be greater than 0.')
+            return True
+
+        operation_amount = price_per_share*number_shares
+        commission = self.commission(operation_amount, 'buy')
+        if self.capital < operation_amount+commission:
+            self._trace_cancel('buy', symbol, 'The capital is less than the cost of the purchase.')
+            return True
+
+        if self.positions[j] == 0:
+            # Trade returns are over the value of the strategy before the trade, as in Strategy
+            i = self.current_period
+            prices = self.data.valuation_close[i-1] if i > 0 else self.data.open[i]
+            self._trade_start_value[j] = self.capital + float(self.positions @ np.nan_to_num(prices))
+
+        self.capital -= commission
+        self.capital -= operation_amount
+        self.positions[j] += number_shares
+        self._trade_cost[j] += operation_amount + commission
+        self._register_order(symbol, price_per_share, number_shares, 'purchase')
+        return True
+
+    def _sell(self, symbol: str, options: dict) -> bool:
+        j = self.symbol_index[symbol]
+        price_per_share = self.data.open[self.current_period, j]
+        if np.isnan(price_per_share):
+            return False
+
+        order_type = options['order_type'] if 'order_type' in options else 'market_order'
+
+        if order_type == 'limit':
+            if price_per_share < options['sell_price']:
+                return False
+
+        price_per_share = float(price_per_share)
+        if 'number_shares' in options:
+            number_shares = options['number_shares']
+        elif 'number_shares_percentage' in options:
+            number_shares = int(self.positions[j]*options['number_shares_percentage'])
+        elif 'all' in options:
+            number_shares = self.positions[j]
+        else:
+            number_shares = 1
+
+        number_shares = int(number_shares)
+
+        if number_shares <= 0:
+            self._trace_cancel('sell', symbol, 'Number of shares to sell must to be greater than 0.')
+            return True
+        if number_shares > self.positions[j]:
+            self._trace_cancel('sell', symbol, 'The number of shares to be sold is greater than the number of shares owned.')
+            return True
+
+        operation_amount = number_shares*price_per_share
+        commission = self.commission(operation_amount, 'sell')
+        self.capital -= commission
+        self.capital += operation_amount
+        self.positions[j] -= number_shares
+        self._trade_proceeds[j] += operation_amount - commission
+        self._register_order(symbol, price_per_share, number_shares, 'sale')
+
+        if self.positions[j] == 0:
+            self._close_trade(j)
+
+        return True
+
+    def _register_order(self, symbol: str, price_per_share: float, number_shares: int, order_type: str) -> None:
+        order = {
+            'date': self.dates[self.current_period],
+            'symbol': symbol,
+            'price': price_per_share,
+            'number_shares': number_shares,
+            'type': order_type
+        }
+        if order_type == 'purchase':
+            self.completed_purchases.append(order)
+        else:
+            self.completed_sales.append(order)
+        self.completed_transactions.append(order)
+        if self.tracer.is_enabled('order_filled'):
+            self._trace(
+                'order_filled',
+                type='buy' if order_type == 'purchase' else 'sell',
+                symbol=symbol,
+                price=price_per_share,
+                number_shares=number_shares,
+                capital=self.capital
+            )
+
+    def _trace_cancel(self, operation_type: str, symbol: str, reason: str) -> None:
+        if self.tracer.is_enabled('order_canceled'):
+            self._trace('order_canceled', type=operation_type, symbol=symbol, reason=reason)
+
+    def _close_trade(self, j: int) -> None:
+        trade_profit = self._trade_proceeds[j] - self._trade_cost[j]
+        trade_return = trade_profit/self._trade_start_value[j]
+        self.realized_profit[j] += trade_profit
+        self.symbol_metrics[self.symbols[j]].add_trade(trade_return, trade_profit)
+        self.metrics.add_trade(trade_return, trade_profit)
+        self._trade_cost[j] = 0
+        self._trade_proceeds[j] = 0
+        self._trade_start_value[j] = 0
+
+    def _process_pending_orders(self) -> None:
+        orders_to_delete = []
+
+        for order_id, order_config in self._pending_orders.items():
+            if order_config['type'] == 'buy':
+                if self._buy(order_config['symbol'], order_config['options']):
+                    orders_to_delete.append(order_id)
+            elif order_config['type'] == 'sell':
+                if self._sell(order_config['symbol'], order_config['options']):
+                    orders_to_delete.append(order_id)
+
+        for order_id in orders_to_delete:
+            self._pending_orders.pop(order_id)
+
+    def _update_strategy_metrics(self) -> None:
+        i = self.current_period
+        close = self.data.valuation_close[i]
+        low = np.nan_to_num(np.where(np.isnan(self.data.low[i]), close, self.data.low[i]))
+        high = np.nan_to_num(np.where(np.isnan(self.data.high[i]), close, self.data.high[i]))
+        min_period_value = self.capital + float(self.positions @ low)
+        max_period_value = self.capital + float(self.positions @ high)
+        self.metrics.update_drawdown(min_period_value, max_period_value)
+
+    def cancel_pending_orders(self):
+        self._pending_orders = {}
+
+    def exist_pending_orders(self) -> bool:
+        return len(self._pending_orders) > 0
+
+    def get_metrics_summary(self) -> MetricsSummary:
+        periods = int(np.count_nonzero(~np.isnan(self.historical_capital)))
+        periods_per_year = None
+        if periods > 1:
+            periods_per_year = get_periods_per_year(self.dates[0], self.dates[periods-1], periods)
+        return self.metrics.get_summary(periods_per_year)
+
+    def get_symbol_summary(self) -> DataFrame:
+        return pd.DataFrame(
+            {
+                'position': self.positions,
+                'realized_profit': self.realized_profit,
+                'total_trades': [self.symbol_metrics[symbol].total_trades for symbol in self.symbols],
+                'positive_trades': [self.symbol_metrics[symbol].positive_trades for symbol in self.symbols],
+                'negative_trades': [self.symbol_metrics[symbol].negative_trades for symbol in self.symbols],
+                'average_trades': [self.symbol_metrics[symbol].average_trades for symbol in self.symbols]
+            },
+            index=pd.Index(self.symbols, name='symbol')
+        )
@@ -0,0 +1,126 @@
+from contextlib import contextmanager
+import json
+import time
+from typing import Any, Dict, Iterator, Optional
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+
+class ProfileReport:
+    '''
+    Cumulative time and number of calls of every phase, plus the number of
+    processed bars and the bars per second.
+
+    'commission' time is measured inside 'orders' (and inside 'next' when the
+    strategy calls the commission), so it is also part of those phases.
+    '''
+
+    def __init__(self, phases: Dict[str, Dict[str, float]], bars: int, bar_time: float):
+        self.phases = phases
+        self.bars = bars
+        self.bar_time = bar_time
+        self.bars_per_second = bars/bar_time if bar_time > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'bars': self.bars,
+            'bar_time': self.bar_time,
+            'bars_per_second': self.bars_per_second,
+            'phases': self.phases
+        }
+
+    def to_json(self, path: Optional[str] = None) -> str:
+        report_json = json.dumps(self.to_dict(), indent=2)
+        if path is not None:
+            with open(path, 'w') as report_file:
+                report_file.write(report_json)
+        return report_json
+
+    def to_dataframe(self) -> DataFrame:
+        df = pd.DataFrame.from_dict(self.phases, orient='index', columns=['time', 'calls'])
+        df.index.name = 'phase'
+        df['time_per_call'] = df['time']/df['calls']
+        df['share'] = df['time']/self.bar_time if self.bar_time > 0 else 0.0
+        return df.sort_values('time', ascending=False)
+
+    def __repr__(self) -> str:
+        lines = [f'{self.bars} bars in {self.bar_time:.6f}s ({self.bars_per_second:.1f} bars/s)']
+        for phase, values in sorted(self.phases.items(), key=lambda item: -item[1]['time']):
+            lines.append(f'  {phase}: {values["time"]:.6f}s in {int(values["calls"])} calls')
+        return '\n'.join(lines)
+
+
+class Profiler:
+    '''
+    Accumulates time and call counts per phase. Engine phases are recorded
+    by Strategy once profiling is enabled, and other work, like loading the
+    data, can be added with measure:
+
+        profiler = Profiler()
+        with profiler.measure('data_loading'):
+            df = read_files_from_folder('AAPL')
+        strategy = MyStrategy(df, 10000, {'amount': 2})
+        strategy.enable_profiling(profiler)
+    '''
+
+    def __init__(self):
+        self.times: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self.bars = 0
+        self.bar_time = 0.0
+
+    def add(self, phase: str, elapsed: float) -> None:
+        self.times[phase] = self.times.get(phase, 0.0) + elapsed
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+
+    def add_bar(self, elapsed: float) -> None:
+        self.bars += 1
+        self.bar_time += elapsed
+
+    @contextmanager
+    def measure(self, phase: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start)
+
+    def reset(self) -> None:
+        self.__init__()
+
+    def get_report(self) -> ProfileReport:
+        phases = {phase: {'time': self.times[phase], 'calls': self.calls[phase]} for phase in self.times}
+        return ProfileReport(phases, self.bars, self.bar_time)
+
+
+class TimedCommission:
+    '''
+    Wraps a compiled commission and records the time of every call in a
+    Profiler under 'commission'.
+    '''
+
+    def __init__(self, commission: Any, profiler: Profiler):
+        self.commission = commission
+        self.profiler = profiler
+
+    def __call__(self, operation_amount: float, operation_type: str = '') -> float:
+        start = time.perf_counter()
+        cost = self.commission(operation_amount, operation_type)
+        self.profiler.add('commission', time.perf_counter() - start)
+        return cost
+
+    def get_max_shares(self, budget: float, price: float, operation_type: str = 'buy') -> int:
+        start = time.perf_counter()
+        number_shares = self.commission.get_max_shares(budget, price, operation_type)
+        self.profiler.add('commission', time.perf_counter() - start)
+        return number_shares
+
+    def get_costs(self, operation_amounts: np.ndarray, operation_type: str = '') -> np.ndarray:
+        start = time.perf_counter()
+        costs = self.commission.get_costs(operation_amounts, operation_type)
+        self.profiler.add('commission', time.perf_counter() - start)
+        return costs
+
+    def get_schedule(self, operation_type: str = '') -> Any:
+        return self.commission.get_schedule(operation_type)
@@ -0,0 +1,132 @@
+from concurrent.futures import ProcessPoolExecutor
+import html
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+
+from src.backtesting_engine.plot_chart import (
+    DEFAULT_FIGURE_SIZE,
+    DEFAULT_MAX_POINTS,
+    get_candlestick_figure,
+    resample_last,
+    resample_ohlcv
+)
+
+
+def get_report_data(strategy: Any, data_name: str = '', max_points: Optional[int] = DEFAULT_MAX_POINTS) -> Dict[str, Any]:
+    '''
+    What is needed to draw the chart of an executed strategy. The bars are
+    already aggregated to max_points, so the data sent to other processes
+    does not depend on the length of the backtest.
+    '''
+    df = strategy.get_plot_df()
+    equity_curve = strategy.get_equity_curve()
+    if max_points is not None and len(df) > max_points:
+        bucket_size = -(-len(df)//max_points)
+        df = resample_ohlcv(df, bucket_size)
+        equity_curve = resample_last(equity_curve, bucket_size)
+    return {
+        'df': df,
+        'indicators': list(strategy.indicators),
+        'operations': strategy.get_trades(),
+        'capital_series': equity_curve,
+        'data_name': data_name
+    }
+
+
+def _build_figure(report_data: Dict[str, Any], output_format: str, theme_name: str, width: int, height: int) -> str:
+    fig = get_candlestick_figure(
+        df=report_data['df'],
+        indicators=report_data['indicators'],
+        operations=report_data['operations'],
+        capital_series=report_data['capital_series'],
+        theme_name=theme_name,
+        data_name=report_data['data_name'],
+        width=width,
+        height=height,
+        max_points=None
+    )
+    if output_format == 'combined_html':
+        return pio.to_html(fig, full_html=False, include_plotlyjs=False)
+    if output_format == 'html':
+        return pio.to_html(fig, full_html=True, include_plotlyjs='cdn')
+    return fig.to_json()
+
+
+def _get_file_name(i: int, data_name: str, extension: str) -> str:
+    name = re.sub(r'[^A-Za-z0-9_.-]+', '_', data_name).strip('_')
+    return f'{i:04d}_{name}.{extension}' if name else f'{i:04d}.{extension}'
+
+
+def render_reports(
+    reports: Sequence[Any],
+    output: str,
+    output_format: str = 'png',
+    data_names: Optional[Sequence[str]] = None,
+    theme_name: str = 'LIGHT_THEME',
+    width: int = DEFAULT_FIGURE_SIZE[0],
+    height: int = DEFAULT_FIGURE_SIZE[1],
+    max_points: Optional[int] = DEFAULT_MAX_POINTS,
+    max_workers: Optional[int] = None,
+    title: str = 'Backtest report'
+) -> List[str]:
+    '''
+    Renders the charts of many executed strategies (or get_report_data
+    results) without any display.
+
+    The figures are built in a process pool. Static images ('png', 'jpeg',
+    'svg', 'pdf' or 'webp') are then exported one after another from this
+    process, so a single kaleido export process is started and reused for
+    all of them. output is the folder of the files, except for
+    'combined_html', where it is the path of a single HTML page with every
+    chart and one copy of plotly.js.
+
+    Returns the paths of the written files.
+    '''
+    if data_names is None:
+        data_names = ['']*len(reports)
+    if len(data_names) != len(reports):
+        raise Exception(f'ERROR: {len(data_names)} data names were given for {len(reports)} reports')
+    reports_data = [
+        report if isinstance(report, dict) else get_report_data(report, data_name, max_points)
+        for report, data_name in zip(reports, data_names)
+    ]
+
+    args = (
+        reports_data,
+        [output_format]*len(reports_data),
+        [theme_name]*len(reports_data),
+        [width]*len(reports_data),
+        [height]*len(reports_data)
+    )
+    if max_workers == 1 or len(reports_data) <= 1:
+        figures = list(map(_build_figure, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            figures = list(executor.map(_build_figure, *args))
+
+    if output_format == 'combined_html':
+        folder = os.path.dirname(output)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as report_file:
+            report_file.write(f'<html><head><meta charset="utf-8"><title>{html.escape(title)}</title>')
+            report_file.write(f'<script type="text/javascript">{get_plotlyjs()}</script></head><body>')
+            for figure_html in figures:
+                report_file.write(f'<div>{figure_html}</div>')
+            report_file.write('</body></html>')
+        return [output]
+
+    os.makedirs(output, exist_ok=True)
+    paths = []
+    for i, (figure, report_data) in enumerate(zip(figures, reports_data)):
+        path = os.path.join(output, _get_file_name(i, report_data['data_name'], output_format))
+        if output_format == 'html':
+            with open(path, 'w', encoding='utf-8') as report_file:
+                report_file.write(figure)
+        else:
+            pio.write_image(pio.from_json(figure), path, format=output_format, width=width, height=height)
+        paths.append(path)
+    return paths
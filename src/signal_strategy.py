@@ -0,0 +1,187 @@
+from typing import Any, List, Tuple, Union
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from src.backtesting_engine.strategy import Strategy
+
+
+Signal = Union[np.ndarray, pd.Series]
+
+
+class SignalStrategy(Strategy):
+    '''
+    Strategy driven by precomputed entry/exit signals aligned to df.
+
+    A signal on bar i behaves like calling buy(all=True) (when there is no
+    position) or sell(all=True) (when there is an open position) inside next(),
+    so the order is filled at the open of bar i+1.
+
+    execute_strategy() runs the usual bar by bar loop, while
+    execute_vectorized_strategy() gives the same orders, capital curve and
+    metrics using array operations. Only the bars with a fill go through
+    Python code.
+    '''
+
+    def __init__(self, df: DataFrame, init_capital: float, commission_config: Any, entries: Signal, exits: Signal):
+        super().__init__(df, init_capital, commission_config)
+        self.entries = self._to_signal_array(entries)
+        self.exits = self._to_signal_array(exits)
+
+    def _to_signal_array(self, signal: Signal) -> np.ndarray:
+        if isinstance(signal, pd.Series):
+            signal = signal.reindex(self.df.index).fillna(False)
+        signal_array = np.asarray(signal, dtype=bool)
+        if signal_array.shape != (len(self.df),):
+            raise Exception(f'ERROR: signal shape {signal_array.shape} does not match data length {len(self.df)}.')
+        return signal_array
+
+    def next(self):
+        i = self.current_period
+        if self.shares == 0 and self.entries[i]:
+            self.buy(all=True)
+        if self.shares > 0 and self.exits[i]:
+            self.sell(all=True)
+
+    def _get_decision_periods(self, start: int, position: int) -> np.ndarray:
+        '''
+        Periods from start on where next() would create an order, assuming
+        every order is filled. position is 1 if there are shares at start.
+        '''
+        entries = self.entries[start:]
+        exits = self.exits[start:]
+        n = len(entries)
+        periods = np.arange(n)
+
+        marks = np.full(n, np.nan)
+        marks[entries & ~exits] = 1
+        marks[exits & ~entries] = 0
+
+        # A bar with both signals toggles the position, so its state depends on
+        # the previous one. Only those bars are resolved one by one.
+        last_mark = np.maximum.accumulate(np.where(np.isnan(marks), -1, periods))
+        last_conflict = -1
+        for conflict in np.flatnonzero(entries & exits):
+            previous = last_mark[conflict-1] if conflict > 0 else -1
+            previous = max(previous, last_conflict)
+            previous_state = marks[previous] if previous >= 0 else position
+            marks[conflict] = 1 - previous_state
+            last_conflict = conflict
+
+        last_mark = np.maximum.accumulate(np.where(np.isnan(marks), -1, periods))
+        state = np.where(last_mark >= 0, marks[np.maximum(last_mark, 0)], position)
+        previous_state = np.concatenate(([position], state[:-1]))
+        return start + np.flatnonzero(state != previous_state)
+
+    def _execute_signal_orders(self) -> List[Tuple[int, float, int]]:
+        n = len(self.data_close)
+        fills = []
+        decision_periods = self._get_decision_periods(0, 0)
+        k = 0
+
+        while k < len(decision_periods):
+            self.current_period = int(decision_periods[k]) + 1
+            if self.current_period >= n:
+                # Orders created on the last bar stay pending like in execute_strategy
+                self.current_period = n-1
+                if self.shares > 0:
+                    self.sell(all=True)
+                else:
+                    self.buy(all=True)
+                break
+
+            if self.shares == 0:
+                self._buy({'all': True})
+                if self.shares == 0:
+                    # The purchase was canceled, so next() keeps looking for an entry from this bar
+                    decision_periods = self._get_decision_periods(self.current_period, 0)
+                    k = 0
+                    continue
+            else:
+                self._sell({'all': True})
+
+            fills.append((self.current_period, self.capital, self.shares))
+            k += 1
+
+        return fills
+
+    def _update_vectorized_metrics(self, capital: np.ndarray, shares: np.ndarray, fills: List[Tuple[int, float, int]]) -> None:
+        metrics = self.metrics
+        capital_before_buy = self.init_capital
+        for _, fill_capital, fill_shares in fills:
+            if fill_shares == 0:
+                metrics.add_trade((fill_capital-capital_before_buy)/capital_before_buy, fill_capital-capital_before_buy)
+                capital_before_buy = fill_capital
+        self._capital_before_buy = capital_before_buy
+
+        min_period_value = capital + shares*self.data_low
+        max_period_value = capital + shares*self.data_high
+
+        # A new drawdown starts every time the period max exceeds all previous ones
+        is_new_drawdown = np.ones(len(max_period_value), dtype=bool)
+        is_new_drawdown[1:] = max_period_value[1:] > np.maximum.accumulate(max_period_value)[:-1]
+        starts = np.flatnonzero(is_new_drawdown)
+        drawdown_max = max_period_value[starts]
+        drawdown_min = np.minimum.reduceat(min_period_value, starts)
+        drawdown_value = 100*(drawdown_max-drawdown_min)/drawdown_max
+
+        if metrics.keep_drawdowns:
+            metrics.drawdowns = [
+                {'min': dd_min, 'max': dd_max, 'drawdown': dd}
+                for dd_min, dd_max, dd in zip(drawdown_min.tolist(), drawdown_max.tolist(), drawdown_value.tolist())
+            ]
+        metrics.drawdown_min = float(drawdown_min[-1])
+        metrics.drawdown_max = float(drawdown_max[-1])
+        metrics.drawdown = float(drawdown_value[-1])
+        metrics.max_drawdown = max([0] + drawdown_value.tolist())
+
+        values = capital + shares*self.data_close
+        returns = values[1:]/values[:-1] - 1
+        metrics.periods = len(values)
+        metrics.exposed_periods = int(np.count_nonzero(shares > 0))
+        metrics.first_value = float(values[0])
+        metrics.last_value = float(values[-1])
+        metrics.returns_count = len(returns)
+        if len(returns) > 0:
+            metrics.returns_mean = float(returns.mean())
+            metrics.returns_m2 = float(np.sum((returns - metrics.returns_mean)**2))
+            metrics.downside_sum = float(np.sum(np.minimum(returns, 0)**2))
+
+        # Bars below the previous peak of the equity, counted from the peak
+        equity_peak = np.maximum.accumulate(values)
+        underwater = values < equity_peak
+        peaks = np.flatnonzero(~underwater)
+        last_peak = peaks[np.searchsorted(peaks, np.arange(len(values)), side='right') - 1]
+        durations = np.arange(len(values)) - last_peak
+        metrics.equity_peak = float(equity_peak[-1])
+        metrics.drawdown_duration = int(durations[-1])
+        metrics.max_drawdown_duration = int(durations.max())
+
+    def execute_vectorized_strategy(self):
+        if self.tracer.is_enabled('simulation_start'):
+            self.tracer.emit('simulation_start', None, name='VECTORIZED STRATEGY')
+        n = len(self.data_close)
+        fills = self._execute_signal_orders()
+
+        fill_periods = np.array([fill[0] for fill in fills], dtype=np.int64)
+        fill_capital = np.array([self.init_capital] + [fill[1] for fill in fills], dtype=float)
+        fill_shares = np.array([0] + [fill[2] for fill in fills], dtype=np.int64)
+        fill_index = np.searchsorted(fill_periods, np.arange(n), side='right')
+        capital = fill_capital[fill_index]
+        shares = fill_shares[fill_index]
+
+        self._update_vectorized_metrics(capital, shares, fills)
+
+        values = capital + shares*self.data_close
+        self.equity_curve.set_values(values)
+
+        self.capital = float(capital[-1])
+        self.shares = int(shares[-1])
+        self._before_shares = self.shares
+        self._before_capital = self.capital
+        self.current_period = n
+
+        if self.tracer.is_enabled('simulation_end'):
+            self.tracer.emit('simulation_end', None, name='VECTORIZED STRATEGY')
+
+        return self.capital, self.shares, self.capital + self.shares*self.data_close[self.current_period-1]
@@ -1,20 +1,36 @@
 from abc import ABC, abstractmethod
-import logging
-from pandas import DataFrame
-from typing import Any, List, Optional
+import time
+import numpy as np
+from pandas import DataFrame, Series
+from typing import Any, Dict, List, Optional, Sequence, Union
 from datetime import datetime
 
-from src.backtesting_engine.plot_chart import plot_candlestick
+from src.backtesting_engine.bar_data import BarData, GrowableBarData
+from src.backtesting_engine.checkpoint import Checkpointer
+from src.backtesting_engine.events import EventSink, LoggingSink, Tracer
+from src.backtesting_engine.indicator_cache import get_indicator_cache
+from src.backtesting_engine.indicators import Indicator, IndicatorSet
+from src.backtesting_engine.ledger import EquityCurve, TradeLedger
+from src.backtesting_engine.monte_carlo import get_trade_returns
+from src.backtesting_engine.order_book import OrderBook
+from src.backtesting_engine.plot_chart import DEFAULT_MAX_POINTS, plot_candlestick
+from src.backtesting_engine.profiler import Profiler, ProfileReport, TimedCommission
+from src.backtesting_engine.timeframes import Timeframe, TimeframeView
 from src.backtesting_engine.type_dict_classes import (
     CompletedOrder,
-    DateValue
+    DateValue,
+    MetricsSummary
 )
 from src.backtesting_engine.commission_calculator import CommissionCalculator
 
 
 class StrategyMetrics:
+    '''
+    Trade and equity metrics updated bar by bar with constant memory.
+    Every drawdown episode is only kept in drawdowns with keep_drawdowns=True.
+    '''
 
-    def __init__(self) -> None:
+    def __init__(self, keep_drawdowns: bool = False) -> None:
         self.total_trades = 0
         self.positive_trades = 0
         self.negative_trades = 0
@@ -25,145 +41,492 @@ class StrategyMetrics:
         self.accumulate = 0
         self.accumulate_profit = 0
         self.accumulate_loss = 0
+        self.gross_profit = 0
+        self.gross_loss = 0
+        self.keep_drawdowns = keep_drawdowns
         self.drawdowns = []
+        # Current drawdown episode
+        self.drawdown_min = None
+        self.drawdown_max = None
+        self.drawdown = 0
+        # Per bar returns of the equity (close value), with Welford's running mean and variance
+        self.periods = 0
+        self.exposed_periods = 0
+        self.first_value = None
+        self.last_value = None
+        self.returns_count = 0
+        self.returns_mean = 0
+        self.returns_m2 = 0
+        self.downside_sum = 0
+        self.equity_peak = None
+        self.drawdown_duration = 0
+        self.max_drawdown_duration = 0
+
+    def add_trade(self, trade_return: float, trade_profit: Optional[float] = None) -> None:
+        self.total_trades += 1
+        self.accumulate += trade_return
+        self.average_trades = self.accumulate/self.total_trades
+
+        if trade_profit is None:
+            trade_profit = trade_return
+        if trade_profit >= 0:
+            self.gross_profit += trade_profit
+        else:
+            self.gross_loss -= trade_profit
+
+        if trade_return >= 0:
+            self.positive_trades += 1
+            self.accumulate_profit += trade_return
+            self.average_positive_trades = self.accumulate_profit/self.positive_trades
+        elif trade_return < 0:
+            self.negative_trades += 1
+            self.accumulate_loss += trade_return
+            self.average_negative_trades = self.accumulate_loss/self.negative_trades
+
+    def update_drawdown(self, min_period_value: float, max_period_value: float) -> None:
+        if self.drawdown_max is None or max_period_value > self.drawdown_max:
+            self.drawdown_min = min_period_value
+            self.drawdown_max = max_period_value
+            self.drawdown = 100*(max_period_value-min_period_value)/max_period_value
+            if self.keep_drawdowns:
+                self.drawdowns.append({'min': min_period_value, 'max': max_period_value, 'drawdown': self.drawdown})
+        elif min_period_value < self.drawdown_min:
+            self.drawdown_min = min_period_value
+            self.drawdown = 100*(self.drawdown_max-min_period_value)/self.drawdown_max
+            if self.keep_drawdowns:
+                self.drawdowns[-1]['min'] = min_period_value
+                self.drawdowns[-1]['drawdown'] = self.drawdown
+
+        if self.drawdown > self.max_drawdown:
+            self.max_drawdown = self.drawdown
+
+    def update_equity(self, value: float, exposed: bool) -> None:
+        '''
+        Adds the value of the strategy at the close of a bar and whether a
+        position was held.
+        '''
+        self.periods += 1
+        if exposed:
+            self.exposed_periods += 1
+
+        if self.last_value is None:
+            self.first_value = value
+            self.equity_peak = value
+        else:
+            period_return = value/self.last_value - 1
+            self.returns_count += 1
+            delta = period_return - self.returns_mean
+            self.returns_mean += delta/self.returns_count
+            self.returns_m2 += delta*(period_return - self.returns_mean)
+            if period_return < 0:
+                self.downside_sum += period_return*period_return
+        self.last_value = value
+
+        if value >= self.equity_peak:
+            self.equity_peak = value
+            self.drawdown_duration = 0
+        else:
+            self.drawdown_duration += 1
+            if self.drawdown_duration > self.max_drawdown_duration:
+                self.max_drawdown_duration = self.drawdown_duration
+
+    def get_summary(self, periods_per_year: Optional[float] = None) -> MetricsSummary:
+        '''
+        Returns the metrics as a flat record. Volatility, Sharpe, Sortino and
+        the annual return are annualized with periods_per_year, or given per
+        bar if it is None.
+        '''
+        nan = float('nan')
+        scale = periods_per_year if periods_per_year is not None else 1
+        volatility = np.sqrt(self.returns_m2/self.returns_count) if self.returns_count > 0 else nan
+        downside_deviation = np.sqrt(self.downside_sum/self.returns_count) if self.returns_count > 0 else nan
+        total_return = self.last_value/self.first_value - 1 if self.first_value else nan
+        annual_return = (1 + total_return)**(scale/self.returns_count) - 1 if self.returns_count > 0 and total_return > -1 else nan
+
+        return {
+            'total_trades': self.total_trades,
+            'positive_trades': self.positive_trades,
+            'negative_trades': self.negative_trades,
+            'average_trades': self.average_trades,
+            'average_positive_trades': self.average_positive_trades,
+            'average_negative_trades': self.average_negative_trades,
+            'profit_factor': self.gross_profit/self.gross_loss if self.gross_loss > 0 else nan,
+            'max_drawdown': self.max_drawdown,
+            'max_drawdown_duration': self.max_drawdown_duration,
+            'total_return': total_return,
+            'annual_return': annual_return,
+            'volatility': float(volatility*np.sqrt(scale)),
+            'sharpe_ratio': float(self.returns_mean/volatility*np.sqrt(scale)) if volatility > 0 else nan,
+            'sortino_ratio': float(self.returns_mean/downside_deviation*np.sqrt(scale)) if downside_deviation > 0 else nan,
+            'calmar_ratio': annual_return/(self.max_drawdown/100) if self.max_drawdown > 0 else nan,
+            'exposure': self.exposed_periods/self.periods if self.periods > 0 else nan
+        }
+
+
+def get_periods_per_year(first_date: datetime, last_date: datetime, periods: int) -> Optional[float]:
+    '''
+    Number of bars per year, estimated from the bars between two dates.
+    '''
+    years = (last_date - first_date).total_seconds()/(365.25*24*3600)
+    if periods < 2 or years <= 0:
+        return None
+    return (periods - 1)/years
 
 
 class Strategy(ABC):
+    # Attributes of a subclass saved with the checkpoints, besides the state of the engine
+    checkpoint_fields: List[str] = []
 
     def __init__(self, df: DataFrame, init_capital: float, commission_config: Any):
-        self.df = df
         self.init_capital = init_capital
         self.capital = init_capital
         self.shares = 0
         self.commission_config = commission_config
+        self.commission = CommissionCalculator.compile(commission_config)
         self.current_period = 0
-        self.data_close: List[float] = list(self.df['Close'])
-        self.data_open: List[float] = list(self.df['Open'])
-        self.data_high: List[float] = list(self.df['High'])
-        self.data_low: List[float] = list(self.df['Low'])
-        self.dates: List[datetime] = list(self.df.index)
-        self.data = self.df.reset_index().to_dict('records')
-        self.completed_purchases: List[CompletedOrder] = []
-        self.completed_sales: List[CompletedOrder] = []
-        self.completed_transactions: List[CompletedOrder] = []
-        self.historical_capital: List[DateValue] = []
+        self.bars: Union[BarData, GrowableBarData] = BarData(df)
+        self._initial_bars = len(self.bars)
+        self._bind_bars()
+        self.trades = TradeLedger()
+        self.equity_curve = EquityCurve(len(self.bars))
         self.indicators = []
+        self._indicator_set = IndicatorSet()
+        self._timeframes: Dict[str, Timeframe] = {}
         self.metrics = StrategyMetrics()
-        self._pending_orders = {}
-        self._order_id = 0
+        self.order_book = OrderBook()
+        self.tracer = Tracer([LoggingSink()])
+        self.profiler: Optional[Profiler] = None
+        self.checkpointer: Optional[Checkpointer] = None
         self._before_shares = 0
         self._before_capital = init_capital
         self._capital_before_buy = init_capital
 
-    def buy(self, **options):
-        logging.info(f'{self.dates[self.current_period]} CREATE BUY ORDER. {options}')
-        self._pending_orders[str(self._order_id)] = {'type': 'buy', 'options': options}
-        self._order_id += 1
+    def buy(self, **options) -> int:
+        order_id = self.order_book.add('buy', options, self.data_close[self.current_period])
+        if self.tracer.is_enabled('order_created'):
+            self._trace('order_created', type='buy', order_id=order_id, options=options)
+        return order_id
     
-    def sell(self, **options):
-        logging.info(f'{self.dates[self.current_period]} CREATE SELL ORDER. {options}')
-        self._pending_orders[str(self._order_id)] = {'type': 'sell', 'options': options}
-        self._order_id += 1
+    def sell(self, **options) -> int:
+        order_id = self.order_book.add('sell', options, self.data_close[self.current_period])
+        if self.tracer.is_enabled('order_created'):
+            self._trace('order_created', type='sell', order_id=order_id, options=options)
+        return order_id
+
+    def cancel_order(self, order_id: int) -> None:
+        self.order_book.cancel(order_id)
+
+    def set_quiet(self) -> None:
+        '''
+        Removes every event sink, so no event is built or logged.
+        '''
+        self.tracer.close()
+        self.tracer = Tracer()
+
+    def add_event_sink(self, sink: EventSink) -> None:
+        self.tracer.add_sink(sink)
+
+    def enable_profiling(self, profiler: Optional[Profiler] = None) -> Profiler:
+        '''
+        Records the time and number of calls of every engine phase (orders,
+        metrics, next, capital, commission and indicators) from now on.
+        '''
+        self.profiler = profiler if profiler is not None else Profiler()
+        if isinstance(self.commission, TimedCommission):
+            self.commission = self.commission.commission
+        self.commission = TimedCommission(self.commission, self.profiler)
+        return self.profiler
+
+    def disable_profiling(self) -> None:
+        self.profiler = None
+        if isinstance(self.commission, TimedCommission):
+            self.commission = self.commission.commission
+
+    def get_profile_report(self) -> ProfileReport:
+        if self.profiler is None:
+            raise Exception('ERROR: profiling is not enabled.')
+        return self.profiler.get_report()
+
+    def enable_checkpoints(self, folder: str, interval: Optional[int] = None) -> Checkpointer:
+        '''
+        Saves the state of the simulation in folder every interval bars (or
+        only with save_checkpoint when interval is None).
+        '''
+        self.checkpointer = Checkpointer(folder, interval)
+        return self.checkpointer
+
+    def save_checkpoint(self) -> None:
+        if self.checkpointer is None:
+            raise Exception('ERROR: checkpoints are not enabled.')
+        self.checkpointer.save(self)
+
+    def restore_checkpoint(self, folder: str) -> None:
+        '''
+        Loads the last checkpoint saved in folder. The strategy must be
+        created with the same arguments as the checkpointed one. Later
+        checkpoints are added to the same folder.
+        '''
+        checkpointer = Checkpointer(folder)
+        checkpointer.restore(self)
+        self.checkpointer = checkpointer
+
+    def get_checkpoint_state(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.checkpoint_fields}
+
+    def set_checkpoint_state(self, state: Dict[str, Any]) -> None:
+        for field, value in state.items():
+            setattr(self, field, value)
+
+    def _trace(self, event: str, **fields) -> None:
+        self.tracer.emit(event, self.dates[self.current_period], **fields)
+
+    def _bind_bars(self) -> None:
+        self.data_close: np.ndarray = self.bars.close
+        self.data_open: np.ndarray = self.bars.open
+        self.data_high: np.ndarray = self.bars.high
+        self.data_low: np.ndarray = self.bars.low
+        self.dates: Sequence[datetime] = self.bars.dates
+
+    def add_indicator(self, indicator: Indicator) -> None:
+        '''
+        Computes the indicator for every bar and registers its outputs, so they
+        can be read with get_indicator(name) and are shown by plot_strategy.
+        '''
+        self._indicator_set.add(indicator, self.bars, get_indicator_cache())
+        for output in indicator.outputs:
+            self.indicators.append({'name': output, 'in_candle_chart': indicator.in_candle_chart})
+
+    def get_indicator(self, name: str) -> np.ndarray:
+        return self._indicator_set.get(name)
+
+    def add_timeframe(self, rule: str) -> None:
+        '''
+        Aggregates the bars into a higher timeframe, e.g. '1h' or '1D', once
+        for all the bars. It is then updated by add_bar.
+        '''
+        if rule not in self._timeframes:
+            self._timeframes[rule] = Timeframe(rule, self.bars.df)
+
+    def get_timeframe(self, rule: str) -> TimeframeView:
+        '''
+        Bars of the rule timeframe closed before the bucket of the current
+        period, e.g. self.get_timeframe('1D').close[-1] is the close of the
+        previous day. The timeframe is added on the first call.
+        '''
+        self.add_timeframe(rule)
+        return self._timeframes[rule].view(self.current_period)
+
+    @property
+    def df(self) -> DataFrame:
+        return self.bars.df
+
+    @df.setter
+    def df(self, df: DataFrame) -> None:
+        # Replaces the bars before the simulation, e.g. self.df = self.df.assign(signal=...)
+        # in the __init__ of a subclass. Indicators already added are not computed again.
+        if isinstance(self.bars, GrowableBarData):
+            raise Exception('ERROR: the bars of a streaming strategy can not be replaced.')
+        self.bars = BarData(df)
+        self._initial_bars = len(self.bars)
+        self._bind_bars()
+
+    @property
+    def data(self) -> List[Dict[str, Any]]:
+        return self.bars.records
+
+    @property
+    def current_data(self) -> Dict[str, Any]:
+        '''
+        Record of the current bar. After the simulation it is the last bar, the
+        last one next() was called with.
+        '''
+        return self.bars.get_record(min(self.current_period, len(self.bars) - 1))
+
+    def get_equity_curve(self) -> Series:
+        '''
+        Value of the strategy at the close of every processed bar.
+        '''
+        return self.equity_curve.to_series(self.bars.index)
+
+    def get_trades(self) -> DataFrame:
+        '''
+        Completed orders with their date, period, price, number_shares and type ('purchase' or 'sale').
+        '''
+        return self.trades.to_dataframe(self.bars.index)
+
+    def get_trade_returns(self) -> np.ndarray:
+        '''
+        Return of every closed trade over the value before it, the input of run_monte_carlo.
+        '''
+        return get_trade_returns(self.trades, self.commission, self.init_capital)
+
+    def get_plot_df(self) -> DataFrame:
+        '''
+        Bars with a column for every indicator output.
+        '''
+        if len(self._indicator_set) > 0:
+            return self.df.assign(**self._indicator_set.get_values())
+        return self.df
+
+    @property
+    def historical_capital(self) -> List[DateValue]:
+        return self.equity_curve.get_records(self.bars.index)
+
+    @property
+    def completed_purchases(self) -> List[CompletedOrder]:
+        return self.trades.get_records(self.bars.index, 'purchase')
+
+    @property
+    def completed_sales(self) -> List[CompletedOrder]:
+        return self.trades.get_records(self.bars.index, 'sale')
+
+    @property
+    def completed_transactions(self) -> List[CompletedOrder]:
+        return self.trades.get_records(self.bars.index)
 
     @abstractmethod
     def next(self):
         pass
 
     def execute_strategy(self):
-        logging.info('START STRATEGY SIMULATION')
         self.current_period = 0
+        return self.resume_strategy()
+
+    def resume_strategy(self):
+        '''
+        Processes the bars from current_period to the end, e.g. after restore_checkpoint.
+        '''
+        if self.tracer.is_enabled('simulation_start'):
+            self.tracer.emit('simulation_start', None, name='STRATEGY')
+
+        while self.current_period < len(self.bars):
+            self._process_bar()
+            if self.checkpointer is not None:
+                self.checkpointer.after_bar(self)
+
+        if self.tracer.is_enabled('simulation_end'):
+            self.tracer.emit('simulation_end', None, name='STRATEGY')
+
+        return self.get_result()
+
+    def start_streaming(self, capacity: int = 1024) -> None:
+        '''
+        Switches to growable bar buffers so new bars can be added with add_bar.
+        '''
+        if not isinstance(self.bars, GrowableBarData):
+            self.bars = GrowableBarData(self.bars, capacity)
+            self._bind_bars()
+            self._indicator_set.start_streaming(self.bars)
+
+    def add_bar(self, date: datetime, bar: Dict[str, float]) -> None:
+        '''
+        Appends a new bar, e.g. add_bar(date, {'Open': 10, 'High': 11, 'Low': 9, 'Close': 10.5, 'Volume': 100}),
+        and processes it in the same way as execute_strategy does.
+        '''
+        self.start_streaming()
+        self.bars.append(date, bar)
+        self._bind_bars()
+        for timeframe in self._timeframes.values():
+            timeframe.append(date, bar)
+        if len(self._indicator_set) > 0:
+            if self.profiler is not None:
+                with self.profiler.measure('indicators'):
+                    self._indicator_set.append(self.bars.get_record(len(self.bars)-1))
+            else:
+                self._indicator_set.append(self.bars.get_record(len(self.bars)-1))
 
-        for row in self.data:
-            logging.debug(f'{self.dates[self.current_period]} OPEN: {self.data_open[self.current_period]}, CLOSE: {self.data_close[self.current_period]}')
-            self._process_pending_orders()
-            self._update_strategy_metrics()
-            self.current_data = row
-            self.next()
-            date_value = {
-                'date': self.dates[self.current_period],
-                'value': self.capital + self.shares*self.data_close[self.current_period]
-            }
-            self.historical_capital.append(date_value)
-            self.current_period += 1
-
-        logging.info('END STRATEGY SIMULATION')
+        while self.current_period < len(self.bars):
+            self._process_bar()
+            if self.checkpointer is not None:
+                self.checkpointer.after_bar(self)
 
+    def get_result(self):
         return self.capital, self.shares, self.capital + self.shares*self.data_close[self.current_period-1]
 
-    def _buy(self, options: dict) -> bool:
-        order_type = options['order_type'] if 'order_type' in options else 'market_order'
-
-        if order_type == 'limit':
-            buy_price = options['buy_price']
-            if self.data_open[self.current_period] > buy_price:
-                return False
-
-        price_per_share = self.data_open[self.current_period]
+    def _process_bar(self) -> None:
+        if self.profiler is not None:
+            self._process_profiled_bar()
+            return
+
+        if self.tracer.active and self.tracer.is_enabled('bar'):
+            self._trace('bar', open=self.data_open[self.current_period], close=self.data_close[self.current_period])
+        self._process_pending_orders()
+        self._update_strategy_metrics()
+        self.next()
+        value = self.capital + self.shares*self.data_close[self.current_period]
+        self.equity_curve.append(value)
+        self.metrics.update_equity(value, self.shares > 0)
+        self.current_period += 1
+
+    def _process_profiled_bar(self) -> None:
+        profiler = self.profiler
+        if self.tracer.active and self.tracer.is_enabled('bar'):
+            self._trace('bar', open=self.data_open[self.current_period], close=self.data_close[self.current_period])
+
+        bar_start = time.perf_counter()
+        self._process_pending_orders()
+        orders_end = time.perf_counter()
+        self._update_strategy_metrics()
+        metrics_end = time.perf_counter()
+        self.next()
+        next_end = time.perf_counter()
+        value = self.capital + self.shares*self.data_close[self.current_period]
+        self.equity_curve.append(value)
+        self.metrics.update_equity(value, self.shares > 0)
+        bar_end = time.perf_counter()
+
+        profiler.add('orders', orders_end - bar_start)
+        profiler.add('metrics', metrics_end - orders_end)
+        profiler.add('next', next_end - metrics_end)
+        profiler.add('capital', bar_end - next_end)
+        profiler.add_bar(bar_end - bar_start)
+        self.current_period += 1
+
+    def _buy(self, options: dict, price_per_share: Optional[float] = None) -> bool:
+        if price_per_share is None:
+            price_per_share = self.data_open[self.current_period]
         number_shares = 0
         if 'number_shares' in options:
             number_shares = options['number_shares']
         elif 'all' in options:
             if options['all']:
-                find_number_shares = False
-                number_shares = self.capital//price_per_share
-                while not find_number_shares:
-                    operation_amount = price_per_share*number_shares
-                    operation_amount += CommissionCalculator.get_commission_cost(self.commission_config, operation_amount, 'buy')
-                    if self.capital >= operation_amount:
-                        find_number_shares = True
-                    else:
-                        number_shares -= 1
+                number_shares = self.commission.get_max_shares(self.capital, price_per_share, 'buy')
         elif 'capital_percentage' in options:
-            number_shares = self.capital*options['capital_percentage']//price_per_share
+            number_shares = self.commission.get_max_shares(self.capital*options['capital_percentage'], price_per_share, 'buy')
         elif 'capital_amount' in options:
-            number_shares = options['capital_amount']//price_per_share
+            number_shares = self.commission.get_max_shares(options['capital_amount'], price_per_share, 'buy')
         else:
             number_shares = 1
         
         order_completed = False
-        order_canceled_msg = 'Order canceled. '
+        cancel_reason = ''
         number_shares = int(number_shares)
 
         if number_shares > 0:
             operation_amount = price_per_share*number_shares
-            commission = CommissionCalculator.get_commission_cost(self.commission_config, operation_amount, 'buy')
+            commission = self.commission(operation_amount, 'buy')
             if self.capital >= operation_amount+commission:
                 self.capital -= commission
                 self.capital -= operation_amount
                 self.shares += number_shares
                 order_completed = True
             else:
-                order_canceled_msg += 'The capital is less than the cost of the purchase.'
+                cancel_reason = 'The capital is less than the cost of the purchase.'
         else:
-            order_canceled_msg += 'Number of shares to buy must to be greater than 0.'
+            cancel_reason = 'Number of shares to buy must to be greater than 0.'
 
         if order_completed:
-            self.completed_purchases.append(
-                {
-                    'date': self.dates[self.current_period],
-                    'price': price_per_share,
-                    'number_shares': number_shares,
-                    'type': 'purchase'
-                }
-            )
-            self.completed_transactions.append(self.completed_purchases[-1])
-            logging.info(f'{self.dates[self.current_period]} BUY order completed')
-            logging.info(f'{self.dates[self.current_period]} >> Price: {price_per_share}')
-            self._log_current_portfolio()
-        else:
-            logging.info(order_canceled_msg)
-
-        return True
-
-    def _sell(self, options):
-        order_type = options['order_type'] if 'order_type' in options else 'market_order'
+            self.trades.add(self.current_period, price_per_share, number_shares, 'purchase')
+            if self.tracer.is_enabled('order_filled'):
+                self._trace('order_filled', type='buy', price=price_per_share, number_shares=number_shares, capital=self.capital, shares=self.shares)
+        elif self.tracer.is_enabled('order_canceled'):
+            self._trace('order_canceled', type='buy', reason=cancel_reason)
 
-        if order_type == 'limit':
-            sell_price = options['sell_price']
-            if self.data_open[self.current_period] < sell_price:
-                return False
+        return order_completed
 
-        price_per_share = self.data_open[self.current_period]
+    def _sell(self, options: dict, price_per_share: Optional[float] = None) -> bool:
+        if price_per_share is None:
+            price_per_share = self.data_open[self.current_period]
         if 'number_shares' in options:
             number_shares = options['number_shares']
         elif 'number_shares_percentage' in options:
@@ -174,101 +537,76 @@ class Strategy(ABC):
             number_shares = 1
 
         order_completed = False
-        order_canceled_msg = 'Order canceled. '
+        cancel_reason = ''
         number_shares = int(number_shares)
 
         if number_shares > 0:
             if number_shares <= self.shares:
                 operation_amount = number_shares*price_per_share
-                self.capital -= CommissionCalculator.get_commission_cost(self.commission_config, operation_amount, 'buy')
+                self.capital -= self.commission(operation_amount, 'sell')
                 self.capital += operation_amount
                 self.shares -= number_shares
                 order_completed = True
             else:
-                order_canceled_msg += 'The number of shares to be sold is greater than the number of shares owned.'
+                cancel_reason = 'The number of shares to be sold is greater than the number of shares owned.'
         else:
-            order_canceled_msg += 'Number of shares to sell must to be greater than 0.'
+            cancel_reason = 'Number of shares to sell must to be greater than 0.'
             
         if order_completed:
-            self.completed_sales.append(
-                {
-                    'date': self.dates[self.current_period],
-                    'price': price_per_share,
-                    'number_shares': number_shares,
-                    'type': 'sale'
-                }
-            )
-            self.completed_transactions.append(self.completed_sales[-1])
-            logging.info(f'{self.dates[self.current_period]} SELL order completed')
-            logging.info(f'{self.dates[self.current_period]} >> Price: {price_per_share}')
-            self._log_current_portfolio()
-        else:
-            logging.info(order_canceled_msg)
-
-        return True
+            self.trades.add(self.current_period, price_per_share, number_shares, 'sale')
+            if self.tracer.is_enabled('order_filled'):
+                self._trace('order_filled', type='sell', price=price_per_share, number_shares=number_shares, capital=self.capital, shares=self.shares)
+        elif self.tracer.is_enabled('order_canceled'):
+            self._trace('order_canceled', type='sell', reason=cancel_reason)
 
-    def _log_current_portfolio(self) -> None:
-        logging.info(f'{self.dates[self.current_period]} >> Capital: {self.capital}')
-        logging.info(f'{self.dates[self.current_period]} >> Shares: {self.shares}')
-        logging.info('---------------------------------------------------------')
+        return order_completed
 
     def _process_pending_orders(self) -> None:
-        orders_to_delete = []
-
-        for order_id, order_config in self._pending_orders.items():
-            if order_config['type'] == 'buy':
-                if self._buy(order_config['options']):
-                    orders_to_delete.append(order_id)
-            elif order_config['type'] == 'sell':
-                if self._sell(order_config['options']):
-                    orders_to_delete.append(order_id)
-
-        for order_id in orders_to_delete:
-            self._pending_orders.pop(order_id)
+        if len(self.order_book) == 0:
+            return
+
+        i = self.current_period
+        triggered = self.order_book.get_triggered(self.dates[i], self.data_open[i], self.data_high[i], self.data_low[i])
+        for order, price_per_share in triggered:
+            # An order of the same OCO group may have been filled before in this bar
+            if not self.order_book.is_pending(order['id']):
+                continue
+            if order['type'] == 'buy':
+                filled = self._buy(order['options'], price_per_share)
+            else:
+                filled = self._sell(order['options'], price_per_share)
+            self.order_book.complete(order, filled)
 
     def _update_strategy_metrics(self) -> None:
         if self.shares == 0 and self._before_shares > 0:
             trade_return = (self.capital-self._capital_before_buy)/self._capital_before_buy
-            self.metrics.total_trades += 1
-            self.metrics.accumulate += trade_return
-            self.metrics.average_trades = self.metrics.accumulate/self.metrics.total_trades
-
-            if trade_return >= 0:
-                self.metrics.positive_trades += 1
-                self.metrics.accumulate_profit += trade_return
-                self.metrics.average_positive_trades = self.metrics.accumulate_profit/self.metrics.positive_trades
-            elif trade_return < 0:
-                self.metrics.negative_trades += 1
-                self.metrics.accumulate_loss += trade_return
-                self.metrics.average_negative_trades = self.metrics.accumulate_loss/self.metrics.negative_trades
-
+            self.metrics.add_trade(trade_return, self.capital-self._capital_before_buy)
             self._capital_before_buy = self.capital
 
         min_period_value = self.capital + self.shares*self.data_low[self.current_period]
         max_period_value = self.capital + self.shares*self.data_high[self.current_period]
 
-        if len(self.metrics.drawdowns) == 0 or max_period_value > self.metrics.drawdowns[-1]['max']:
-            drawdown = {
-                'min': min_period_value,
-                'max': max_period_value,
-                'drawdown': 100*(max_period_value-min_period_value)/max_period_value
-            }
-            self.metrics.drawdowns.append(drawdown)
-        elif min_period_value < self.metrics.drawdowns[-1]['min']:
-            self.metrics.drawdowns[-1]['min'] = min_period_value
-            self.metrics.drawdowns[-1]['drawdown'] = 100*(self.metrics.drawdowns[-1]['max']-min_period_value)/self.metrics.drawdowns[-1]['max']
-
-        if self.metrics.drawdowns[-1]['drawdown'] > self.metrics.max_drawdown:
-            self.metrics.max_drawdown = self.metrics.drawdowns[-1]['drawdown']
+        self.metrics.update_drawdown(min_period_value, max_period_value)
 
         self._before_shares = self.shares
         self._before_capital = self.capital
 
+    def get_metrics_summary(self) -> MetricsSummary:
+        '''
+        Compact record of the metrics, annualized with the number of bars per
+        year of the processed bars.
+        '''
+        periods = self.current_period
+        periods_per_year = None
+        if periods > 1:
+            periods_per_year = get_periods_per_year(self.dates[0], self.dates[periods-1], periods)
+        return self.metrics.get_summary(periods_per_year)
+
     def cancel_pending_orders(self):
-        self._pending_orders = {}
+        self.order_book.cancel_all()
 
     def exist_pending_orders(self) -> bool:
-        if len(self._pending_orders) > 0:
+        if len(self.order_book) > 0:
             return True
         else:
             return False
@@ -282,26 +620,28 @@ class Strategy(ABC):
         height: Optional[int] = None,
         show_fig: bool = True,
         save_fig: bool = False,
-        path_fig: str = ''
+        path_fig: str = '',
+        max_points: Optional[int] = DEFAULT_MAX_POINTS
     ) -> None:
         plot_candlestick(
-            df=self.df,
+            df=self.get_plot_df(),
             plot_type=plot_type,
             indicators=self.indicators,
-            operations={'buy': self.completed_purchases, 'sell': self.completed_sales},
-            capital_series=self.historical_capital,
+            operations=self.get_trades(),
+            capital_series=self.get_equity_curve(),
             theme_name=theme_name,
             data_name=data_name,
             width=width,
             height=height,
             show_fig=show_fig,
             save_fig=save_fig,
-            path_fig=path_fig
+            path_fig=path_fig,
+            max_points=max_points
         )
 
     def get_buy_and_hold_profit_before_period(self, to_period: int = -1) -> float:
         profit = self.init_capital*self.df['Close'][to_period]/self.df['Open'][0]
-        profit -= CommissionCalculator.get_commission_cost(self.commission_config, self.init_capital*self.df['Close'][0], 'buy')
+        profit -= self.commission(self.init_capital*self.df['Close'][0], 'buy')
         return profit
 
 
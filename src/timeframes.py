@@ -0,0 +1,235 @@
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, DatetimeIndex
+from pandas.tseries.frequencies import to_offset
+from pandas.tseries.offsets import Day, Tick
+
+TIMEFRAME_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+def uses_wall_clock(rule: str) -> bool:
+    '''
+    Whether the buckets of rule follow the wall clock of the bars, so daily
+    bars start at local midnight: daily and calendar rules do, while
+    sub-daily rules are aligned in UTC, so the hour repeated when the clocks
+    go back gives two buckets.
+    '''
+    offset = to_offset(rule)
+    return not isinstance(offset, Tick) or isinstance(offset, Day)
+
+
+def _get_bucket_values(index: DatetimeIndex, wall_clock: bool) -> np.ndarray:
+    if index.tz is not None:
+        index = index.tz_localize(None) if wall_clock else index.tz_convert('UTC').tz_localize(None)
+    return index.to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+
+def get_bucket_starts(dates: np.ndarray, rule: str) -> np.ndarray:
+    '''
+    Start (int64 nanoseconds) of the rule bucket of every date. Fixed rules
+    like '15min', '1h' or '1D' are aligned to the epoch; calendar rules like
+    'W' or 'M' use pandas periods.
+    '''
+    offset = to_offset(rule)
+    if isinstance(offset, Tick):
+        step = offset.nanos
+        return dates//step*step
+    index = pd.DatetimeIndex(dates.view('datetime64[ns]'))
+    return index.to_period(offset).start_time.to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+
+class TimeframeView:
+    '''
+    Higher timeframe bars closed before the current period of the strategy.
+    The arrays are views, so creating a view does not copy any bar.
+    '''
+
+    def __init__(self, timeframe: 'Timeframe', size: int):
+        self._timeframe = timeframe
+        self._size = size
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def open(self) -> np.ndarray:
+        return self._timeframe.get_column('Open')[:self._size]
+
+    @property
+    def high(self) -> np.ndarray:
+        return self._timeframe.get_column('High')[:self._size]
+
+    @property
+    def low(self) -> np.ndarray:
+        return self._timeframe.get_column('Low')[:self._size]
+
+    @property
+    def close(self) -> np.ndarray:
+        return self._timeframe.get_column('Close')[:self._size]
+
+    @property
+    def volume(self) -> np.ndarray:
+        return self._timeframe.get_column('Volume')[:self._size]
+
+    @property
+    def dates(self) -> DatetimeIndex:
+        return self._timeframe.get_dates(self._size)
+
+    @property
+    def df(self) -> DataFrame:
+        return self._timeframe.get_df(self._size)
+
+
+class Timeframe:
+    '''
+    OHLCV bars of a higher timeframe (rule, e.g. '1h' or '1D') aggregated
+    from the bars of a strategy: first Open, max High, min Low, last Close and
+    summed Volume of every bucket, dated at the bucket start. They are built
+    at once from the existing bars and updated bar by bar with append.
+
+    A bucket is only visible, through view(period), from the first period of
+    a later bucket, so a bar that has not closed yet is never used.
+    '''
+
+    def __init__(self, rule: str, df: DataFrame, capacity: int = 1024):
+        self.rule = rule
+        self.columns = [column for column in TIMEFRAME_COLUMNS if column in df.columns]
+        self._column_position = {column: i for i, column in enumerate(self.columns)}
+        index = pd.DatetimeIndex(df.index)
+        self.tz = index.tz
+        self._wall_clock = uses_wall_clock(rule)
+        n = len(index)
+
+        starts = get_bucket_starts(_get_bucket_values(index, self._wall_clock), rule)
+        is_new_bucket = np.empty(n, dtype=bool)
+        is_new_bucket[:1] = True
+        is_new_bucket[1:] = starts[1:] != starts[:-1]
+        first_periods = np.flatnonzero(is_new_bucket)
+        last_periods = np.append(first_periods[1:] - 1, n - 1) if n > 0 else first_periods
+
+        size = len(first_periods)
+        capacity = max(capacity, size, 1)
+        self._starts = np.empty(capacity, dtype=np.int64)
+        self._starts[:size] = starts[first_periods]
+        self._values = np.empty((len(self.columns), capacity))
+        for column, i in self._column_position.items():
+            values = df[column].to_numpy(dtype=float)
+            if size == 0:
+                continue
+            if column == 'Open':
+                self._values[i, :size] = values[first_periods]
+            elif column == 'High':
+                self._values[i, :size] = np.fmax.reduceat(values, first_periods)
+            elif column == 'Low':
+                self._values[i, :size] = np.fmin.reduceat(values, first_periods)
+            elif column == 'Close':
+                self._values[i, :size] = values[last_periods]
+            else:
+                self._values[i, :size] = np.add.reduceat(np.nan_to_num(values), first_periods)
+        self._size = size
+
+        # Number of closed buckets at every period of the strategy: the buckets before the bucket of the period
+        self._closed = np.empty(max(capacity, n, 1), dtype=np.int64)
+        self._closed[:n] = np.cumsum(is_new_bucket) - 1
+        self._periods = n
+
+    @classmethod
+    def from_arrays(cls, rule: str, columns: List[str], tz: Any, starts: np.ndarray, values: np.ndarray, closed: np.ndarray) -> 'Timeframe':
+        '''
+        Timeframe with the given buckets (values has a row per column) and
+        closed bucket counts per period, e.g. when restoring a checkpoint.
+        '''
+        timeframe = cls.__new__(cls)
+        timeframe.rule = rule
+        timeframe.columns = list(columns)
+        timeframe._column_position = {column: i for i, column in enumerate(timeframe.columns)}
+        timeframe.tz = tz
+        timeframe._wall_clock = uses_wall_clock(rule)
+        timeframe._size = len(starts)
+        timeframe._starts = np.empty(max(2*len(starts), 1), dtype=np.int64)
+        timeframe._starts[:len(starts)] = starts
+        timeframe._values = np.empty((len(columns), len(timeframe._starts)))
+        timeframe._values[:, :len(starts)] = values
+        timeframe._periods = len(closed)
+        timeframe._closed = np.empty(max(2*len(closed), 1), dtype=np.int64)
+        timeframe._closed[:len(closed)] = closed
+        return timeframe
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _grow_buckets(self) -> None:
+        capacity = 2*self._values.shape[1]
+        starts = np.empty(capacity, dtype=np.int64)
+        starts[:self._size] = self._starts[:self._size]
+        values = np.empty((len(self.columns), capacity))
+        values[:, :self._size] = self._values[:, :self._size]
+        self._starts = starts
+        self._values = values
+
+    def append(self, date: Any, bar: Dict[str, float]) -> None:
+        '''
+        Adds the next bar of the strategy to its bucket, or starts a new bucket.
+        '''
+        # Same conventions as GrowableBarData.append: naive dates are UTC when the bars have a timezone
+        date = pd.Timestamp(date)
+        if self.tz is not None:
+            date = (date if date.tzinfo is not None else date.tz_localize('UTC')).tz_convert(self.tz if self._wall_clock else 'UTC').tz_localize(None)
+        elif date.tzinfo is not None:
+            date = date.tz_convert('UTC').tz_localize(None)
+        start = get_bucket_starts(np.array([date.value], dtype=np.int64), self.rule)[0]
+
+        if self._periods == len(self._closed):
+            closed = np.empty(2*len(self._closed), dtype=np.int64)
+            closed[:self._periods] = self._closed[:self._periods]
+            self._closed = closed
+
+        if self._size > 0 and self._starts[self._size-1] == start:
+            values = self._values[:, self._size-1]
+            for column, i in self._column_position.items():
+                value = bar.get(column, np.nan)
+                if column == 'High':
+                    values[i] = np.fmax(values[i], value)
+                elif column == 'Low':
+                    values[i] = np.fmin(values[i], value)
+                elif column == 'Close':
+                    values[i] = value
+                elif column == 'Volume':
+                    values[i] += np.nan_to_num(value)
+        else:
+            if self._size == self._values.shape[1]:
+                self._grow_buckets()
+            self._starts[self._size] = start
+            for column, i in self._column_position.items():
+                value = bar.get(column, np.nan)
+                self._values[i, self._size] = np.nan_to_num(value) if column == 'Volume' else value
+            self._size += 1
+
+        self._closed[self._periods] = self._size - 1
+        self._periods += 1
+
+    def get_closed_count(self, period: int) -> int:
+        return int(self._closed[:self._periods][period])
+
+    def view(self, period: int) -> TimeframeView:
+        return TimeframeView(self, self.get_closed_count(period))
+
+    def get_column(self, column: str) -> np.ndarray:
+        if column not in self._column_position:
+            raise Exception(f'ERROR: column {column} not in the {self.rule} bars.')
+        return self._values[self._column_position[column], :self._size]
+
+    def get_dates(self, size: Optional[int] = None) -> DatetimeIndex:
+        size = self._size if size is None else size
+        index = pd.DatetimeIndex(self._starts[:size].view('datetime64[ns]'), name='Datetime')
+        if self.tz is None:
+            return index
+        if not self._wall_clock:
+            return index.tz_localize('UTC').tz_convert(self.tz)
+        # A bucket starting at an ambiguous wall clock time starts at its first occurrence
+        return index.tz_localize(self.tz, ambiguous=np.ones(size, dtype=bool), nonexistent='shift_forward')
+
+    def get_df(self, size: Optional[int] = None) -> DataFrame:
+        size = self._size if size is None else size
+        return pd.DataFrame(self._values[:, :size].T, index=self.get_dates(size), columns=self.columns)
@@ -12,6 +12,40 @@ class DateValue(TypedDict):
     date: datetime
     value: float
 
+
+class MetricsSummary(TypedDict):
+    total_trades: int
+    positive_trades: int
+    negative_trades: int
+    average_trades: float
+    average_positive_trades: float
+    average_negative_trades: float
+    profit_factor: float
+    max_drawdown: float
+    max_drawdown_duration: int
+    total_return: float
+    annual_return: float
+    volatility: float
+    sharpe_ratio: float
+    sortino_ratio: float
+    calmar_ratio: float
+    exposure: float
+
+
+class DownloadResult(TypedDict):
+    symbol: str
+    new_bars: int
+    file_name: Optional[str]
+    last_date: Optional[datetime]
+    error: Optional[str]
+
+
+class WalkForwardWindow(TypedDict):
+    in_sample_start: int
+    in_sample_end: int
+    out_of_sample_start: int
+    out_of_sample_end: int
+
 '''
 Example of commission config with different intervals
 [
@@ -49,4 +83,12 @@ class OperationInfo(TypedDict):
     operation_cost: float
     leftover_money: Optional[float]
     accumulated_cost: Optional[float]
-    operation_profit: Optional[float]
\ No newline at end of file
+    operation_profit: Optional[float]
+
+
+class CompletedSymbolOrder(TypedDict):
+    date: datetime
+    symbol: str
+    price: float
+    number_shares: int
+    type: str
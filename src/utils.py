@@ -1,27 +1,151 @@
 import os
 import glob
+import numpy as np
 import pandas as pd
 from datetime import datetime
+from typing import Any, List, Optional, Tuple
 
-def read_files_from_folder(data_name: str, from_date: str = '', to_date: str = '') -> pd.DataFrame:
+from src.backtesting_engine.data_cache import (
+    get_files_signature,
+    load_file_ranges,
+    load_folder_cache,
+    write_file_ranges,
+    write_folder_cache
+)
+from src.backtesting_engine.profiler import Profiler
+
+# Margin for comparing the UTC range of a file with local dates
+_RANGE_MARGIN = pd.Timedelta(days=1).value
+_OFFSET_PATTERN = r'(?:Z|[+-]\d{2}:?\d{2})$'
+
+
+def _parse_datetimes(values: pd.Series) -> Tuple[pd.Series, np.ndarray]:
+    '''
+    Dates of a Datetime column of strings and their UTC nanoseconds (naive
+    dates are taken as UTC). Dates with more than one UTC offset, like
+    yfinance intraday bars across a DST change, keep the wall clock time of
+    each one, without timezone.
+    '''
+    dates = pd.to_datetime(values)
+    if dates.dtype == object:
+        utc = pd.to_datetime(values, utc=True)
+        dates = pd.to_datetime(values.str.replace(_OFFSET_PATTERN, '', regex=True))
+    else:
+        utc = dates.dt.tz_convert('UTC') if dates.dt.tz is not None else dates
+    return dates, utc.dt.tz_localize(None).to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+
+def _overlaps(file_range: Optional[List[int]], start_date: Optional[datetime], end_date: Optional[datetime]) -> bool:
+    if file_range is None:
+        return False
+    if start_date is not None and file_range[1] < pd.Timestamp(start_date).value - _RANGE_MARGIN:
+        return False
+    if end_date is not None and file_range[0] > pd.Timestamp(end_date).value + _RANGE_MARGIN:
+        return False
+    return True
+
+
+def _slice_dates(df: pd.DataFrame, start_date: Optional[datetime], end_date: Optional[datetime]) -> pd.DataFrame:
+    if start_date is None and end_date is None:
+        return df
+
+    # Dates are compared with the wall clock time of the bars, which the index of bars with
+    # mixed UTC offsets already has, so the bounds are never localized. Wall clock times are
+    # less than a day away from UTC, so only the bars around the range are converted.
+    if df.index.tz is not None:
+        day = pd.Timedelta(days=1)
+        start = df.index.searchsorted(pd.Timestamp(start_date - day, tz='UTC')) if start_date is not None else 0
+        end = df.index.searchsorted(pd.Timestamp(end_date + day, tz='UTC')) if end_date is not None else len(df)
+        df = df.iloc[start:max(start, end)].tz_localize(None, copy=False)
+    index = df.index
+    if not index.is_monotonic_increasing:
+        # The hour repeated when the clocks go back is not sorted in wall clock time
+        mask = np.ones(len(df), dtype=bool)
+        if start_date is not None:
+            mask &= index > start_date
+        if end_date is not None:
+            mask &= index < end_date
+        return df[mask]
+
+    # The index is sorted, so the bounds are found with a binary search
+    start = index.searchsorted(start_date, side='right') if start_date is not None else 0
+    end = index.searchsorted(end_date, side='left') if end_date is not None else len(df)
+    return df.iloc[start:max(start, end)]
+
+
+def read_files_from_folder(
+    data_name: str,
+    from_date: str = '',
+    to_date: str = '',
+    use_cache: bool = True,
+    profiler: Optional[Profiler] = None
+) -> pd.DataFrame:
+    if profiler is not None:
+        with profiler.measure('data_loading'):
+            return _read_files_from_folder(data_name, from_date, to_date, use_cache)
+    return _read_files_from_folder(data_name, from_date, to_date, use_cache)
+
+
+def _read_files_from_folder(data_name: str, from_date: str, to_date: str, use_cache: bool) -> pd.DataFrame:
     folder = os.path.join('.', 'data' , data_name)
-    path = os.getcwd()
-    csv_files = glob.glob(os.path.join(folder, "*.csv"))
+    csv_files = sorted(glob.glob(os.path.join(folder, "*.csv")))
 
     if len(csv_files) == 0:
         raise Exception(f'ERROR: no file found in {folder}')
 
-    df = pd.DataFrame()
+    start_date = datetime.strptime(from_date, '%Y-%m-%d') if from_date != '' else None
+    end_date = datetime.strptime(to_date, '%Y-%m-%d') if to_date != '' else None
+    load_all = start_date is None and end_date is None
+
+    df = None
+    if use_cache:
+        signature = get_files_signature(csv_files)
+        df = load_folder_cache(folder, signature)
+        file_ranges = load_file_ranges(folder, signature)
+    else:
+        file_ranges = {}
+
+    if df is None:
+        dfs = []
+        utc_values = []
+        for file_name in csv_files:
+            name = os.path.basename(file_name)
+            if not load_all and name in file_ranges and not _overlaps(file_ranges[name], start_date, end_date):
+                continue
+            file_df = pd.read_csv(file_name)
+            file_df['Datetime'], utc = _parse_datetimes(file_df['Datetime'])
+            file_ranges[name] = [int(utc.min()), int(utc.max())] if len(file_df) > 0 else None
+            if load_all or _overlaps(file_ranges[name], start_date, end_date):
+                dfs.append(file_df)
+                utc_values.append(utc)
+
+        if len(dfs) == 0:
+            file_df = pd.read_csv(csv_files[0], nrows=0)
+            file_df['Datetime'], utc = _parse_datetimes(file_df['Datetime'])
+            dfs.append(file_df)
+            utc_values.append(utc)
+        if len({file_df['Datetime'].dt.tz for file_df in dfs}) > 1:
+            # Files with different UTC offsets also keep the wall clock time of every bar
+            for file_df in dfs:
+                file_df['Datetime'] = file_df['Datetime'].dt.tz_localize(None)
+        df = pd.concat(dfs, axis=0)
+        # Bars are sorted by their UTC time, which wall clock times do not always follow
+        order = np.argsort(np.concatenate(utc_values), kind='stable')
+        df = df.iloc[order].set_index('Datetime')
+
+        if use_cache:
+            write_file_ranges(folder, signature, file_ranges)
+            if load_all:
+                write_folder_cache(folder, signature, df)
 
-    for file_name in csv_files:
-        df = pd.concat([df, pd.read_csv(file_name, parse_dates=['Datetime'])], axis=0)
+    return _slice_dates(df, start_date, end_date)
 
-    if from_date != '' and to_date != '':
-        start_date = datetime.strptime(from_date, '%Y-%m-%d')
-        end_date = datetime.strptime(to_date, '%Y-%m-%d')
-        df = df.reset_index()
-        df['Datetime'] = df.apply(lambda row: row['Datetime'].replace(tzinfo=None), axis=1)
-        df = df[(df['Datetime'] > start_date) & (df['Datetime'] < end_date)]
 
-    df = df.set_index('Datetime').sort_index()
-    return df
\ No newline at end of file
+def replay_file(strategy: Any, file_name: str) -> None:
+    '''
+    Feeds the bars of a CSV file to strategy.add_bar one by one, as a local
+    stand-in for a live feed.
+    '''
+    df = pd.read_csv(file_name, parse_dates=['Datetime']).set_index('Datetime')
+    for date, bar in zip(df.index, df.to_dict('records')):
+        strategy.add_bar(date, bar)
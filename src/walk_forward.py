@@ -0,0 +1,188 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple, Type
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, Series
+
+from src.backtesting_engine.indicator_cache import IndicatorCache
+from src.backtesting_engine.optimizer import (
+    ParameterGrid,
+    SharedDataFrame,
+    create_worker_strategy,
+    get_metrics_record,
+    init_worker,
+    iterate_parameter_grid,
+    sample_parameter_grid
+)
+from src.backtesting_engine.strategy import Strategy
+from src.backtesting_engine.type_dict_classes import WalkForwardWindow
+
+
+def get_walk_forward_windows(n_bars: int, in_sample_size: int, out_of_sample_size: int, anchored: bool = False) -> List[WalkForwardWindow]:
+    '''
+    Consecutive out-of-sample ranges of out_of_sample_size bars (the last
+    one can be shorter), each preceded by its in-sample range: the previous
+    in_sample_size bars, or every previous bar when anchored. Ends are
+    exclusive, like Python slices.
+    '''
+    if in_sample_size <= 0 or out_of_sample_size <= 0:
+        raise Exception('ERROR: in_sample_size and out_of_sample_size must be positive')
+    windows = []
+    for out_of_sample_start in range(in_sample_size, n_bars, out_of_sample_size):
+        windows.append({
+            'in_sample_start': 0 if anchored else out_of_sample_start - in_sample_size,
+            'in_sample_end': out_of_sample_start,
+            'out_of_sample_start': out_of_sample_start,
+            'out_of_sample_end': min(out_of_sample_start + out_of_sample_size, n_bars)
+        })
+    return windows
+
+
+def _run_slice(start: int, end: int, params: Dict[str, Any]) -> Strategy:
+    strategy = create_worker_strategy(params, start, end)
+    strategy.set_quiet()
+    strategy.execute_strategy()
+    return strategy
+
+
+def _run_in_sample(window: WalkForwardWindow, params: Dict[str, Any], rank_by: str) -> Optional[float]:
+    strategy = _run_slice(window['in_sample_start'], window['in_sample_end'], params)
+    value = get_metrics_record(strategy, *strategy.get_result())[rank_by]
+    return None if value is None or np.isnan(value) else value
+
+
+def _run_out_of_sample(window: WalkForwardWindow, params: Dict[str, Any]) -> Dict[str, Any]:
+    strategy = _run_slice(window['out_of_sample_start'], window['out_of_sample_end'], params)
+    return {
+        'metrics': get_metrics_record(strategy, *strategy.get_result()),
+        'equity': strategy.equity_curve.values
+    }
+
+
+def _get_best_params(
+    window: WalkForwardWindow,
+    parameter_sets: List[Dict[str, Any]],
+    values: List[Optional[float]],
+    rank_by: str,
+    ascending: bool
+) -> Tuple[Dict[str, Any], float]:
+    # Ties keep the first parameter set of the grid
+    best_params = None
+    best_value = None
+    for params, value in zip(parameter_sets, values):
+        if value is None:
+            continue
+        if best_value is None or (value < best_value if ascending else value > best_value):
+            best_params, best_value = params, value
+
+    if best_params is None:
+        raise Exception(f'ERROR: no valid {rank_by} in the in-sample range {window["in_sample_start"]}-{window["in_sample_end"]}')
+    return best_params, best_value
+
+
+class WalkForwardResult:
+    '''
+    equity_curve is the stitched out-of-sample curve: every window starts
+    with the value at the end of the previous one, i.e. the per-bar returns
+    of the windows are chained. windows has a row per window with its
+    ranges, the chosen params, the in-sample value of rank_by and the
+    out-of-sample metrics.
+    '''
+
+    def __init__(self, equity_curve: Series, windows: DataFrame):
+        self.equity_curve = equity_curve
+        self.windows = windows
+
+    def __repr__(self) -> str:
+        if len(self.equity_curve) == 0:
+            return 'WalkForwardResult(0 windows)'
+        return (
+            f'WalkForwardResult({len(self.windows)} windows, {len(self.equity_curve)} out-of-sample bars, '
+            f'final value {self.equity_curve.iloc[-1]:.2f})'
+        )
+
+
+def walk_forward(
+    strategy_class: Type[Strategy],
+    df: DataFrame,
+    init_capital: float,
+    commission_config: Any,
+    parameter_grid: ParameterGrid,
+    in_sample_size: int,
+    out_of_sample_size: int,
+    anchored: bool = False,
+    n_samples: Optional[int] = None,
+    seed: Optional[int] = None,
+    rank_by: str = 'total',
+    ascending: bool = False,
+    max_workers: Optional[int] = None,
+    indicator_cache: Optional[IndicatorCache] = None
+) -> WalkForwardResult:
+    '''
+    Walk-forward analysis: for every window, the parameter set of the grid
+    (or of n_samples random ones, the same for all the windows) with the
+    best rank_by in sample is run out of sample. Every in-sample run (one
+    per window and parameter set), and then every out-of-sample run, is a
+    task of a process pool, over one copy of df in shared memory.
+
+    Each run starts with init_capital and no position, so indicators start
+    again at the beginning of every out-of-sample range.
+    '''
+    windows = get_walk_forward_windows(len(df), in_sample_size, out_of_sample_size, anchored)
+    if n_samples is None:
+        parameter_sets = list(iterate_parameter_grid(parameter_grid))
+    else:
+        parameter_sets = list(sample_parameter_grid(parameter_grid, n_samples, seed))
+
+    max_workers = max_workers or os.cpu_count() or 1
+    logging.info(f'START WALK FORWARD. {len(windows)} windows, {len(parameter_sets)} parameter sets')
+    shared_df = SharedDataFrame(df)
+
+    in_sample_windows = [window for window in windows for _ in parameter_sets]
+    in_sample_params = parameter_sets*len(windows)
+    n_runs = len(in_sample_windows)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=min(max_workers, max(n_runs, 1)),
+            initializer=init_worker,
+            initargs=(shared_df.info, strategy_class, init_capital, commission_config, indicator_cache)
+        ) as executor:
+            # Tasks are sent in chunks, so short runs do not wait on the pool
+            chunksize = max(1, n_runs//(4*max_workers))
+            values = list(executor.map(_run_in_sample, in_sample_windows, in_sample_params, [rank_by]*n_runs, chunksize=chunksize))
+
+            n_sets = len(parameter_sets)
+            best = [
+                _get_best_params(window, parameter_sets, values[i*n_sets:(i + 1)*n_sets], rank_by, ascending)
+                for i, window in enumerate(windows)
+            ]
+            results = list(executor.map(_run_out_of_sample, windows, [params for params, _ in best]))
+    finally:
+        shared_df.close()
+
+    logging.info('END WALK FORWARD')
+
+    records = []
+    equity_values = []
+    scale = 1.0
+    for window, (params, in_sample_value), result in zip(windows, best, results):
+        equity_values.append(result['equity']*scale)
+        scale *= result['equity'][-1]/init_capital
+        records.append({
+            'in_sample_start': df.index[window['in_sample_start']],
+            'in_sample_end': df.index[window['in_sample_end'] - 1],
+            'out_of_sample_start': df.index[window['out_of_sample_start']],
+            'out_of_sample_end': df.index[window['out_of_sample_end'] - 1],
+            **params,
+            f'in_sample_{rank_by}': in_sample_value,
+            **result['metrics']
+        })
+
+    if windows:
+        dates = df.index[windows[0]['out_of_sample_start']:windows[-1]['out_of_sample_end']]
+        equity_curve = pd.Series(np.concatenate(equity_values), index=dates, name='value')
+    else:
+        equity_curve = pd.Series([], index=df.index[:0], name='value', dtype=float)
+    return WalkForwardResult(equity_curve, pd.DataFrame.from_records(records))
@@ -0,0 +1,65 @@
+import os
+import pandas as pd
+
+from benchmarks.synthetic_data import generate_ohlcv
+from src.backtesting_engine.data_download import FakeProvider, download_symbols, get_last_timestamp, update_symbol
+from src.backtesting_engine.utils import read_files_from_folder
+
+
+def _get_bars(n_bars: int = 100):
+    return generate_ohlcv(n_bars, seed=3, freq='1h').tz_localize('UTC')
+
+
+def test_incremental_update(tmp_path, monkeypatch):
+    # read_files_from_folder reads ./data/<name>
+    monkeypatch.chdir(tmp_path)
+    df = _get_bars()
+    data_folder = os.path.join('.', 'data')
+
+    result = update_symbol('AAA', FakeProvider({'AAA': df.iloc[:60]}), data_folder=data_folder)
+    assert result['new_bars'] == 60
+    assert result['error'] is None
+
+    provider = FakeProvider({'AAA': df})
+    result = update_symbol('AAA', provider, data_folder=data_folder)
+    assert result['new_bars'] == 40
+    assert result['last_date'] == df.index[-1]
+
+    # The new bars are appended to the same file
+    folder = os.path.join(data_folder, 'AAA')
+    assert [name for name in os.listdir(folder) if name.endswith('.csv')] == ['AAA.csv']
+    assert get_last_timestamp(folder) == df.index[-1]
+
+    result = update_symbol('AAA', provider, data_folder=data_folder)
+    assert result['new_bars'] == 0
+
+    stored = read_files_from_folder('AAA', use_cache=False)
+    assert len(stored) == len(df)
+    assert stored.index.equals(df.index)
+    pd.testing.assert_frame_equal(stored[df.columns], df, check_freq=False, check_names=False, rtol=1e-12)
+
+
+def test_retry_transient_error(tmp_path):
+    provider = FakeProvider({'AAA': _get_bars()}, failures={'AAA': 2})
+
+    result = update_symbol('AAA', provider, data_folder=str(tmp_path), retries=2, backoff=0)
+    assert result['new_bars'] == 100
+    assert provider.calls['AAA'] == 3
+
+
+def test_transient_error_after_retries(tmp_path):
+    provider = FakeProvider({'AAA': _get_bars()}, failures={'AAA': 5})
+
+    results = download_symbols(['AAA'], provider, data_folder=str(tmp_path), retries=2, backoff=0)
+    assert 'ConnectionError' in results['AAA']['error']
+    assert provider.calls['AAA'] == 3
+
+
+def test_unknown_symbol_is_not_retried(tmp_path):
+    provider = FakeProvider({'AAA': _get_bars()})
+
+    results = download_symbols(['AAA', 'ZZZ'], provider, data_folder=str(tmp_path), retries=3, backoff=0)
+    assert results['AAA']['new_bars'] == 100
+    assert results['AAA']['error'] is None
+    assert 'unknown symbol' in results['ZZZ']['error']
+    assert provider.calls['ZZZ'] == 1
@@ -0,0 +1,49 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.backtesting_engine.utils import read_files_from_folder
+
+
+def _write_intraday_files(folder):
+    # 30 minute market hours bars across the end of DST, as yfinance writes them: -04:00 and then -05:00
+    days = pd.bdate_range('2021-10-25', '2021-11-19')
+    dates = [date for day in days for date in pd.date_range(day + pd.Timedelta('9h30min'), periods=13, freq='30min')]
+    index = pd.DatetimeIndex(dates).tz_localize('America/New_York')
+    df = pd.DataFrame({'Open': np.arange(len(index), dtype=float), 'Close': 1.0}, index=pd.Index(index, name='Datetime'))
+    os.makedirs(folder)
+    df.iloc[:150].to_csv(os.path.join(folder, 'part_0.csv'))
+    df.iloc[150:].to_csv(os.path.join(folder, 'part_1.csv'))
+    return df
+
+
+def _get_expected(df, from_date, to_date):
+    # Wall clock times of the bars strictly between the dates, as read_files_from_folder always returned them
+    wall_clock = df.index.tz_localize(None)
+    return df.set_axis(wall_clock)[(wall_clock > from_date) & (wall_clock < to_date)]
+
+
+@pytest.mark.parametrize('use_cache', [False, True])
+@pytest.mark.parametrize('from_date, to_date', [('2021-11-05', '2021-11-10'), ('2021-11-01', '2021-11-09'), ('2021-10-27', '2021-11-17')])
+def test_mixed_offsets_keep_wall_clock_time(tmp_path, monkeypatch, use_cache, from_date, to_date):
+    monkeypatch.chdir(tmp_path)
+    df = _write_intraday_files(os.path.join('data', 'INTRADAY'))
+    # The first read builds the cache that the second one uses
+    read_files_from_folder('INTRADAY', use_cache=use_cache)
+
+    result = read_files_from_folder('INTRADAY', from_date, to_date, use_cache=use_cache)
+    expected = _get_expected(df, pd.Timestamp(from_date), pd.Timestamp(to_date))
+    assert len(result) == len(expected)
+    assert list(result.index) == list(expected.index)
+    assert result.index[0].strftime('%H:%M') == '09:30'
+    assert np.array_equal(result['Open'].to_numpy(), expected['Open'].to_numpy())
+
+
+def test_mixed_offsets_full_read(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    df = _write_intraday_files(os.path.join('data', 'INTRADAY'))
+
+    result = read_files_from_folder('INTRADAY', use_cache=False)
+    assert result.index.tz is None
+    assert list(result.index) == list(df.index.tz_localize(None))
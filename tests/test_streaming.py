@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.run_benchmarks import COMMISSION_CONFIG
+from benchmarks.synthetic_data import generate_ohlcv
+from src.backtesting_engine.indicators import SMA
+from src.backtesting_engine.strategy import Strategy
+from src.backtesting_engine.utils import replay_file
+
+
+class SmaStrategy(Strategy):
+
+    def __init__(self, df, init_capital, commission_config):
+        super().__init__(df, init_capital, commission_config)
+        self.add_indicator(SMA(20))
+
+    def next(self):
+        i = self.current_period
+        sma = self.get_indicator('SMA_20')
+        if self.shares == 0 and self.data_close[i] > sma[i]:
+            self.buy(capital_percentage=0.5)
+        elif self.shares > 0 and self.data_close[i] < sma[i]:
+            self.sell(all=True)
+            self.buy(order_type='limit', buy_price=self.data_close[i]*0.99, number_shares=1)
+
+
+def _write_replay_file(tmp_path, tz):
+    df = generate_ohlcv(2000, seed=11, freq='1h')
+    if tz is not None:
+        df = df.tz_localize(tz)
+    file_name = str(tmp_path/'replay.csv')
+    df.to_csv(file_name)
+    # The batch run uses the bars of the file, so both runs see the same floats
+    return file_name, pd.read_csv(file_name, parse_dates=['Datetime']).set_index('Datetime')
+
+
+def _assert_same_run(batch, streamed):
+    assert streamed.get_result() == batch.get_result()
+    assert np.array_equal(streamed.equity_curve.values, batch.equity_curve.values)
+    pd.testing.assert_frame_equal(streamed.trades.to_dataframe(), batch.trades.to_dataframe())
+    assert streamed.get_metrics_summary() == batch.get_metrics_summary()
+    # Streamed indicators are updated bar by bar, so they can differ in the last bits
+    np.testing.assert_allclose(streamed.get_indicator('SMA_20'), batch.get_indicator('SMA_20'), rtol=1e-12)
+    pd.testing.assert_frame_equal(streamed.df, batch.df, check_freq=False)
+
+
+@pytest.mark.parametrize('tz', [None, 'UTC'])
+def test_replay_file_matches_batch(tmp_path, tz):
+    file_name, df = _write_replay_file(tmp_path, tz)
+    batch = SmaStrategy(df, 10000, COMMISSION_CONFIG)
+    batch.set_quiet()
+    batch.execute_strategy()
+
+    streamed = SmaStrategy(df.iloc[:500], 10000, COMMISSION_CONFIG)
+    streamed.set_quiet()
+    streamed.execute_strategy()
+    streamed.start_streaming(capacity=16)
+    df.iloc[500:].to_csv(file_name)
+    replay_file(streamed, file_name)
+
+    assert len(streamed.bars) == len(df)
+    _assert_same_run(batch, streamed)
+
+
+def test_replay_file_from_empty_strategy(tmp_path):
+    file_name, df = _write_replay_file(tmp_path, None)
+    batch = SmaStrategy(df, 10000, COMMISSION_CONFIG)
+    batch.set_quiet()
+    batch.execute_strategy()
+
+    streamed = SmaStrategy(df.iloc[:0], 10000, COMMISSION_CONFIG)
+    streamed.set_quiet()
+    replay_file(streamed, file_name)
+
+    _assert_same_run(batch, streamed)
+
+
+def test_streamed_df_is_a_view():
+    df = generate_ohlcv(100, seed=2, freq='1h').tz_localize('America/New_York', nonexistent='shift_forward', ambiguous='NaT')
+    df = df[df.index.notna()]
+    strategy = SmaStrategy(df.iloc[:10], 10000, COMMISSION_CONFIG)
+    strategy.set_quiet()
+    strategy.start_streaming(capacity=16)
+
+    for date, bar in zip(df.index[10:], df.iloc[10:].to_dict('records')):
+        strategy.add_bar(date, bar)
+        # The same frame is returned until a bar is added, and it does not copy the bars
+        assert strategy.df is strategy.df
+        assert np.shares_memory(strategy.df['Close'].to_numpy(), strategy.bars.close)
+
+    pd.testing.assert_frame_equal(strategy.df, df, check_freq=False)
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+
+from src.backtesting_engine.timeframes import Timeframe
+
+
+def _get_bars_across_fall_back():
+    # 15 minute bars with a Volume of 1 around the end of DST in New York (2021-11-07 02:00 EDT -> 01:00 EST)
+    index = pd.date_range('2021-11-06 12:00', periods=48*4, freq='15min', tz='UTC', name='Datetime').tz_convert('America/New_York')
+    values = np.arange(len(index), dtype=float)
+    return pd.DataFrame({'Open': values, 'High': values + 1, 'Low': values - 1, 'Close': values, 'Volume': 1.0}, index=index)
+
+
+def test_hourly_buckets_across_fall_back():
+    df = _get_bars_across_fall_back()
+    hourly = Timeframe('1h', df).get_df()
+
+    # Both 01:00 hours are separate buckets of 4 bars, with real labels
+    assert hourly.index.notna().all()
+    assert hourly.index.is_unique
+    assert (hourly['Volume'] == 4).all()
+    repeated = hourly[hourly.index.strftime('%Y-%m-%d %H:%M') == '2021-11-07 01:00']
+    assert len(repeated) == 2
+    assert [date.utcoffset() for date in repeated.index] == [pd.Timedelta(hours=-4), pd.Timedelta(hours=-5)]
+
+
+def test_daily_buckets_across_fall_back():
+    df = _get_bars_across_fall_back()
+    daily = Timeframe('1D', df).get_df()
+
+    # Days start at local midnight, and the day of the change has 25 hours
+    assert list(daily.index.strftime('%Y-%m-%d %H:%M')) == ['2021-11-06 00:00', '2021-11-07 00:00', '2021-11-08 00:00']
+    assert daily.loc['2021-11-07', 'Volume'].item() == 25*4
+
+
+def test_append_matches_batch_across_fall_back():
+    df = _get_bars_across_fall_back()
+    for rule in ('1h', '1D'):
+        timeframe = Timeframe(rule, df.iloc[:10])
+        for date, bar in zip(df.index[10:], df.iloc[10:].to_dict('records')):
+            timeframe.append(date, bar)
+        pd.testing.assert_frame_equal(timeframe.get_df(), Timeframe(rule, df).get_df())